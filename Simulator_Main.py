@@ -1,171 +1,169 @@
+import argparse
 import pyglet
 from pyglet import shapes
+from pyglet.math import Mat4, Vec3
 import math
-from secondOrderDE import second_order_DE_rk4
-from pathlib import Path
-from datetime import datetime
+import time
 import numpy as np
 import physics
 import keyboardctrl as kb
+import secondOrderDE
+from perfstats import PerfMonitor
+from simulation import (FlightSimulation, EnsembleSimulation, PHYSICS_PARAMS, ENSEMBLE, PERF_HUD, TIME_WARP, TIME_WARPS, WINDOW_WIDTH,
+                        WINDOW_HEIGHT, NUM_OF_FRAMES, MAX_SUBSTEPS, PHYSICS_BUDGET, PIC_WIDTH as pic_width, PIC_HEIGHT as pic_height)
+from replay import RunReplay, latest_run
+from scenarios import load_scenario, scenario_simulation
+
+
+def sprite_file(dihedral):
+    """
+    Aircraft sprite for a dihedral angle, only a visual indicator of the wing type
+    Args:
+        dihedral (float): dihedral angle in degrees
+    Returns:
+        str: image path
+    """
+    if dihedral < 0:
+        return "./assets/mirage.png"
+    elif dihedral > 0:
+        return "./assets/777.png"
+    return "./assets/su27.png"
 
 
 # --- Aircraft Visualizer ---
 class AircraftVisualizer(pyglet.window.Window):
-    def __init__(self):
-         # --- USER INPUTS GO HERE ---
-
-        ''' 
-         Initializes all needed variables for the simulation and physics engine. 
-
-
-         Physics parameters 
-         dihedral: positive is dihedral angle, negative is anhedral angle, 0 is flat wing
-             try dihedral = -3 for a small anhedral angle typical of some military aircraft
-             try dihedral = 5 for a moderate dihedral angle typical of many general aviation aircraft
-             try dihedral = 0 for flat wing like many fighter jets
-         Mass: kg of aircraft (900 is default)
-         WingLength: length of wing from body to tip in meters (5.5 is default)
-         WingWidth: width of wing from front to back in meters (1.5 is default)
-         BodyArea: cross-sectional area of the body in m^2 (5 is default)
-         cLift_a0: lift coefficient at 0 angle of attack (0.25 is default)
-         cL_slope: lift coefficient slope per degree angle of attack (0.2 is default)
-         altitude: altitude in feet (1000 is default)
-         cruise: cruise speed in m/s (52 is default, ~100 knots)
-         I_roll: moment of inertia about roll axis (1000 is default)
-         drag_mult: multiplier for drag forces (1 is default), for debugging and parameter isolation, leave as 1 for realistic simulation
-         constant_Altitude: if True, aircraft will maintain constant altitude by adjusting vertical speed as needed (False is default)
-         
-         NOTE: All default parameters correspond to a C172 Skyhawk (or PA-28), small propellor aircraft. Aircraft sprite will change based on dihedral angle
-         NOTE: Aircraft sprite does not affect parameters, just for visual effect. Sprites are NOT to scale.
-
-         self.aircraft_angle: initial bank angle in degrees (5.0 is a good perturbation amount to view stability)
-         self.worldscale: zoom level for visualizer (10 is default, can decrease if simulation ends by world exit too quickly)
-
-            Example aircraft parameters for reference:
-         PA-28 : wing length 5m, wing chord average 1.6m, mass 900 kg, body area ~8m^2, cruise speed 52m/s (100 kts), dihedral 7°, I_roll ~ 1000
-         C172 (scale 10) (default): wing length 5.5m, wing chord average 1.5m, mass 900kg, body area ~8m^2, cruise speed 52m/s (100 kts), dihedral 0°, I_roll ~ 1000
-         B747 (scale 5): wing length 32m, wing chord average 8m, mass 350 000kg, body area ~500m^2, cruise speed 260m/s (520 kts), dihedral 3°, I_roll ~ 1000000
-         
-         NOTE: sprites are only visual indicators of dihedral type and do not represent actual aircraft types or scales.
-         '''
-
-        # vvvv USER INPUTS vvvv
-        physics.globalize_physics_vars(dihedral=7, # 7, 0, -3
-                                       Mass=900, 
-                                       WingLength=5, #5 (small), 7.5 (large), 5.25 (no const alt), 5.75 (const alt 15)
-                                       WingWidth=1.6, #1.6
-                                       BodyArea=8,
-                                       cLift_a0=0.25, 
-                                       cL_slope=0.2,
-                                       altitude=1000, 
-                                       cruise=52, 
-                                       I_roll=1000, 
-                                       drag_mult=1,
-                                       Constant_Altitude=True,
-                                       Autopilot=False,
-                                       Keyboard_Control=True
-                                       )
-        
-        self.aircraft_angle = 30.0  # starting perturbed angle in degrees, 0 is level flight, 5 will show growth, 30 will show decay, 15 for critical 
-        self.worldscale = 10  # zoom level, 10 is default
-        self.timeout = 150 # seconds until automatic timeout, set to None to disable automatic timeout, used for graphing consistency
-
-        # -- USER INPUTS END HERE --
-        
+    def __init__(self, ensemble=ENSEMBLE, replay=None, scenario=None):
+        '''
+         Initializes all needed variables for the simulation and physics engine.
+         User inputs (physics parameters, initial bank angle, zoom and timeout) are set at the top of simulation.py
+         ensemble: None for one aircraft, or the ENSEMBLE dict of lists to fly several side by side (see simulation.py)
+         replay: RunReplay to play back a recorded run instead of simulating (see replay.py)
+         scenario: scenario dict (see scenarios.py) to fly instead of the user inputs in simulation.py
+        '''
+
+        physics.globalize_physics_vars(**(scenario["physics"] if scenario is not None else PHYSICS_PARAMS))
+        self.replay = replay is not None
+        self.ensemble = ensemble is not None and not self.replay
+        if self.replay:
+            self.sim = replay
+        elif self.ensemble:
+            self.sim = EnsembleSimulation(ensemble)
+        elif scenario is not None:
+            self.sim = scenario_simulation(scenario)
+        else:
+            self.sim = FlightSimulation()
+        self.worldscale = self.sim.worldscale
 
         # --- Constants ---
-        global WINDOW_WIDTH
-        global WINDOW_HEIGHT
-        WINDOW_WIDTH = 1000
-        WINDOW_HEIGHT = 700
         self.VIEWPORT_MARGIN = 100  # pixels from edge before camera moves
 
-        global NUM_OF_FRAMES
-        global SIM_TIME
-        NUM_OF_FRAMES = 60
-        SIM_TIME = 20 
-        # Background image
-        # https://unsplash.com/photos/sky-cloud-blue-background-paronama-web-cloudy-summer-winter-season-day-light-beauty-horizon-spring-brigth-gradient-calm-abstract-backdrop-air-nature-view-wallpaper-landscape-cyan-color-environment-wkVWKgeyEEs
-        # 3000x1097
-        global pic_width
-        global pic_height
-        pic_width = 3000
-        pic_height = 1097
-
-
-        # Aircraft init state
-        # NOTE: COORDNIATES LOAD FROM BOTTOM LEFT
-        # (0,0) is bottom-left of background image
-
-        self.aircraft_x = pic_width/2
-        self.aircraft_y = pic_height - WINDOW_HEIGHT/2
-        self.initx = self.aircraft_x
-        self.inity = self.aircraft_y
-        
-        self.aircraft_dx = 0.0
-        self.aircraft_dy = 0.0
-        self.aircraft_dangle = 0.0
-
-
-        # Load aircraft sprite
-        if physics.dihedral < 0:
-            sprite_file = "./assets/mirage.png"
-        elif physics.dihedral > 0:
-            sprite_file = "./assets/777.png"
-        else:
-            sprite_file = "./assets/su27.png"
         super().__init__(WINDOW_WIDTH, WINDOW_HEIGHT, "Aircraft Visualizer - Pyglet 2.x")
         pyglet.gl.glClearColor(0.53, 0.81, 0.98, 1.0)  # Sky blue background
 
-        self.aircraft_image = pyglet.image.load(sprite_file)
-        self.aircraft_image.anchor_x = self.aircraft_image.width // 2
-        self.aircraft_image.anchor_y = self.aircraft_image.height // 2
-        self.aircraft_sprite = pyglet.sprite.Sprite(
-                                                    img=self.aircraft_image,
-                                                    x=0,
-                                                    y=0
-                                                    )
-        self.aircraft_sprite.scale = self.worldscale / 22  # Scale down the aircraft sprite
+        # World geometry is built once in world (background image) coordinates and drawn with the camera as the view transform
+        self.world_batch = pyglet.graphics.Batch()
+        self.background_group = pyglet.graphics.Group(order=0)
+        self.grid_group = pyglet.graphics.Group(order=1)
+        self.aircraft_group = pyglet.graphics.Group(order=2)
+
+        # Load aircraft sprites, one per aircraft in an ensemble, sharing the world batch
+        if self.ensemble:
+            dihedrals = self.sim.dihedral
+        elif self.replay:
+            dihedrals = [self.sim.header.get("physics", {}).get("dihedral", physics.dihedral)]
+        else:
+            dihedrals = [physics.dihedral]
+        images = {}
+        self.aircraft_sprites = []
+        for dihedral in dihedrals:
+            file = sprite_file(dihedral)
+            if file not in images:
+                images[file] = pyglet.image.load(file)
+                images[file].anchor_x = images[file].width // 2
+                images[file].anchor_y = images[file].height // 2
+            sprite = pyglet.sprite.Sprite(
+                                          img=images[file],
+                                          x=0,
+                                          y=0,
+                                          batch=self.world_batch,
+                                          group=self.aircraft_group
+                                          )
+            sprite.scale = self.worldscale / 22  # Scale down the aircraft sprite
+            self.aircraft_sprites.append(sprite)
+        self.aircraft_sprite = self.aircraft_sprites[0]
+
+        # Ensemble name tags, follow their aircraft
+        self.aircraft_labels = []
+        if self.ensemble:
+            for text in self.sim.labels:
+                self.aircraft_labels.append(pyglet.text.Label(text, anchor_x='center', anchor_y='top', color=(20, 20, 60, 255),
+                                                              batch=self.world_batch, group=self.aircraft_group))
 
 
         # Camera init pos (defining top-left corner)
         self.cam_x = pic_width/2 - WINDOW_WIDTH / 2
         self.cam_y = pic_height
-        
-        # Store flight data
-
-        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")  # remove problematic characters
-        self.data_path_name = Path("data") / f"data-{timestamp}.txt"
 
-        # HUD labels
-        self.label_pos = pyglet.text.Label('', x=15, y=WINDOW_HEIGHT-610)
-        self.label_bank = pyglet.text.Label('', x=15, y=WINDOW_HEIGHT-640)
-        self.label_dbank = pyglet.text.Label('', x=15, y=WINDOW_HEIGHT-670)
-        self.label_time = pyglet.text.Label('', x=700, y=WINDOW_HEIGHT-610)
+        # HUD labels, drawn in screen coordinates
+        self.hud_batch = pyglet.graphics.Batch()
+        self.label_pos = pyglet.text.Label('', x=15, y=WINDOW_HEIGHT-610, batch=self.hud_batch)
+        self.label_bank = pyglet.text.Label('', x=15, y=WINDOW_HEIGHT-640, batch=self.hud_batch)
+        self.label_dbank = pyglet.text.Label('', x=15, y=WINDOW_HEIGHT-670, batch=self.hud_batch)
+        self.label_time = pyglet.text.Label('', x=700, y=WINDOW_HEIGHT-610, batch=self.hud_batch)
+        self.label_warp = pyglet.text.Label('', x=700, y=WINDOW_HEIGHT-640, batch=self.hud_batch)
+        self.label_perf = pyglet.text.Label('', x=15, y=WINDOW_HEIGHT-15, anchor_y='top', multiline=True, width=WINDOW_WIDTH//2,
+                                            font_name='Courier New', font_size=10, color=(20, 20, 60, 255), batch=self.hud_batch)
         self.label_liftl = pyglet.text.Label('', x=700, y=WINDOW_HEIGHT-30)
         self.label_liftr = pyglet.text.Label('', x=350, y=WINDOW_HEIGHT-30)
 
-        # 60 FPS
+        # 60 FPS rendering, physics runs at its own fixed rate (see update)
         pyglet.clock.schedule_interval(self.update, float(1/NUM_OF_FRAMES))
+        self.accumulator = 0.0  # real time not yet simulated
+        self.previous_state = (self.sim.x, self.sim.y, self.sim.bank)  # state before the last physics step, for interpolation
+        self.warp = min(max(TIME_WARP, 1), TIME_WARPS[-1])  # requested simulated seconds per real second
+        self.achieved_warp = 0.0  # smoothed simulated seconds per real second actually reached
+
+        # performance overlay (F3), statistics are always collected
+        self.perf = PerfMonitor()
+        self.show_perf = PERF_HUD
+        self.perf_used = PERF_HUD  # write a summary at exit if the overlay was ever shown
+        self.perf_refresh = 0.0  # real time until the overlay text is next refreshed
+        self.last_draw = None
+        if isinstance(self.sim, FlightSimulation):
+            self.sim.logger.on_write = lambda seconds: self.perf.add("log write time", seconds)
 
         # Load background image
         self.background_img = pyglet.image.load("./assets/background.jpeg")
         self.background_img.anchor_x = 0
         self.background_img.anchor_y = 0
-        self.runtime = 0.0
+        self.background = pyglet.sprite.Sprite(self.background_img, x=0, y=0, batch=self.world_batch, group=self.background_group)
+
+        # World grid
+        self.grid_lines = []
+        for x in range(0, pic_width+1, 200):
+            self.grid_lines.append(shapes.Line(x, 0, x, pic_height, thickness=3, color=(150,150,205), batch=self.world_batch, group=self.grid_group))
+        for y in range(0, pic_height+1, 200):
+            self.grid_lines.append(shapes.Line(0, y, pic_width, y, thickness=3, color=(150,150,205), batch=self.world_batch, group=self.grid_group))
 
         # load init plot coords
-        self.plot_coordy = self.aircraft_y - self.cam_x # not right coody is a relative aircraft is a global
-        self.plot_coordx = self.aircraft_x  - self.cam_y
-        self.scaled_aircraft_x = self.plot_coordx + self.cam_x
-        self.scaled_aircraft_y = self.plot_coordy + self.cam_y
+        self.scaled_aircraft_x, self.scaled_aircraft_y = self.camera_target()
         print("\nRunning  .  .  . \n")
 
-        # initialize autopilot
-        if physics.Autopilot:
-            kb.ap_on = 1
-
+        # keyboard aileron control and autopilot toggle, ensembles and replays have no controls
+        if not (self.ensemble or self.replay):
+            kb.start_listener()
 
+    def camera_target(self):
+        """
+        World position the camera follows, the aircraft or the middle of the aircraft still flying in an ensemble
+        Returns:
+            tuple: (x, y)
+        """
+        world_x, world_y = self.sim.world_position()
+        if not self.ensemble:
+            return world_x, world_y
+        flying = self.sim.alive if self.sim.alive.any() else slice(None)
+        return float(np.mean(world_x[flying])), float(np.mean(world_y[flying]))
 
     def camera(self):
         """
@@ -192,130 +190,261 @@ class AircraftVisualizer(pyglet.window.Window):
         return (max(0, min(self.cam_x, pic_width - WINDOW_WIDTH)), max(0, min(self.cam_y, pic_height - WINDOW_HEIGHT)))
 
     def update(self, dt):
-        self.runtime += dt
-        
         """
         Calculate new aircraft properties from previous using RK 4 solver and
         update positions and velocities in each time step. Camera and HUD updated here 
         as well as failure condition checks and data recording.
-        """
 
-        # RK4 solver step
-        self.x1, self.y1, self.bank1, self.dx1, self.dy1, self.dbank1 = second_order_DE_rk4(
-                                                                                        self.aircraft_x, 
-                                                                                        self.aircraft_y, 
-                                                                                        self.aircraft_angle, 
-                                                                                        self.aircraft_dx, 
-                                                                                        self.aircraft_dy, 
-                                                                                        self.aircraft_dangle, 
-                                                                                        1/NUM_OF_FRAMES
-                                                                                        )
-        
-        # Update positions       
-        self.aircraft_x = self.x1
-        self.aircraft_y = self.y1
-        self.aircraft_angle = self.bank1
-
-        # Update velocities
-        self.aircraft_dx = self.dx1
-        self.aircraft_dy = self.dy1
-        self.aircraft_dangle = self.dbank1
-
-        # Check failure conditions
-        self.scaled_aircraft_x = self.plot_coordx + self.cam_x
-        self.scaled_aircraft_y = self.plot_coordy + self.cam_y
-
-        if (self.scaled_aircraft_y < 0) or (self.scaled_aircraft_y > pic_height) or (self.scaled_aircraft_x < 0) or (self.scaled_aircraft_x > pic_width):
-            print("Aircraft has left the world boundaries. Simulation ending.")
-            pyglet.app.exit()
+        Fixed timestep: the real frame time dt is added to an accumulator and the physics advances
+        in whole steps of sim.dt (several per frame at PHYSICS_RATE > NUM_OF_FRAMES), so the simulation
+        and the logged time do not depend on the frame rate. The leftover fraction of a step is used
+        to interpolate the drawn state (see render_state).
 
-        elif (self.aircraft_angle < -90) or (self.aircraft_angle > 90):
-            print("Aircraft has exceeded safe bank angle. Simulation ending.")
-            pyglet.app.exit()
+        Time warp: the accumulator fills warp times faster, so several steps run per frame and only the latest
+        state is drawn. Physics gets at most PHYSICS_BUDGET of the frame time (and MAX_SUBSTEPS per warp step),
+        beyond that the backlog is dropped, so a slow configuration lowers the achieved warp rather than the frame rate.
 
-        elif (self.timeout is not None) and (self.runtime >= self.timeout):
-            print("Simulation has reached timeout limit. Simulation ending.")
-            pyglet.app.exit()
+        Replay: the recorded run is read at the playback time instead, nothing is simulated.
+        """
 
-        # Save position vs time data to txt file
-        with open(self.data_path_name, "a") as f:
-            stringified = str(self.x1) + " " + str(self.y1) + " " + str(self.bank1) + " " + str(self.runtime) + "\n"
-            f.write(stringified)
+        if self.replay:
+            self.sim.advance(dt)
+            self.previous_state = (self.sim.x, self.sim.y, self.sim.bank)
+        else:
+            self.accumulator += dt * self.warp
+            substeps = 0
+            max_substeps = MAX_SUBSTEPS * math.ceil(self.warp)
+            evaluations = secondOrderDE.evaluations
+            now = time.perf_counter()
+            deadline = now + PHYSICS_BUDGET / NUM_OF_FRAMES
+            while self.accumulator >= self.sim.dt:
+                if substeps == max_substeps or now > deadline:
+                    # physics cannot keep up, drop the backlog instead of spiralling
+                    self.accumulator = 0.0
+                    break
+
+                # RK4 solver step, failure checks and data recording
+                self.previous_state = (self.sim.x, self.sim.y, self.sim.bank)
+                message = self.sim.step()
+                start, now = now, time.perf_counter()
+                self.perf.add("physics step time", now - start)
+                self.accumulator -= self.sim.dt
+                substeps += 1
+                if message is not None:
+                    print(message)
+                    pyglet.clock.unschedule(self.update)
+                    self.sim.close()
+                    pyglet.app.exit()
+                    break
+
+            if substeps:
+                self.perf.add("evaluations per step", (secondOrderDE.evaluations - evaluations) / substeps)
+                self.perf.add("steps per frame", substeps)
+            if dt > 0:
+                self.achieved_warp += 0.1 * (substeps * self.sim.dt / dt - self.achieved_warp)
 
         # Update camera
+        self.scaled_aircraft_x, self.scaled_aircraft_y = self.camera_target()
         self.cam_x, self.cam_y = self.camera()
-        
+
+        self.perf_refresh -= dt
+        if self.perf_refresh <= 0:
+            self.perf_refresh = 0.25
+            self.set_label(self.label_perf, self.perf_text() if self.show_perf else '')
+
         # Update HUD text
-        self.label_pos.text = f"Aircraft position: ({self.aircraft_x:.1f}, {self.aircraft_y:.1f})"
-        self.label_bank.text = f"Bank: {self.aircraft_angle:.1f}°"
-        self.label_dbank.text = f"Angular velocity: {self.aircraft_dangle:.1f}°/s"
-        self.label_time.text = f"Time: {self.runtime:.1f} s"
-        # AoAl = physics.AoAL(self.aircraft_dx, self.aircraft_dy, self.aircraft_angle, self.aircraft_dangle)
-        # AoAr = physics.AoAR(self.aircraft_dx, self.aircraft_dy, self.aircraft_angle, self.aircraft_dangle)
-        # Liftl = physics.leftlift_F(self.aircraft_angle, AoAl)
+        if not self.replay:
+            self.set_label(self.label_warp, f"Warp: {self.warp:g}x (achieved {self.achieved_warp:.1f}x)")
+        if self.ensemble:
+            self.set_label(self.label_pos, f"Aircraft flying: {int(self.sim.alive.sum())}/{self.sim.size}")
+            self.set_label(self.label_time, f"Time: {self.sim.runtime:.1f} s")
+            return
+        self.set_label(self.label_pos, f"Aircraft position: ({self.sim.x:.1f}, {self.sim.y:.1f})")
+        self.set_label(self.label_bank, f"Bank: {self.sim.bank:.1f}°")
+        self.set_label(self.label_dbank, f"Angular velocity: {self.sim.dbank:.1f}°/s")
+        if self.replay:
+            state = " (paused)" if self.sim.paused else ""
+            self.set_label(self.label_time, f"Time: {self.sim.runtime:.1f} / {self.sim.end:.1f} s  {self.sim.speed:g}x{state}")
+        else:
+            self.set_label(self.label_time, f"Time: {self.sim.runtime:.1f} s")
+        # AoAl = physics.AoAL(self.sim.dx, self.sim.dy, self.sim.bank, self.sim.dbank)
+        # AoAr = physics.AoAR(self.sim.dx, self.sim.dy, self.sim.bank, self.sim.dbank)
+        # Liftl = physics.leftlift_F(self.sim.bank, AoAl)
         # Liftl = (int(Liftl[0]/100), int(Liftl[1]/100))
         # Liftl = (Liftl[0]*100, Liftl[1]*100)
-        # Liftr = physics.rightlift_F(self.aircraft_angle, AoAr)
+        # Liftr = physics.rightlift_F(self.sim.bank, AoAr)
         # Liftr = (int(Liftr[0]/100), int(Liftr[1]/100))
         # Liftr = (Liftr[0]*100, Liftr[1]*100)
         # self.label_liftl.text = f"L lift (right in POV): {Liftl[0]:.0f}, {Liftl[1]:.0f} N"
         # self.label_liftr.text = f"R lift (left in POV): {Liftr[0]:.0f}, {Liftr[1]:.0f} N"
 
 
+    def on_key_press(self, symbol, modifiers):
+        """
+        F3 toggles the performance overlay
+        Simulation: +/- step the time warp through TIME_WARPS
+        Replay controls: SPACE pause, LEFT/RIGHT seek 5 s (30 s with SHIFT), UP/DOWN double/halve the speed, HOME/END jump
+        """
+        key = pyglet.window.key
+        if symbol == key.F3:
+            self.show_perf = not self.show_perf
+            self.perf_used = self.perf_used or self.show_perf
+            self.perf_refresh = 0.0
+            return
+        if not self.replay:
+            if symbol in (key.PLUS, key.EQUAL, key.NUM_ADD):
+                self.warp = next((w for w in TIME_WARPS if w > self.warp), TIME_WARPS[-1])
+            elif symbol in (key.MINUS, key.NUM_SUBTRACT):
+                self.warp = next((w for w in reversed(TIME_WARPS) if w < self.warp), TIME_WARPS[0])
+            else:
+                return super().on_key_press(symbol, modifiers)
+            # a new warp starts without the backlog of the old one
+            self.accumulator = min(self.accumulator, self.sim.dt)
+            return
+
+        jump = 30 if modifiers & key.MOD_SHIFT else 5
+        if symbol == key.SPACE:
+            if self.sim.runtime >= self.sim.end:
+                self.sim.seek(self.sim.start)
+            self.sim.paused = not self.sim.paused
+        elif symbol == key.LEFT:
+            self.sim.seek(self.sim.runtime - jump)
+        elif symbol == key.RIGHT:
+            self.sim.seek(self.sim.runtime + jump)
+        elif symbol == key.UP:
+            self.sim.set_speed(self.sim.speed * 2)
+        elif symbol == key.DOWN:
+            self.sim.set_speed(self.sim.speed / 2)
+        elif symbol == key.HOME:
+            self.sim.seek(self.sim.start)
+        elif symbol == key.END:
+            self.sim.seek(self.sim.end)
+        else:
+            return super().on_key_press(symbol, modifiers)
+        self.previous_state = (self.sim.x, self.sim.y, self.sim.bank)
+
+    def perf_text(self):
+        """
+        Performance overlay: rolling mean and max of the physics step, draw and log write times,
+        derivative evaluations per step, FPS against the target, and how much faster than real time the physics runs
+        Returns:
+            str: overlay text
+        """
+        step = self.perf.get("physics step time")
+        draw = self.perf.get("draw time")
+        write = self.perf.get("log write time")
+        frame = self.perf.get("frame time").mean()
+        speed = self.sim.dt / step.mean() if step.mean() > 0 else 0.0
+        return "\n".join([
+            f"physics step {step.mean()*1e3:7.3f} ms  max {step.max()*1e3:7.3f} ms",
+            f"draw         {draw.mean()*1e3:7.3f} ms  max {draw.max()*1e3:7.3f} ms",
+            f"log write    {write.mean()*1e3:7.3f} ms  max {write.max()*1e3:7.3f} ms",
+            f"evals/step   {self.perf.get('evaluations per step').mean():7.1f}   steps/frame {self.perf.get('steps per frame').mean():5.1f}",
+            f"FPS          {1/frame if frame > 0 else 0:7.1f} / {NUM_OF_FRAMES}",
+            f"physics      {speed:7.1f}x real time",
+        ])
+
+    def dump_perf(self):
+        """
+        Write the whole run performance summary to ./perf/ if the overlay was shown
+        """
+        if not self.perf_used:
+            return
+        mode = "replay" if self.replay else "ensemble" if self.ensemble else "single"
+        header = [f"mode: {mode}", f"physics: {self.physics_config()}", f"physics dt: {self.sim.dt}",
+                  f"time warp: {self.warp:g}x (achieved {self.achieved_warp:.1f}x)", ""]
+        print("Performance summary saved to", self.perf.dump(header=header))
+
+    def physics_config(self):
+        """
+        Physics parameters of the run on screen, for the performance summary
+        Returns: dict of parameters (lists for ensembles), the recorded header for replays, or a note if the replayed file has none
+        """
+        if self.replay:
+            return self.sim.header.get("physics", f"not recorded in {self.sim.path.name}")
+        params = {name: value.tolist() if isinstance(value, np.ndarray) else value for name, value in self.sim.model.parameters().items()}
+        if not self.ensemble:
+            params.update(Autopilot=physics.Autopilot, Keyboard_Control=physics.Keyboard_Control)
+        return params
+
+    @staticmethod
+    def set_label(label, text):
+        """
+        Set a HUD label's text only when the displayed value changes, setting it always rebuilds the text layout
+        """
+        if label.text != text:
+            label.text = text
+
+    def render_state(self):
+        """
+        Aircraft state to draw, interpolated between the last two physics steps by the accumulated time
+        Returns:
+            tuple: (x, y, bank)
+        """
+        alpha = self.accumulator / self.sim.dt
+        current = (self.sim.x, self.sim.y, self.sim.bank)
+        return tuple(p + alpha * (c - p) for p, c in zip(self.previous_state, current))
+
     def on_draw(self):
         """
         Render the aircraft, background, HUD elements, and grid
         Also computes relative (scaled) aircraft position for plotting and camera clamping
         """
 
-        self.clear()
-
-        # Draw background
-        self.background_img.blit(-self.cam_x, -self.cam_y)
+        start = time.perf_counter()
+        if self.last_draw is not None:
+            self.perf.add("frame time", start - self.last_draw)
+        self.last_draw = start
 
-        # Draw world grid
-        gridx = pyglet.graphics.Batch()
-        gridy = pyglet.graphics.Batch()
-        for x in range(0, pic_width+1, 200):
-            line = shapes.Line(x - self.cam_x, 0 - self.cam_y, x - self.cam_x, pic_height - self.cam_y, thickness=3, color=(150,150,205), batch=gridx)
-            gridx.draw()
-        for y in range(0, pic_height+1, 200):
-            line = shapes.Line(0 - self.cam_x, y - self.cam_y, pic_width - self.cam_x, y - self.cam_y, thickness=3, color=(150,150,205), batch=gridy)
-            gridy.draw()
-
-        # set relative coords with respect to initial position
-        self.relativex = self.aircraft_x - self.initx
-        self.relativey = self.aircraft_y - self.inity
+        self.clear()
 
-        # scaled relative coords
-        srelativex = self.relativex * self.worldscale
-        srelativey = self.relativey * self.worldscale
-        
-        self.plot_coordx = -self.cam_x + self.initx + srelativex
-        self.plot_coordy = -self.cam_y + self.inity + srelativey
+        # scaled coords relative to initial position, in world coordinates
+        x, y, bank = self.render_state()
+        world_x, world_y = self.sim.world_position(x, y)
 
         # must be negative to agree with convention. rolling right is positive bank angle for pilot's view, angle is between the (pilots) left wing and the horizontal
-        self.aircraft_sprite.rotation = -self.aircraft_angle
-        self.aircraft_sprite.x = self.plot_coordx
-        self.aircraft_sprite.y = self.plot_coordy
+        if not self.ensemble:
+            self.aircraft_sprite.update(x=world_x, y=world_y, rotation=-bank)
+        else:
+            for i, sprite in enumerate(self.aircraft_sprites):
+                sprite.update(x=world_x[i], y=world_y[i], rotation=-bank[i])
+                label = self.aircraft_labels[i]
+                label.position = (world_x[i], world_y[i] - 40, 0)
+                self.set_label(label, f"{self.sim.labels[i]}: {bank[i]:.1f}°" if self.sim.alive[i] else
+                               f"{self.sim.labels[i]}: {self.sim.messages[i]}")
+
+        # Draw background, grid and aircraft, the camera is the only thing that moves the world
+        self.view = Mat4.from_translation(Vec3(-self.cam_x, -self.cam_y, 0))
+        self.world_batch.draw()
 
-        # draw aircraft
-        self.aircraft_sprite.draw()
-        
         # Draw HUD
-        self.label_pos.draw()
-        self.label_bank.draw()
-        self.label_dbank.draw()
-        # self.label_liftl.draw()
-        # self.label_liftr.draw()
-        self.label_time.draw()
+        self.view = Mat4()
+        self.hud_batch.draw()
+
+        self.perf.add("draw time", time.perf_counter() - start)
 
 if __name__ == "__main__":
     """
     Main entry point for the aircraft visualizer simulation. 
     Run this file to start the simulation with your initial conditions inputted in __init__.
     The simulation will run until the aircraft leaves the world boundaries or exceeds safe bank angles.
+    For a run without a window, use python simulation.py instead.
+    To play back a recorded run, use python Simulator_Main.py --replay [FILE] (see replay.py).
     """
 
-    window = AircraftVisualizer()
-    pyglet.app.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Aircraft lateral stability visualizer")
+    parser.add_argument("--replay", nargs="?", const="", metavar="FILE",
+                        help="play back a flight data file instead of simulating, the most recent in ./data/ if no file is given")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed, 0.1 to 50 (default 1)")
+    parser.add_argument("--scenario", metavar="FILE", help="fly a scenario file (see scenarios.py) instead of the inputs in simulation.py")
+    args = parser.parse_args()
+
+    if args.replay is not None:
+        window = AircraftVisualizer(replay=RunReplay(args.replay or latest_run(), speed=args.speed))
+    elif args.scenario is not None:
+        window = AircraftVisualizer(scenario=load_scenario(args.scenario))
+    else:
+        window = AircraftVisualizer()
+    pyglet.app.run()
+    window.sim.close()
+    window.dump_perf()
\ No newline at end of file
@@ -1,15 +1,31 @@
 """
-Analytical solution for lateral stability aircraft motion. 
+Analytical solution for lateral stability aircraft motion.
 Uses sympy to solve linearized equations of motion.
 Version 5. Graphs used in report generated in this file
+
+The linearized system is solved once with dihedral, Mass, WingLength, cruise, I_roll and b0 as symbols.
+sympy's dsolve does not finish on the coupled system with symbolic coefficients (its characteristic equation is a cubic),
+so the general solution is kept in modal form: sums of exp(r t) over the characteristic roots r1, r2, r3,
+with the mode shapes, the cubic's coefficients and the integrated y(t) as symbolic expressions of the parameters.
+The expressions are cached in ./.symcache/ (keyed by a hash of the equations) and lambdified, and evaluate()
+computes x, y and bank for arrays of parameter values and times, the roots of each parameter set found numerically.
+Parameter sets where the modal form breaks down (repeated roots, e.g. the flat wing, or roots and root sums near zero)
+are solved exactly as one larger linear system with statespace's matrix exponential instead.
 """
-from sympy import symbols, Function, Eq, dsolve, latex, lambdify, Symbol
+import hashlib
+import json
+from functools import lru_cache
+from pathlib import Path
+from sympy import symbols, Function, Eq, latex, lambdify, Poly, cos, pi, exp, sympify, srepr, expand, solve, together
 import matplotlib.pyplot as plt
 import archive.physics_backup as physics
 import grapher
 import numpy as np
+import statespace
 
-plt.rcParams.update({'font.size': 14}) # make plot font size bigger
+cache_path = Path("./.symcache/") # solved expressions, reused until the equations change
+MAX_CONDITION = 1e8  # mode matrices worse conditioned than this are solved with the augmented system
+MIN_EXPONENT = 1e-4  # |r t| below which exp(r t) - 1 loses too many digits, also solved with the augmented system
 
 
 # variables
@@ -18,104 +34,262 @@ x = Function('x')
 y = Function('y')
 bank = Function('bank')
 
-"""
-2nd order ODE system
-"""
+# parameters, kept symbolic in the solution
+dihedral, Mass, WingLength, cruise, I_roll, b0 = symbols('dihedral Mass WingLength cruise I_roll b0', real=True)
+PARAMETERS = (dihedral, Mass, WingLength, cruise, I_roll, b0)
+
+# characteristic roots, mode amplitudes and initial values used in the modal solution
+r, r1, r2, r3 = symbols('r r1 r2 r3')
+K1, K2, K3 = symbols('K1 K2 K3')
+x0, y0, dy0 = symbols('x0 y0 dy0', real=True)
+ROOTS = (r1, r2, r3)
+AMPLITUDES = (K1, K2, K3)
+
+
+def equations():
+    """
+    2nd order ODE system, linearized about the bank angle b0 in the x equation.
+    The remaining constants come from the physics engine.
+
+    Returns:
+        tuple: sympy equations for x, y and bank
+    """
+    WingArea = WingLength * physics.WingWidth * 2
+    a_default = (Mass*physics.g / (2* 0.5 * physics.rhoA * cruise**2 * (WingArea/2) * cos(pi*dihedral/180)) - physics.cLift_a0) / physics.cL_slope # for mass to cancel with lift
+
+    c_1 = physics.cLift_a0 + physics.cL_slope * (a_default - 1)
+    c_2 = physics.cL_slope / cruise
+
+    multiplier = 0.25 * physics.rhoA * cruise**2 * WingLength
+
+    C_1 = c_1 * multiplier
+    C_2 = c_2 * multiplier
+
+    net_x_decoupled = Eq(x(t).diff(t,2), -(-2*C_1*bank(t) + 4*C_2*x(t).diff(t)*b0*dihedral)/Mass)
+    net_y_og = Eq(y(t).diff(t,2), (-Mass*physics.g+2*(C_1 - C_2*x(t).diff(t)*bank(t))/Mass))
+    net_bank = Eq(bank(t).diff(t,2), (WingLength*0.5*C_2*x(t).diff(t)*dihedral - 0.5*physics.rhoA*bank(t).diff(t)*WingArea*WingLength**2)/I_roll)
+    return net_x_decoupled, net_y_og, net_bank
+
+
+def model_version():
+    """
+    Returns:
+        str: hash of the equations and constants, names the cache file
+    """
+    return hashlib.sha1(srepr(equations()).encode()).hexdigest()[:16]
+
+
+def y_forcing():
+    """
+    The y equation written as y'' = F0 + F1 x' bank
+
+    Returns:
+        tuple: sympy expressions (F0, F1)
+    """
+    dx, bk = symbols('dx bk')
+    rhs_y = equations()[1].rhs.subs({x(t).diff(t): dx, bank(t): bk})
+    F0 = rhs_y.subs({dx: 0, bk: 0})
+    F1 = expand(rhs_y - F0).coeff(dx).coeff(bk)
+    return F0, F1
+
+
+def solve_symbolic():
+    """
+    General solution of the equations in modal form, symbolic in PARAMETERS.
+
+    With x'(t) = U exp(r t) and bank(t) = exp(r t) the x and bank equations give U(r) and a cubic in r.
+    For roots r_k and amplitudes K_k:
+        bank(t) = sum K_k exp(r_k t)
+        x(t)    = x0 + sum K_k U(r_k) (exp(r_k t) - 1) / r_k
+        y(t)    = y0 + dy0 t + F0 t^2/2 + F1 sum_jk K_j K_k U(r_j) (exp(s t) - 1 - s t) / s^2,  s = r_j + r_k
+    where y'' = F0 + F1 x' bank.
+
+    Returns:
+        dict: sympy expressions "char_poly" (coefficients of the cubic, highest power first), "mode_u" (U(r)), "x", "y", "bank"
+    """
+    net_x, net_y, net_bank = equations()
+    U, B, E = symbols('U B E')
+
+    # substitute the exponential mode, E = exp(r t)
+    mode = {x(t).diff(t, 2): r*U*E, x(t).diff(t): U*E, bank(t).diff(t, 2): r**2*B*E, bank(t).diff(t): r*B*E, bank(t): B*E}
+    eq_x = expand((net_x.lhs - net_x.rhs).subs(mode) / E)
+    eq_bank = expand((net_bank.lhs - net_bank.rhs).subs(mode) / E)
+
+    # mode shape with unit bank amplitude, then the characteristic polynomial from the bank equation
+    mode_u = solve(eq_x.subs(B, 1), U)[0]
+    char_poly = Poly(together(eq_bank.subs(B, 1).subs(U, mode_u)).as_numer_denom()[0], r)
+    char_coeffs = [c / char_poly.LC() for c in char_poly.all_coeffs()]
+
+    F0, F1 = y_forcing()
+
+    modes_u = [mode_u.subs(r, rk) for rk in ROOTS]
+    bank_expr = sum(K * exp(rk*t) for K, rk in zip(AMPLITUDES, ROOTS))
+    x_expr = x0 + sum(K * u * (exp(rk*t) - 1) / rk for K, u, rk in zip(AMPLITUDES, modes_u, ROOTS))
+    y_expr = y0 + dy0*t + F0*t**2/2
+    for Kj, uj, rj in zip(AMPLITUDES, modes_u, ROOTS):
+        for Kk, rk in zip(AMPLITUDES, ROOTS):
+            s = rj + rk
+            y_expr += F1 * Kj * Kk * uj * (exp(s*t) - 1 - s*t) / s**2
+
+    return {"char_poly": char_coeffs, "mode_u": mode_u, "x": x_expr, "y": y_expr, "bank": bank_expr}
+
+
+def cached_solution():
+    """
+    solve_symbolic, read from cache_path if the equations have not changed since it was saved
+
+    Returns:
+        dict: same as solve_symbolic
+    """
+    path = cache_path / f"analytical_solutionV5-{model_version()}.json"
+    if path.is_file():
+        with open(path) as f:
+            saved = json.load(f)
+        return {name: ([sympify(e) for e in value] if isinstance(value, list) else sympify(value)) for name, value in saved.items()}
+
+    solution = solve_symbolic()
+    cache_path.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({name: ([srepr(e) for e in value] if isinstance(value, list) else srepr(value)) for name, value in solution.items()}, f)
+    return solution
 
-# constants from physics engine
 
-c_1 = physics.cLift_a0 + physics.cL_slope * (physics.a_default - 1)
-c_2 = physics.cL_slope / physics.cruise
+@lru_cache(maxsize=None)
+def solution_functions():
+    """
+    Lambdified (numpy) versions of the cached solution
 
-multiplier = 0.25 * physics.rhoA * physics.cruise**2 * physics.WingLength
+    Returns:
+        dict: "char_poly"(*PARAMETERS) -> list of cubic coefficients, "mode_u"(r, *PARAMETERS),
+              "x"/"y"/"bank"(t, r1, r2, r3, K1, K2, K3, x0, y0, dy0, *PARAMETERS), "y_forcing"(*PARAMETERS) -> [F0, F1]
+    """
+    solution = cached_solution()
+    args = (t, *ROOTS, *AMPLITUDES, x0, y0, dy0, *PARAMETERS)
+    return {
+        "y_forcing": lambdify(PARAMETERS, list(y_forcing()), "numpy"),
+        "char_poly": lambdify(PARAMETERS, solution["char_poly"], "numpy"),
+        "mode_u": lambdify((r, *PARAMETERS), solution["mode_u"], "numpy"),
+        "x": lambdify(args, solution["x"], "numpy"),
+        "y": lambdify(args, solution["y"], "numpy"),
+        "bank": lambdify(args, solution["bank"], "numpy"),
+    }
 
-C_1 = c_1 * multiplier
-C_2 = c_2 * multiplier
 
-dihedral = 5 
-b0 = 0.2
+def characteristic_roots(dihedral=5, Mass=physics.Mass, WingLength=physics.WingLength, cruise=physics.cruise, I_roll=physics.I_roll, b0=0.2):
+    """
+    Roots of the characteristic cubic for arrays of parameters (eigenvalues of its companion matrices)
 
-net_x_og = Eq(x(t).diff(t,2), -(-2*C_1*bank(t) + 4*C_2*x(t).diff(t)*bank(t)*dihedral)/physics.Mass)
-net_x_decoupled = Eq(x(t).diff(t,2), -(-2*C_1*bank(t) + 4*C_2*x(t).diff(t)*b0*dihedral)/physics.Mass)
-net_x_decoupled_neg = Eq(x(t).diff(t,2), -(-2*C_1*bank(t) + 4*C_2*x(t).diff(t)*b0*(-dihedral))/physics.Mass)
+    Returns:
+        numpy.ndarray: complex roots, shape of the broadcast parameters + (3,)
+    """
+    params = np.broadcast_arrays(*(np.asarray(p, dtype=float) for p in (dihedral, Mass, WingLength, cruise, I_roll, b0)))
+    coeffs = [np.broadcast_to(c, params[0].shape) for c in solution_functions()["char_poly"](*params)]
+    companion = np.zeros(params[0].shape + (3, 3))
+    companion[..., 0, :] = -np.stack(coeffs[1:], axis=-1)
+    companion[..., 1, 0] = 1
+    companion[..., 2, 1] = 1
+    return np.linalg.eigvals(companion)
 
-net_y_og = Eq(y(t).diff(t,2), (-physics.Mass*physics.g+2*(C_1 - C_2*x(t).diff(t)*bank(t))/physics.Mass))
 
-net_bank_old = Eq(bank(t).diff(t,2), (physics.WingLength*0.5*C_2*x(t).diff(t) - 0.5*physics.rhoA*bank(t).diff(t)*physics.WingArea*physics.WingLength**2)/physics.I_roll)  
+def evaluate(t_list, dihedral=5, Mass=physics.Mass, WingLength=physics.WingLength, cruise=physics.cruise, I_roll=physics.I_roll,
+             b0=0.2, bank0=0.2, dbank0=0.0, dx0=0.0, x0=0.0, y0=0.0, dy0=0.0):
+    """
+    Evaluate the analytical solution for arrays of parameter values and times.
+    Parameters (and initial values) broadcast against each other, t_list is appended as the last axis.
 
-net_bank = Eq(bank(t).diff(t,2), (physics.WingLength*0.5*C_2*x(t).diff(t)*dihedral - 0.5*physics.rhoA*bank(t).diff(t)*physics.WingArea*physics.WingLength**2)/physics.I_roll)  
+    Args:
+        t_list (numpy.ndarray): times
+        dihedral, Mass, WingLength, cruise, I_roll (float or numpy.ndarray, optional): aircraft parameters
+        b0 (float or numpy.ndarray, optional): bank angle the x equation is linearized about. Defaults to 0.2.
+        bank0, dbank0 (float or numpy.ndarray, optional): initial bank angle and rate. Defaults to 0.2 and 0.
+        dx0, x0, y0, dy0 (float or numpy.ndarray, optional): initial horizontal speed and position, vertical position and speed. Default to 0.
 
-general_solution_positive_dihedral = dsolve([net_x_decoupled, net_y_og, net_bank])
-general_solution_negative_dihedral = dsolve([net_x_decoupled_neg, net_y_og, net_bank])
+    Returns:
+        tuple: (x, y, bank) arrays of shape params + t_list
+    """
+    funcs = solution_functions()
+    params = np.broadcast_arrays(*(np.asarray(p, dtype=float) for p in (dihedral, Mass, WingLength, cruise, I_roll, b0, bank0, dbank0, dx0, x0, y0, dy0)))
+    model, initial = params[:6], params[6:]
+    bank0, dbank0, dx0, x0, y0, dy0 = initial
+    roots = characteristic_roots(*model)
+    t_list = np.asarray(t_list, dtype=float)
 
-# Extract equations from sympy dsolve general solution
-x_eqn = general_solution_positive_dihedral[0].rhs
-x_eqn_neg = general_solution_negative_dihedral[0].rhs
-y_eqn = general_solution_positive_dihedral[1].rhs
-y_eqn_neg = general_solution_negative_dihedral[1].rhs
-bank_eqn = general_solution_positive_dihedral[2].rhs
-bank_eqn_neg = general_solution_negative_dihedral[2].rhs
+    # amplitudes from the initial x', bank and bank', U(r) is infinite for the flat wing's zero roots
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mode_u = funcs["mode_u"](roots, *(p[..., None] for p in model))
+    modes = np.stack([mode_u, np.ones_like(roots), roots], axis=-2)
+    degenerate = ~np.all(np.isfinite(modes), axis=(-2, -1))
+    modes = np.where(degenerate[..., None, None], np.eye(3), modes)
+    degenerate |= np.linalg.cond(modes) > MAX_CONDITION
+    # the x and y terms divide by r_k and by r_j + r_k (the diagonal covers r_k)
+    root_sums = roots[..., :, None] + roots[..., None, :]
+    degenerate |= np.any(np.abs(root_sums) * np.max(np.abs(t_list), initial=0) < MIN_EXPONENT, axis=(-2, -1))
+    modes = np.where(degenerate[..., None, None], np.eye(3), modes)
+    amplitudes = np.linalg.solve(modes, np.stack([dx0, bank0, dbank0], axis=-1).astype(complex)[..., None])[..., 0]
 
-# General solutions has 6 integration constants defined below.
-C1, C2, C3, C4, C5, C6 = symbols('C1 C2 C3 C4 C5 C6')
+    expand_t = lambda a: a[..., None]
+    args = (t_list, *(expand_t(roots[..., k]) for k in range(3)), *(expand_t(amplitudes[..., k]) for k in range(3)),
+            expand_t(x0), expand_t(y0), expand_t(dy0), *(expand_t(p) for p in model))
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        result = [np.real(funcs[name](*args)) * np.ones(degenerate.shape + t_list.shape) for name in ("x", "y", "bank")]
 
-# Integration constants to set initial conditions
-# v6 of this code specifies initial conditions
+    if np.any(degenerate):
+        exact = augmented_solution(t_list, *(p[degenerate] for p in model), *(v[degenerate] for v in initial))
+        for values, replacement in zip(result, exact):
+            values[degenerate] = replacement
+    return tuple(result)
 
-integration_constants_dihedral = {
-    C1: 1e6,
-    C2: 0.0,
-    C3: 1e2,
-    C4: 0.0,
-    C5: 0.0,
-    C6: 0.0
-}
-integration_constants_anhedral = {
-    C1: 5e4,
-    C2: -5e4,
-    C3: 1e1,
-    C4: -1e1,
-    C5: 1e-2,
-    C6: -1e-2
-}
 
-integration_constants = integration_constants_dihedral
+def augmented_solution(t_list, dihedral, Mass, WingLength, cruise, I_roll, b0, bank0, dbank0, dx0, x0, y0, dy0):
+    """
+    x, y and bank without the modal form, for parameter sets where it breaks down.
+    With s = (x', bank, bank') and ds/dt = B s, the products z = s s^T obey dz/dt = B z + z B^T, which is linear,
+    so (x, s, z, y, y', 1) is one linear system of 16 states, solved exactly by statespace.solve.
 
-x_specific = x_eqn.subs(integration_constants)
-y_specific = y_eqn.subs(integration_constants)
-bank_specific = bank_eqn.subs(integration_constants)
+    Args:
+        t_list (numpy.ndarray): times
+        the rest (numpy.ndarray): 1d arrays of parameters and initial values, see evaluate
 
-x_specific_neg = x_eqn_neg.subs(integration_constants)
-y_specific_neg = y_eqn_neg.subs(integration_constants)
-bank_specific_neg = bank_eqn_neg.subs(integration_constants)
+    Returns:
+        tuple: (x, y, bank) arrays of shape (len(dihedral), len(t_list))
+    """
+    lateral = statespace.lateral_matrix(dihedral, Mass, WingLength, cruise, I_roll, b0)
+    B = lateral[:, 1:, 1:]
+    F0, F1 = (np.broadcast_to(f, dihedral.shape) for f in solution_functions()["y_forcing"](dihedral, Mass, WingLength, cruise, I_roll, b0))
 
-# convert to numpy functions !!!
-x_numpy = lambdify(t, x_specific, "numpy")
-y_numpy = lambdify(t, y_specific, "numpy")
-bank_numpy = lambdify(t, bank_specific, "numpy")
+    # state indices: 0 x, 1-3 s, 4-12 z (z[3 i + j] = s_i s_j), 13 y, 14 y', 15 constant 1
+    A = np.zeros(dihedral.shape + (16, 16))
+    A[:, :4, :4] = lateral
+    identity = np.eye(3)
+    A[:, 4:13, 4:13] = (np.einsum("kab,ij->kaibj", B, identity) + np.einsum("ij,kab->kiajb", identity, B)).reshape(-1, 9, 9)
+    A[:, 13, 14] = 1
+    A[:, 14, 4 + 1] = F1  # x' bank = s_0 s_1
+    A[:, 14, 15] = F0
 
-x_numpy_neg = lambdify(t, x_specific_neg, "numpy")
-y_numpy_neg = lambdify(t, y_specific_neg, "numpy")
-bank_numpy_neg = lambdify(t, bank_specific_neg, "numpy")
+    s0 = np.stack([dx0, bank0, dbank0], axis=-1)
+    state0 = np.concatenate([x0[:, None], s0, (s0[:, :, None] * s0[:, None, :]).reshape(-1, 9),
+                             y0[:, None], dy0[:, None], np.ones_like(x0)[:, None]], axis=-1)
+    states = statespace.solve(A, state0, t_list)
+    return states[..., 0], states[..., 13], states[..., 2]
 
-# print out LaTeX equation output
-print("Equations formatted in LaTeX:")
-#print("bank(t) DIHEDRAL = {}".format(latex(bank_specific)))
-print("bank(t) ANHEDRAL = {}".format(latex(bank_specific_neg)))
 
+if __name__ == "__main__":
+    plt.rcParams.update({'font.size': 14}) # make plot font size bigger
 
-# plot
-t_list = np.linspace(0, 13, 1000) # lambda function are cool. it can compute x_numpy for an arbitrary size of t_list :O
-x_list = x_numpy(t_list)
-y_list = y_numpy(t_list)
-bank_list = bank_numpy(t_list) / 250 # since integration constants were chosen to give the best visual, scale it down to give realistic initial conditions. 
+    # print out LaTeX equation output
+    print("Equations formatted in LaTeX:")
+    coeffs = cached_solution()["char_poly"]
+    print("characteristic polynomial = {}".format(latex(sum(c * r**(3 - i) for i, c in enumerate(coeffs)))))
+    print("roots DIHEDRAL:", characteristic_roots(dihedral=5))
+    print("roots ANHEDRAL:", characteristic_roots(dihedral=-5))
 
-x_list_neg = x_numpy_neg(t_list)
-y_list_neg = y_numpy_neg(t_list)
-bank_list_neg = bank_numpy_neg(t_list) / 85000
+    # plot
+    t_list = np.linspace(0, 13, 1000)
+    x_list, y_list, bank_list = evaluate(t_list, dihedral=5)
+    _, _, bank_list_neg = evaluate(t_list, dihedral=-5)
 
-grapher.plot_solution_more_params(x_list, t_list, title="analytical solution - x vs t",  ylabel="horizontal position (m)")
-grapher.plot_solution_more_params(y_list, t_list, title="analytical solution - y vs t", ylabel="vertical position (m)")
-grapher.plot_solution_more_params(bank_list, t_list, title="Dihedral Analytical Solution - Bank vs time", ylabel="bank angle (rad)")
-grapher.plot_solution_more_params(bank_list_neg, t_list, title="Anhedral Analytical Solution - Bank vs time", ylabel="bank angle (rad)")
-plt.show()
\ No newline at end of file
+    grapher.plot_solution_more_params(x_list, t_list, title="analytical solution - x vs t",  ylabel="horizontal position (m)")
+    grapher.plot_solution_more_params(y_list, t_list, title="analytical solution - y vs t", ylabel="vertical position (m)")
+    grapher.plot_solution_more_params(bank_list, t_list, title="Dihedral Analytical Solution - Bank vs time", ylabel="bank angle (rad)")
+    grapher.plot_solution_more_params(bank_list_neg, t_list, title="Anhedral Analytical Solution - Bank vs time", ylabel="bank angle (rad)")
+    plt.show()
@@ -0,0 +1,247 @@
+"""
+SQLite catalog of the runs in ./data/ (data/catalog.sqlite), so runs can be found by configuration and outcome
+without opening the flight data.
+
+Each run file gets one row: configuration, sample count, duration, outcome, largest |bank| and final state.
+update() only rescans files whose modification time or size changed, and drops rows of deleted files.
+Files that are not flight data (e.g. a batch summary.txt) keep a row with format "not flight data", so they are
+not parsed again until they change, and query() leaves them out.
+The configuration comes from the header of .run files. Text files have no header, so it is read from the
+file name convention of the reference runs (dih/an/flat, const, ap, initial bank), and left empty otherwise.
+
+    python catalog.py                                       update and list every run
+    python catalog.py --where "dihedral < 0 AND max_abs_bank > 90"
+    python grapher.py --where "dihedral > 0 AND Constant_Altitude = 1"   overlay the matching runs
+"""
+import argparse
+import json
+import re
+import sqlite3
+from pathlib import Path
+import numpy as np
+import runformat
+from simulation import TIMEOUT, WORLDSCALE, WINDOW_HEIGHT, PIC_WIDTH, PIC_HEIGHT
+
+CATALOG_NAME = "catalog.sqlite"
+NOT_FLIGHT_DATA = "not flight data"  # format of rows for files that are not runs
+
+# queryable columns besides the full configuration (config, JSON)
+COLUMNS = {
+    "path": "TEXT PRIMARY KEY",
+    "mtime_ns": "INTEGER",
+    "size": "INTEGER",
+    "format": "TEXT",
+    "config_source": "TEXT",
+    "dihedral": "REAL",
+    "Mass": "REAL",
+    "WingLength": "REAL",
+    "Constant_Altitude": "INTEGER",
+    "Autopilot": "INTEGER",
+    "initial_bank": "REAL",
+    "samples": "INTEGER",
+    "duration": "REAL",
+    "outcome": "TEXT",
+    "max_abs_bank": "REAL",
+    "final_x": "REAL",
+    "final_y": "REAL",
+    "final_bank": "REAL",
+    "config": "TEXT",
+}
+
+# reference run names, e.g. "crit dih 15 const" (see scenarios/reference)
+NAME_DIHEDRAL = {"dih": 7, "an": -3, "flat": 0}
+NAME_WINGLENGTH = {"small": 5, "large": 7.5}
+
+
+def config_from_name(name):
+    """
+    Configuration encoded in a reference run file name
+    Args:
+        name (str): file name without suffix, e.g. "crit dih 15 const"
+    Returns:
+        dict: physics parameters and initial bank found in the name, empty if it does not follow the convention
+    """
+    words = name.split()
+    dihedral = [NAME_DIHEDRAL[w] for w in words if w in NAME_DIHEDRAL]
+    if not dihedral:
+        return {}
+    const = "const" in words
+    config = {"physics": {"dihedral": dihedral[0], "Constant_Altitude": const, "Autopilot": "ap" in words}}
+    if words[0] in NAME_WINGLENGTH:
+        config["physics"]["WingLength"] = NAME_WINGLENGTH[words[0]]
+    elif re.match("crit?$", words[0]):
+        config["physics"]["WingLength"] = 5.75 if const else 5.25
+    banks = [float(w) for w in words if re.fullmatch(r"-?\d+(\.\d+)?", w)]
+    if banks:
+        config["initial_state"] = {"bank": banks[0]}
+    return config
+
+
+def outcome(data, header):
+    """
+    How a run ended, from its last sample (failure conditions of FlightSimulation)
+    Args:
+        data (numpy.ndarray): structured array with fields x, y, bank, t
+        header (dict): run header, may be empty
+    Returns:
+        str: "bank exceeded", "left world", "timeout" or "stopped" (stall, or window closed)
+    """
+    last = data[-1]
+    initial = header.get("initial_state", {})
+    initx = initial.get("x", PIC_WIDTH/2)
+    inity = initial.get("y", PIC_HEIGHT - WINDOW_HEIGHT/2)
+    scale = header.get("worldscale", WORLDSCALE)
+    world_x = initx + (last["x"] - initx) * scale
+    world_y = inity + (last["y"] - inity) * scale
+    timeout = header.get("timeout", TIMEOUT)
+
+    if abs(last["bank"]) > 90:
+        return "bank exceeded"
+    if not (0 <= world_x <= PIC_WIDTH and 0 <= world_y <= PIC_HEIGHT):
+        return "left world"
+    if timeout is not None and last["t"] >= timeout:
+        return "timeout"
+    return "stopped"
+
+
+def scan_run(path):
+    """
+    Catalog row for one run file
+    Args:
+        path (Path): .txt or .run file
+    Returns:
+        dict: values for COLUMNS
+    """
+    stat = path.stat()
+    header, data = runformat.load_run(path)
+    if header is not None:
+        config, source = {k: header[k] for k in ("physics", "initial_state", "timeout", "worldscale") if k in header}, "header"
+    else:
+        config = config_from_name(path.stem)
+        source = "name" if config else None
+        header = config
+    physics = config.get("physics", {})
+
+    row = dict.fromkeys(COLUMNS)
+    row.update(path=path.as_posix(), mtime_ns=stat.st_mtime_ns, size=stat.st_size, format=path.suffix[1:],
+               config_source=source, config=json.dumps(config, sort_keys=True), samples=len(data),
+               initial_bank=config.get("initial_state", {}).get("bank"))
+    for name in ("dihedral", "Mass", "WingLength", "Constant_Altitude", "Autopilot"):
+        row[name] = physics.get(name)
+    if len(data):
+        bank = np.asarray(data["bank"])
+        row.update(duration=float(data["t"][-1]), outcome=outcome(data, header), max_abs_bank=float(np.max(np.abs(bank))),
+                   final_x=float(data["x"][-1]), final_y=float(data["y"][-1]), final_bank=float(bank[-1]))
+    return row
+
+
+class Catalog:
+    """
+    SQLite index of run files, query() returns rows as dicts
+    """
+
+    def __init__(self, directory="./data/", path=None):
+        """
+        Args:
+            directory (Path, optional): data directory, searched recursively. Defaults to "./data/".
+            path (Path, optional): database file. Defaults to catalog.sqlite in directory.
+        """
+        self.directory = Path(directory)
+        self.path = Path(path) if path is not None else self.directory / CATALOG_NAME
+        self.db = sqlite3.connect(self.path)
+        self.db.row_factory = sqlite3.Row
+        columns = ", ".join(f'"{name}" {kind}' for name, kind in COLUMNS.items())
+        self.db.execute(f"CREATE TABLE IF NOT EXISTS runs ({columns})")
+
+    def update(self):
+        """
+        Rescan new and changed run files, forget deleted ones
+        Returns:
+            tuple: (number of files scanned, number of rows removed)
+        """
+        known = {row["path"]: (row["mtime_ns"], row["size"]) for row in self.db.execute("SELECT path, mtime_ns, size FROM runs")}
+        files = [f for f in sorted(self.directory.rglob("*")) if f.is_file() and f.suffix in (".txt", runformat.RUN_SUFFIX)]
+        present = set()
+        scanned = []
+        for f in files:
+            key = f.as_posix()
+            present.add(key)
+            stat = f.stat()
+            if known.get(key) != (stat.st_mtime_ns, stat.st_size):
+                try:
+                    scanned.append(scan_run(f))
+                except ValueError:
+                    # not flight data, e.g. a batch summary table, remembered so it is not parsed again
+                    row = dict.fromkeys(COLUMNS)
+                    row.update(path=key, mtime_ns=stat.st_mtime_ns, size=stat.st_size, format=NOT_FLIGHT_DATA, config="{}")
+                    scanned.append(row)
+        removed = [(key,) for key in known if key not in present]
+
+        names = ", ".join(f'"{name}"' for name in COLUMNS)
+        with self.db:
+            self.db.executemany(f"INSERT OR REPLACE INTO runs ({names}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                                [tuple(row[name] for name in COLUMNS) for row in scanned])
+            self.db.executemany("DELETE FROM runs WHERE path = ?", removed)
+        return len(scanned), len(removed)
+
+    def query(self, where=None, params=(), order_by="path", include_skipped=False):
+        """
+        Select runs, e.g. query("dihedral < 0 AND max_abs_bank > 90")
+        Args:
+            where (str, optional): SQL condition on COLUMNS, ? placeholders filled from params. Defaults to all runs.
+            params (tuple, optional): placeholder values. Defaults to none.
+            order_by (str, optional): SQL ordering. Defaults to "path".
+            include_skipped (bool, optional): also return the rows of files that are not flight data. Defaults to False.
+        Returns:
+            list: dicts of COLUMNS, config decoded
+        """
+        conditions = [f"({where})"] if where else []
+        if not include_skipped:
+            conditions.append(f"format != '{NOT_FLIGHT_DATA}'")
+        sql = "SELECT * FROM runs" + (f" WHERE {' AND '.join(conditions)}" if conditions else "") + f" ORDER BY {order_by}"
+        rows = [dict(row) for row in self.db.execute(sql, params)]
+        for row in rows:
+            row["config"] = json.loads(row["config"])
+        return rows
+
+    def paths(self, where=None, params=()):
+        """
+        Paths of the matching runs, see query
+        Returns:
+            list: run file paths
+        """
+        return [row["path"] for row in self.query(where, params)]
+
+    def close(self):
+        self.db.close()
+
+
+def format_rows(rows):
+    """
+    Runs as an aligned text table
+    Args:
+        rows (list): dicts from Catalog.query
+    Returns:
+        str: table
+    """
+    columns = ("path", "dihedral", "WingLength", "Constant_Altitude", "Autopilot", "initial_bank",
+               "duration", "outcome", "max_abs_bank", "final_bank")
+    cells = [[("" if row[c] is None else f"{row[c]:.4g}" if isinstance(row[c], float) else str(row[c])) for c in columns]
+             for row in rows]
+    widths = [max([len(c)] + [len(r[i]) for r in cells]) for i, c in enumerate(columns)]
+    lines = ["  ".join(c.ljust(w) for c, w in zip(columns, widths))]
+    lines += ["  ".join(v.ljust(w) for v, w in zip(r, widths)) for r in cells]
+    return "\n".join(line.rstrip() for line in lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update and query the run catalog")
+    parser.add_argument("--where", default=None, help='SQL condition, e.g. "dihedral < 0 AND max_abs_bank > 90"')
+    parser.add_argument("--data", default="./data/", help="data directory (default ./data/)")
+    args = parser.parse_args()
+
+    catalog = Catalog(args.data)
+    scanned, removed = catalog.update()
+    print(f"{scanned} files scanned, {removed} removed\n")
+    print(format_rows(catalog.query(args.where)))
+    catalog.close()
@@ -0,0 +1,154 @@
+"""
+Buffered flight data logging.
+Samples are stored in preallocated NumPy chunks and written to disk in whole chunks by a background thread,
+so recording a sample on the simulation/render thread is only an array assignment.
+"""
+import atexit
+import queue
+import threading
+import time
+from pathlib import Path
+import numpy as np
+import runformat
+
+
+class FlightLogger:
+    """
+    Appends (x, y, bank, t) samples to a flight data file in the text format read by grapher.py:
+
+        horizontal position (m)     vertical position (m)     bank angle (deg)    time (s)
+
+    or, if the path ends in .run, in the binary format of runformat.py with `header` written first.
+
+    A ring of `ring_chunks` buffers of `chunk_size` rows is allocated up front. The simulation fills one buffer,
+    hands it to the writer thread when it is full (or every `flush_interval` seconds) and moves on to the next free one.
+    Data reaches the file at least every flush_interval seconds, and everything is flushed by close(), which also runs at exit.
+    If the writer thread fails (e.g. the file cannot be opened), the error is raised from the next log, flush or close.
+    """
+
+    def __init__(self, path, header=None, chunk_size=1024, ring_chunks=4, flush_interval=1.0):
+        """
+        Args:
+            path (Path): flight data file, samples are appended
+            header (dict, optional): run metadata for .run files. Defaults to none.
+            chunk_size (int, optional): samples per buffer. Defaults to 1024.
+            ring_chunks (int, optional): number of preallocated buffers. Defaults to 4.
+            flush_interval (float, optional): longest time in seconds a sample waits in memory. Defaults to 1.0.
+        """
+        self.path = Path(path)
+        self.header = header or {}
+        self.binary = self.path.suffix == runformat.RUN_SUFFIX
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+
+        self._free = queue.Queue()
+        for _ in range(ring_chunks):
+            self._free.put(np.empty((chunk_size, 4)))
+        self._pending = queue.Queue()
+
+        self._buffer = self._free.get()
+        self._count = 0
+        self._last_flush = time.monotonic()
+        self.closed = False
+        self._error = None  # first exception raised in the writer thread
+        # optional callable, given the seconds each chunk took to write (called from the writer thread)
+        self.on_write = None
+
+        self._thread = threading.Thread(target=self._writer, name="FlightLogger", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, x, y, bank, t):
+        """
+        Record one sample
+        Args:
+            x (float): horizontal position
+            y (float): vertical position
+            bank (float): bank angle
+            t (float): time
+        """
+        self._check_writer()
+        self._buffer[self._count] = (x, y, bank, t)
+        self._count += 1
+        if self._count == self.chunk_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Hand the samples recorded so far to the writer thread
+        """
+        self._check_writer()
+        self._last_flush = time.monotonic()
+        if self._count == 0:
+            return
+        self._pending.put((self._buffer, self._count))
+        # blocks only if the writer is a whole ring behind
+        self._buffer = self._free.get()
+        self._count = 0
+
+    def close(self):
+        """
+        Flush remaining samples and wait for them to be written. Safe to call more than once.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.flush()
+        finally:
+            self._pending.put(None)
+            self._thread.join()
+            atexit.unregister(self.close)
+        self._check_writer()
+
+    def _check_writer(self):
+        """
+        Raise the exception the writer thread stopped writing with, if any
+        """
+        if self._error is not None:
+            raise self._error
+
+    def _writer(self):
+        """
+        Background thread, writes chunks in the order they were flushed.
+        After an error the remaining chunks are dropped, but their buffers still go back to the ring so flush never blocks.
+        """
+        file = None
+        try:
+            while True:
+                item = self._pending.get()
+                if item is None:
+                    break
+                buffer, count = item
+                try:
+                    if self._error is None:
+                        start = time.perf_counter()
+                        if file is None:
+                            file = self._open()
+                        if self.binary:
+                            file.write(buffer[:count].astype("<f8").tobytes())
+                        else:
+                            # same number formatting as str(float)
+                            file.write("".join(f"{x} {y} {bank} {t}\n" for x, y, bank, t in buffer[:count].tolist()))
+                        file.flush()
+                        if self.on_write is not None:
+                            self.on_write(time.perf_counter() - start)
+                except Exception as error:
+                    self._error = error
+                finally:
+                    self._free.put(buffer)
+        finally:
+            if file is not None:
+                file.close()
+
+    def _open(self):
+        """
+        Open the file for appending, a new .run file starts with its header
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.binary:
+            return open(self.path, "a")
+        file = open(self.path, "ab")
+        if file.tell() == 0:
+            file.write(runformat.encode_header(self.header))
+        return file
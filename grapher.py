@@ -1,15 +1,64 @@
 """
 Functions to graph time series data from simulation flight data. 
 """
+import argparse
+import glob
+import hashlib
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 import numpy as np
 import matplotlib.pyplot as plt
-import os
+import runformat
+
+directory_path = "./data/" # Directory that contains data files, only scanned when a plot needs the most recent file
+cache_path = Path("./.runcache/") # Parsed text runs, so comparing them again skips parsing
+
+
+def minmax_downsample(t_list, sol_list, buckets):
+    """
+    Reduce a series to the minimum and maximum of each of `buckets` equal slices, in time order.
+    At one bucket per horizontal pixel the plot looks the same as the full series (peaks are kept) with at most 2*buckets points.
+
+    Args:
+        t_list (numpy.ndarray): t series
+        sol_list (numpy.ndarray): y series
+        buckets (int): number of slices, e.g. the axes width in pixels
+
+    Returns:
+        tuple: (t, y) arrays, unchanged if the series is already short enough
+    """
+    t_list = np.asarray(t_list)
+    sol_list = np.asarray(sol_list)
+    n = len(sol_list)
+    if buckets <= 0 or n <= 2 * buckets:
+        return t_list, sol_list
+
+    size = n // buckets
+    used = size * buckets
+    blocks = sol_list[:used].reshape(buckets, size)
+    start = np.arange(buckets) * size
+    lo = start + np.argmin(blocks, axis=1)
+    hi = start + np.argmax(blocks, axis=1)
+    # the first sample (the initial condition), the leftover tail and the last sample, so the plot starts and ends where the data does
+    index = np.unique(np.concatenate([[0], lo, hi, np.arange(used, n), [n - 1]]))
+    return t_list[index], sol_list[index]
+
+
+def display_buckets(fig=None):
+    """
+    Horizontal resolution of a figure in pixels, the number of min/max buckets worth plotting
+
+    Args:
+        fig (matplotlib.figure.Figure, optional): figure. Defaults to the current figure.
+
+    Returns:
+        int: width in pixels
+    """
+    fig = fig or plt.gcf()
+    return int(fig.get_figwidth() * fig.dpi)
 
-directory_path = "./data/" # Directory that contains data files
-files = [os.path.join(directory_path, f) for f in os.listdir(directory_path) if os.path.isfile(os.path.join(directory_path, f))]
-files.sort(key=os.path.getmtime)
-file_path = files[-1] # Get most recently modified file; most recent simulation data
-print(file_path)
 
 def plot_solution(sol_list, t_list, title="a cool title", xlabel="time (s)", ylabel="something cool"):
     """
@@ -23,34 +72,31 @@ def plot_solution(sol_list, t_list, title="a cool title", xlabel="time (s)", yla
         ylabel (str, optional): y axis label. Defaults to "something cool".
     """
     
-    plt.figure()
+    fig = plt.figure()
     plt.xlabel(xlabel)
     plt.ylabel(ylabel)
     plt.grid()
-    plt.plot(t_list, sol_list)
+    plt.plot(*minmax_downsample(t_list, sol_list, display_buckets(fig)))
     plt.title(title)
     plt.show(block=False)
     
-def plot_solution_from_file(filename=file_path):
+def plot_solution_from_file(filename=None):
     """
-    Plot x,y,bank vs t data from most recent text file
+    Plot x,y,bank vs t data from a data file (text or binary .run), long runs are downsampled to the figure width
 
     Args:
-        filename (string, optional): text file path. Defaults to file_path.
+        filename (string, optional): data file path. Defaults to the most recent file in directory_path.
     """
-    # get number of datapoints
-    x_list = []
-    y_list = []
-    bank_list = []
-    t_list = []
-    
-    with open(filename, 'r') as file: # split file int x, y, bank, and t lists
-        for line in file:
-            values = line.strip().split()
-            x_list.append(float(values[0]))
-            y_list.append(float(values[1]))
-            bank_list.append(float(values[2]))
-            t_list.append(float(values[3]))
+    if filename is None:
+        filename = runformat.latest_run(directory_path)
+    print(filename)
+    header, data = runformat.load_fastest(filename)
+    if header is not None:
+        print(header["physics"] if "physics" in header else header)
+    x_list = data["x"]
+    y_list = data["y"]
+    bank_list = data["bank"]
+    t_list = data["t"]
     plot_solution(x_list, t_list, "x vs t", ylabel="x position (m)")
     plot_solution(y_list, t_list, "y vs t", ylabel="y position (m)")
     plot_solution(bank_list, t_list, "Bank vs t", ylabel="bank angle (°)")
@@ -67,13 +113,295 @@ def plot_solution_more_params(sol_list, t_list, title="a cool title", xlabel="ti
         xlabel (str, optional): matplotlib x axis label. Defaults to "time (s)".
         ylabel (str, optional): matplotlib y axis label. Defaults to "something cool".
     """
-    plt.figure()
-    plt.plot(t_list, sol_list)
+    fig = plt.figure()
+    plt.plot(*minmax_downsample(t_list, sol_list, display_buckets(fig)))
     plt.title(title)
     plt.xlabel(xlabel)
     plt.ylabel(ylabel)
     plt.grid()
     plt.show(block=False)
 
+def cached_run(filename):
+    """
+    Load a run, text runs are parsed once and then read from a .npy copy in cache_path
+    (keyed by path, modification time and size, so an edited or regrown file is parsed again)
+
+    Args:
+        filename (string): data file path
+
+    Returns:
+        numpy.ndarray: structured array with fields x, y, bank, t
+    """
+    path = Path(filename)
+    if path.suffix == runformat.RUN_SUFFIX:
+        return runformat.load_run(path)[1]
+
+    stat = path.stat()
+    key = hashlib.sha1(f"{path.resolve()}|{stat.st_mtime_ns}|{stat.st_size}".encode()).hexdigest()
+    cached = cache_path / f"{key}.npy"
+    if cached.is_file():
+        return np.load(cached, mmap_mode="r")
+
+    data = runformat.load_fastest(path, mmap=False)[1]
+    cache_path.mkdir(parents=True, exist_ok=True)
+    # write then rename so a parallel or interrupted writer never leaves half a file
+    partial = cached.with_suffix(f".{os.getpid()}.tmp")
+    with open(partial, "wb") as f:
+        np.save(f, np.ascontiguousarray(data))
+    os.replace(partial, cached)
+    return data
+
+
+def load_runs(filenames, workers=None):
+    """
+    Load several runs, parsing uncached text runs in parallel processes
+
+    Args:
+        filenames (list): data file paths
+        workers (int, optional): number of processes. Defaults to the number of CPUs.
+
+    Returns:
+        list: structured arrays, in the order of filenames
+    """
+    filenames = [Path(f) for f in filenames]
+    workers = min(workers or os.cpu_count() or 1, len(filenames))
+    if workers <= 1:
+        return [cached_run(f) for f in filenames]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # mmapped cache hits are reopened here rather than pickled back from a worker
+        list(pool.map(cached_run, filenames))
+    return [cached_run(f) for f in filenames]
+
+
+def common_time_base(runs, dt=None):
+    """
+    Interpolate runs onto one time grid, NaN outside each run's own time range
+
+    Args:
+        runs (list): structured arrays with fields x, y, bank, t
+        dt (float, optional): grid spacing. Defaults to the smallest median sample spacing of the runs.
+
+    Returns:
+        tuple: (t grid, dict of column name -> 2D array with one row per run)
+    """
+    if dt is None:
+        dt = min(float(np.median(np.diff(run["t"]))) for run in runs if len(run) > 1)
+    start = min(float(run["t"][0]) for run in runs)
+    end = max(float(run["t"][-1]) for run in runs)
+    t = np.arange(start, end + dt / 2, dt)
+
+    aligned = {}
+    for name in ("x", "y", "bank"):
+        rows = np.full((len(runs), len(t)), np.nan)
+        for i, run in enumerate(runs):
+            inside = (t >= run["t"][0]) & (t <= run["t"][-1])
+            rows[i, inside] = np.interp(t[inside], run["t"], run[name])
+        aligned[name] = rows
+    return t, aligned
+
+
+def plot_comparison(filenames, workers=None, dt=None):
+    """
+    Overlay bank, x and y of several runs on shared time axes
+
+    Args:
+        filenames (list): data file paths, e.g. expand_runs(["data/crit dih*"])
+        workers (int, optional): processes for parsing. Defaults to the number of CPUs.
+        dt (float, optional): common time base spacing. Defaults to the finest run's sample spacing.
+    """
+    runs = load_runs(filenames, workers)
+    t, aligned = common_time_base(runs, dt)
+
+    fig, axes = plt.subplots(3, 1, sharex=True, figsize=(10, 8))
+    buckets = display_buckets(fig)
+    labels = [("bank", "bank angle (°)"), ("x", "x position (m)"), ("y", "y position (m)")]
+    for ax, (name, ylabel) in zip(axes, labels):
+        for filename, row in zip(filenames, aligned[name]):
+            valid = ~np.isnan(row)
+            ax.plot(*minmax_downsample(t[valid], row[valid], buckets), label=Path(filename).stem)
+        ax.set_ylabel(ylabel)
+        ax.grid()
+    axes[0].legend(fontsize="small")
+    axes[0].set_title("Run comparison")
+    axes[-1].set_xlabel("time (s)")
+    plt.show()
+
+
+class RunTail:
+    """
+    Follows a run file that is still being written, read() returns only the samples appended since the last call.
+    Only the new bytes are read; a partly written last line (text) or record (.run) is kept for the next call.
+    """
+
+    def __init__(self, filename):
+        """
+        Args:
+            filename (string): data file path, text or .run
+        """
+        self.path = Path(filename)
+        self.binary = self.path.suffix == runformat.RUN_SUFFIX
+        self.offset = None  # start of the unread data, None until a .run header has been read
+        self.pending = b""
+        self.data = np.empty((1024, 4))
+        self.count = 0
+
+    def read(self):
+        """
+        Read the samples appended since the last call
+        Returns:
+            int: number of new samples, now at the end of samples()
+        """
+        if self.offset is None:
+            if not self.binary:
+                self.offset = 0
+            else:
+                try:
+                    self.offset = runformat.read_header(self.path)[1]
+                except (OSError, ValueError, struct.error):
+                    return 0  # header not written yet
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            chunk = self.pending + f.read()
+            self.offset = f.tell()
+
+        if self.binary:
+            usable = len(chunk) - len(chunk) % runformat.RUN_DTYPE.itemsize
+            new = np.frombuffer(chunk[:usable], dtype="<f8").reshape(-1, 4)
+        else:
+            usable = chunk.rfind(b"\n") + 1
+            new = np.array(chunk[:usable].split(), dtype=float).reshape(-1, 4)
+        self.pending = chunk[usable:]
+
+        if self.count + len(new) > len(self.data):
+            grown = np.empty((max(2 * len(self.data), self.count + len(new)), 4))
+            grown[:self.count] = self.data[:self.count]
+            self.data = grown
+        self.data[self.count:self.count + len(new)] = new
+        self.count += len(new)
+        return len(new)
+
+    def samples(self):
+        """
+        Returns:
+            numpy.ndarray: every sample read so far, columns x, y, bank, t
+        """
+        return self.data[:self.count]
+
+
+def plot_live(filename=None, interval=0.25):
+    """
+    Plot bank, x and y of a run while the simulator is writing it, refreshed every `interval` seconds.
+    Each refresh reads only the appended bytes (RunTail) and redraws only the lines with blitting;
+    the whole figure is redrawn only when the data outgrows the axes limits or the window changes.
+    Data arrives as often as the simulator's FlightLogger flushes (about once a second).
+
+    Args:
+        filename (string, optional): data file path. Defaults to the most recent file in directory_path.
+        interval (float, optional): seconds between refreshes. Defaults to 0.25.
+    """
+    if filename is None:
+        filename = runformat.latest_run(directory_path)
+    tail = RunTail(filename)
+
+    fig, axes = plt.subplots(3, 1, sharex=True, figsize=(10, 8))
+    labels = [(2, "bank angle (°)"), (0, "x position (m)"), (1, "y position (m)")]
+    lines = [ax.plot([], [], animated=True)[0] for ax in axes]
+    status = axes[0].text(0.01, 0.95, "", transform=axes[0].transAxes, va="top", animated=True)
+    for ax, (_, ylabel) in zip(axes, labels):
+        ax.set_ylabel(ylabel)
+        ax.grid()
+    axes[0].set_title(f"Live: {Path(filename).name}")
+    axes[-1].set_xlabel("time (s)")
+    state = {"background": None}
+
+    def draw_artists():
+        for artist in lines + [status]:
+            fig.draw_artist(artist)
+
+    def on_draw(event):
+        # full redraw (limits changed, resize): keep the static parts for blitting
+        state["background"] = fig.canvas.copy_from_bbox(fig.bbox)
+        draw_artists()
+
+    def fits(ax, lo, hi):
+        low, high = ax.get_ylim()
+        return low <= lo and hi <= high
+
+    def refresh():
+        if tail.read() == 0 and state["background"] is not None:
+            return
+        data = tail.samples()
+        if len(data) == 0:
+            return
+        t = data[:, 3]
+        buckets = display_buckets(fig)
+        for line, (column, _) in zip(lines, labels):
+            line.set_data(*minmax_downsample(t, data[:, column], buckets))
+        status.set_text(f"t = {t[-1]:.1f} s, {len(data)} samples")
+
+        rescale = t[-1] > axes[0].get_xlim()[1] or state["background"] is None
+        for ax, (column, _) in zip(axes, labels):
+            lo, hi = data[:, column].min(), data[:, column].max()
+            if not fits(ax, lo, hi):
+                margin = max(hi - lo, 1.0) * 0.25
+                ax.set_ylim(lo - margin, hi + margin)
+                rescale = True
+        if rescale:
+            # grow in big steps so full redraws stay rare
+            axes[0].set_xlim(t[0], max(2 * t[-1], t[0] + 10))
+            fig.canvas.draw()
+        else:
+            fig.canvas.restore_region(state["background"])
+            draw_artists()
+            fig.canvas.blit(fig.bbox)
+        fig.canvas.flush_events()
+
+    fig.canvas.mpl_connect("draw_event", on_draw)
+    timer = fig.canvas.new_timer(interval=int(interval * 1000))
+    timer.add_callback(refresh)
+    timer.start()
+    refresh()
+    plt.show()
+
+
+def expand_runs(patterns):
+    """
+    Data files matching glob patterns or given directly, without duplicates
+
+    Args:
+        patterns (list): paths or glob patterns, e.g. "data/crit dih*"
+
+    Returns:
+        list: matching .txt and .run files, sorted within each pattern
+    """
+    found = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) or [pattern]
+        found += [m for m in matches if Path(m).suffix in (".txt", runformat.RUN_SUFFIX) and m not in found]
+    return found
+
+
 if __name__ == "__main__":
-    plot_solution_from_file()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Plot flight data, one run or an overlay of several")
+    parser.add_argument("runs", nargs="*", help="data files or glob patterns (default: the most recent run)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="processes for parsing (default: number of CPUs)")
+    parser.add_argument("--live", action="store_true", help="follow a run while the simulator writes it (the most recent run if none is given)")
+    parser.add_argument("--where", default=None, help='add the runs matching a catalog query, e.g. "dihedral < 0 AND max_abs_bank > 90" (see catalog.py)')
+    args = parser.parse_args()
+
+    files = expand_runs(args.runs)
+    if args.where is not None:
+        from catalog import Catalog  # imports the simulation inputs, only needed for queries
+        catalog = Catalog(directory_path)
+        catalog.update()
+        files += [f for f in catalog.paths(args.where) if f not in files]
+        catalog.close()
+        if not files:
+            raise SystemExit(f"No runs match {args.where}")
+    if args.live:
+        plot_live(files[0] if files else None)
+    elif len(files) > 1:
+        plot_comparison(files, args.workers)
+    else:
+        plot_solution_from_file(files[0] if files else None)
\ No newline at end of file
@@ -1,4 +1,3 @@
-from pynput import keyboard
 import physics
 import threading
 
@@ -8,6 +7,10 @@ aileron_input = 0
 
 ap_on = 0
 
+# pynput is imported by start_listener, so the autopilot state above can be used without a display (headless runs)
+keyboard = None
+listener = None
+
 '''
 on_press and on_release adapted from the function use case given in pynput official documentation https://pypi.org/project/pynput/.
 Note: injection refers to a "virtual" key press and is not used here.
@@ -45,12 +48,15 @@ def on_release(key, injected):
         # Stop listener
         return False
 
-'''Collect key press and release events'''
-
-listener = keyboard.Listener(
-    on_press=on_press,
-    on_release=on_release)
-listener.start()
+def start_listener():
+    '''Collect key press and release events. Called by the visualizer.'''
+    global keyboard, listener
+    from pynput import keyboard
+    listener = keyboard.Listener(
+        on_press=on_press,
+        on_release=on_release)
+    listener.start()
+    return listener
 
 
 
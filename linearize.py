@@ -0,0 +1,171 @@
+"""
+Numerical linearization of the simulator's physics (physics.AircraftModel.derivatives_batch) about trim.
+
+Unlike the hand-derived coefficients of analytical_solutionV5 (from archive/physics_backup), the linear model is
+taken from the live equations, including the constant altitude AoA adjustment and the roll rate term in the
+wing angles of attack, so it matches the simulator for any configuration.
+
+    trim        w = 0 at the given bank angle, (vss, vy) found by Newton iteration so that ax = ay = 0
+    jacobian    d(ax, ay, alpha_roll)/d(vss, vy, bank, w) by central differences, every perturbed state of every
+                configuration in one derivatives_batch call
+    linearize   state matrix A of d/dt (vss, vy, bank, w) = A (state - trim), for statespace.solve
+
+Model parameters may be arrays (one configuration per element), see physics.AircraftModel.
+
+    python linearize.py                                         trim, A and eigenvalues for PHYSICS_PARAMS
+    python linearize.py "scenarios/reference/small dih 5.toml"  for scenario files
+"""
+import argparse
+from pathlib import Path
+import numpy as np
+import physics
+from simulation import PHYSICS_PARAMS
+from statespace import solve
+
+STATES = ("vss", "vy", "bank", "w")
+RELATIVE_STEP = np.finfo(float).eps ** (1/3)  # optimal central difference step for smooth functions
+TRIM_TOLERANCE = 1e-10  # m/s^2, residual acceleration at trim
+TRIM_ITERATIONS = 20
+
+
+def model_from_params(params):
+    """
+    AircraftModel from a PHYSICS_PARAMS style dict, the control flags (Autopilot, Keyboard_Control) are ignored
+    Args:
+        params (dict): globalize_physics_vars arguments, values may be arrays
+    Returns:
+        physics.AircraftModel: model
+    """
+    params = {k: v for k, v in params.items() if k not in ("Autopilot", "Keyboard_Control")}
+    return physics.AircraftModel(**params)
+
+
+def expand_model(model, axes=1):
+    """
+    Copy of a model with trailing axes added to its array parameters, so they broadcast against states with extra axes
+    Args:
+        model (physics.AircraftModel): model, parameters scalars or arrays
+        axes (int, optional): number of axes to add. Defaults to 1.
+    Returns:
+        physics.AircraftModel: model
+    """
+    arrays = {k: np.asarray(v)[(...,) + (None,) * axes] for k, v in model.parameters().items() if np.ndim(v) > 0}
+    return model.replace(**arrays) if arrays else model
+
+
+def model_shape(model):
+    """
+    Returns:
+        tuple: broadcast shape of the model's array parameters, () for a single configuration
+    """
+    return np.broadcast_shapes(*(np.shape(v) for v in model.parameters().values()))
+
+
+def jacobian(model, state, columns=(0, 1, 2, 3)):
+    """
+    Jacobian of the accelerations (ax, ay, alpha_roll) with respect to the state, by central differences
+    Args:
+        model (physics.AircraftModel): model, parameters scalars or arrays
+        state (numpy.ndarray): states (vss, vy, bank, w) to linearize about, shape (..., 4), broadcast against the model
+        columns (tuple, optional): state indices to differentiate by. Defaults to all four.
+    Returns:
+        numpy.ndarray: shape (..., 3, len(columns)), NaN where a perturbed state stalls
+    """
+    state = np.asarray(state, dtype=float)
+    shape = np.broadcast_shapes(state.shape[:-1], model_shape(model))
+    state = np.broadcast_to(state, shape + (4,))
+
+    # 2 perturbed states per column on a new axis: +h_0, -h_0, +h_1, -h_1, ...
+    steps = RELATIVE_STEP * np.maximum(1.0, np.abs(state[..., columns]))
+    offsets = np.zeros(shape + (2 * len(columns), 4))
+    for k, column in enumerate(columns):
+        offsets[..., 2*k, column] = steps[..., k]
+        offsets[..., 2*k + 1, column] = -steps[..., k]
+    perturbed = state[..., None, :] + offsets
+
+    accelerations = np.stack(expand_model(model).derivatives_batch(np.moveaxis(perturbed, -1, 0)), axis=-2)
+    return (accelerations[..., 0::2] - accelerations[..., 1::2]) / (2 * steps[..., None, :])
+
+
+def trim(model, bank=0.0, tolerance=TRIM_TOLERANCE, iterations=TRIM_ITERATIONS):
+    """
+    Trim state at a bank angle: no roll rate, and sideslip and vertical speeds with no net force
+    Args:
+        model (physics.AircraftModel): model, parameters scalars or arrays
+        bank (float or numpy.ndarray, optional): bank angle in degrees. Defaults to 0.
+        tolerance (float, optional): residual acceleration to stop at. Defaults to TRIM_TOLERANCE.
+        iterations (int, optional): maximum number of Newton steps. Defaults to TRIM_ITERATIONS.
+    Returns:
+        tuple: (state, residual) with state (vss, vy, bank, w) of shape (..., 4) and residual (ax, ay, alpha_roll) of shape (..., 3),
+               alpha_roll is only zero at a symmetric trim
+    """
+    bank = np.asarray(bank, dtype=float)
+    shape = np.broadcast_shapes(bank.shape, model_shape(model))
+    state = np.zeros(shape + (4,))
+    state[..., 2] = bank
+
+    for _ in range(iterations):
+        residual = np.stack(model.derivatives_batch(np.moveaxis(state, -1, 0)), axis=-1)
+        if not np.any(np.abs(residual[..., :2]) > tolerance):
+            break
+        # pinv: with Constant_Altitude ay does not depend on vy, the step leaves vy unchanged
+        J = jacobian(model, state, columns=(0, 1))[..., :2, :]
+        step = np.einsum("...ij,...j->...i", np.linalg.pinv(np.nan_to_num(J)), residual[..., :2])
+        state[..., :2] -= np.nan_to_num(step)
+    residual = np.stack(model.derivatives_batch(np.moveaxis(state, -1, 0)), axis=-1)
+    return state, residual
+
+
+def linearize(model, bank=0.0):
+    """
+    Linear model of the simulator about trim
+    Args:
+        model (physics.AircraftModel): model, parameters scalars or arrays
+        bank (float or numpy.ndarray, optional): trim bank angle in degrees. Defaults to 0.
+    Returns:
+        tuple: (A, trim_state), A of shape (..., 4, 4) for d/dt (vss, vy, bank, w), trim_state of shape (..., 4)
+    """
+    state, _ = trim(model, bank)
+    J = jacobian(model, state)
+
+    A = np.zeros(J.shape[:-2] + (4, 4))
+    A[..., 0, :] = J[..., 0, :]
+    A[..., 1, :] = J[..., 1, :]
+    A[..., 2, 3] = 1  # d bank/dt = w
+    A[..., 3, :] = J[..., 2, :]
+    return A, state
+
+
+def linear_response(model, t, bank0=5.0, dbank0=0.0, vss0=0.0, vy0=0.0, trim_bank=0.0):
+    """
+    Response of the linearized simulator to an initial state
+    Args:
+        model (physics.AircraftModel): model, parameters scalars or arrays
+        t (numpy.ndarray): times
+        bank0, dbank0, vss0, vy0 (float or numpy.ndarray, optional): initial bank angle (deg), roll rate (deg/s), sideslip and vertical speed.
+        trim_bank (float, optional): bank angle to linearize about. Defaults to 0.
+    Returns:
+        tuple: (vss, vy, bank, w) arrays of shape configurations + t
+    """
+    A, state = linearize(model, trim_bank)
+    initial = np.stack(np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (vss0, vy0, bank0, dbank0))), axis=-1)
+    states = solve(A, initial - state, t) + state[..., None, :]
+    return tuple(np.moveaxis(states, -1, 0))
+
+
+if __name__ == "__main__":
+    from scenarios import load_scenario
+
+    parser = argparse.ArgumentParser(description="Trim and linearize the simulator physics")
+    parser.add_argument("scenarios", nargs="*", help="scenario files (default: PHYSICS_PARAMS in simulation.py)")
+    parser.add_argument("--bank", type=float, default=0.0, help="trim bank angle in degrees (default 0)")
+    args = parser.parse_args()
+
+    configs = [(Path(s).stem, load_scenario(s)["physics"]) for s in args.scenarios] or [("PHYSICS_PARAMS", PHYSICS_PARAMS)]
+    np.set_printoptions(precision=5, suppress=True)
+    for name, params in configs:
+        model = model_from_params(params)
+        A, state = linearize(model, args.bank)
+        print(f"{name}\n  trim {', '.join(f'{s} = {v:.6g}' for s, v in zip(STATES, state))}\n  A (rows/columns {', '.join(STATES)})")
+        print("\n".join("    " + line for line in str(A).splitlines()))
+        print(f"  eigenvalues {np.linalg.eigvals(A)}\n")
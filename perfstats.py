@@ -0,0 +1,117 @@
+"""
+Rolling performance statistics for the visualizer's performance overlay (F3), dumped to ./perf/ at exit.
+"""
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+
+class RollingStat:
+    """
+    Recent samples of one quantity (mean and max over the last `window` samples) plus totals over the whole run
+    """
+
+    def __init__(self, window=240):
+        """
+        Args:
+            window (int, optional): number of recent samples kept. Defaults to 240.
+        """
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.peak = 0.0
+
+    def add(self, value):
+        """
+        Record one sample
+        Args:
+            value (float): sample
+        """
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+        self.peak = max(self.peak, value)
+
+    def mean(self):
+        """
+        Returns:
+            float: mean of the recent samples, 0 if there are none
+        """
+        samples = list(self.samples)  # may be appended to from the log writer thread
+        return sum(samples) / len(samples) if samples else 0.0
+
+    def max(self):
+        """
+        Returns:
+            float: largest recent sample, 0 if there are none
+        """
+        return max(self.samples, default=0.0)
+
+
+class PerfMonitor:
+    """
+    Named RollingStats, created on first use. Times are recorded in seconds.
+    """
+
+    def __init__(self, window=240):
+        """
+        Args:
+            window (int, optional): number of recent samples kept per quantity. Defaults to 240.
+        """
+        self.window = window
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, value):
+        """
+        Record one sample of a quantity, safe to call from another thread
+        Args:
+            name (str): quantity, e.g. "physics step"
+            value (float): sample
+        """
+        stat = self.stats.get(name)
+        if stat is None:
+            with self._lock:
+                stat = self.stats.setdefault(name, RollingStat(self.window))
+        stat.add(value)
+
+    def get(self, name):
+        """
+        Args:
+            name (str): quantity
+        Returns:
+            RollingStat: its statistics (empty if nothing was recorded yet)
+        """
+        return self.stats.get(name) or RollingStat(self.window)
+
+    def summary(self):
+        """
+        Whole run statistics, one line per quantity
+        Returns:
+            list: lines of name, sample count, mean and peak (times in ms)
+        """
+        lines = [f"{'quantity':<24}{'samples':>10}{'mean':>14}{'peak':>14}"]
+        for name, stat in sorted(self.stats.items()):
+            mean = stat.total / stat.count if stat.count else 0.0
+            if name.endswith("time"):
+                lines.append(f"{name:<24}{stat.count:>10}{mean * 1e3:>11.3f} ms{stat.peak * 1e3:>11.3f} ms")
+            else:
+                lines.append(f"{name:<24}{stat.count:>10}{mean:>14.2f}{stat.peak:>14.2f}")
+        return lines
+
+    def dump(self, directory="./perf/", header=None):
+        """
+        Write the summary to perf-<timestamp>.txt
+        Args:
+            directory (Path, optional): output directory, created if needed. Defaults to "./perf/".
+            header (list, optional): lines written before the table, e.g. the run configuration. Defaults to none.
+        Returns:
+            Path: the written file
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"perf-{datetime.now().strftime('%Y%m%d-%H%M%S')}.txt"
+        with open(path, "w") as f:
+            f.write("\n".join(list(header or []) + self.summary()) + "\n")
+        return path
@@ -1,94 +1,35 @@
 import math
+import numpy as np
+import dataclasses
+from dataclasses import dataclass, field
 
 
-     
+# Constants
+R0=8.314
+cp=1005  # specific heat at constant pressure for air
+M = 0.02897  # molar mass of air
+L = -2
+g = 9.81
+rho0 = 1.225  # sea level standard density kg/m^3
+P0 = 101325  # sea level standard pressure Pa
+T0 = 288.15  # sea level standard temperature K
 
-def globalize_physics_vars(dihedral=0, Mass=1000, WingLength=4, WingWidth=1, BodyArea=5,
-                                cLift_a0=0.25, cL_slope=0.2, altitude=1000, cruise=52, 
-                                I_roll=1000, drag_mult = 3, Constant_Altitude = False, 
-                                Autopilot = False, Keyboard_Control = False):
-     # Variables
-    dihedral = dihedral # positive for dihedral, negative for anhedral
-
-    WingLength = WingLength # half the wingspan
-    WingWidth = WingWidth # chord length
-    BodyArea = BodyArea # for Cfside, assume the body is roughly cylindrical so this acts for vertical drag and sideslip drag
-    drag_mult = drag_mult  # multiplier for drag forces
-
-    # a_default = a_default # angle of attack in deg
-    cLift_a0 = cLift_a0  # lift coefficient NACA 2414
-    cL_slope = cL_slope # rise per deg
-    Mass = Mass  # mass in kg
-
-    I_roll = I_roll # moment of inertial about roll axis
-
-
-    altitude = altitude  # altitude in feet up to FL400
-    cruise = cruise  # cruise speed in m/s (1.94 knots = 1 m/s)
-
-    Constant_Altitude = Constant_Altitude  # whether to adjust AoA to maintain constant altitude
-
-    STALLANGLE = 15  # degrees
-
-    # Constants
-    R0=8.314
-    cp=1005  # specific heat at constant pressure for air
-    M = 0.02897  # molar mass of air
-    L = -2
-    g = 9.81
-    rho0 = 1.225  # sea level standard density kg/m^3
-    P0 = 101325  # sea level standard pressure Pa
-    T0 = 288.15  # sea level standard temperature K
-
-    cd_body = 1.1 #cylinder cross flow for high reynolds numbers
+cd_body = 1.1 #cylinder cross flow for high reynolds numbers
 
-    # Calculated Constants
-    #LATEX
-    PA = P0 * (1+g*altitude/(cp*T0))**(-cp*M/R0)  # ambient pressure at altitude https://en.wikipedia.org/wiki/Atmospheric_pressure
-    TA = T0 + (L*altitude/1000)  # ambient temperature at altitude
-    rhoA = 1/((R0/M*TA)/PA)  # ambient density at altitude (ideal gas law)
-
-    WingArea = WingLength * WingWidth * 2
-
-    Cdbody = BodyArea * cd_body # sideslip drag coefficient, note that the whole wing does not move at the same speed
-
-
-    # calculate a_default for given mass such that lift cancels weight at cruise
-    a_default = (Mass*g / (2* 0.5 * rhoA * cruise**2 * (WingArea/2) * math.cos(math.pi*dihedral/180)) - cLift_a0) / cL_slope # for mass to cancel with lift
-     
-    _physics_vars = [
-        "dihedral", "WingLength", "WingWidth", "BodyArea",
-        "a_default", "cLift_a0", "cL_slope", "Mass",
-        "altitude", "cruise",
-        "R0", "cp", "M", "L", "g", "rho0", "P0", "T0",
-        "cd_body", "Cdbody",
-        "PA", "TA", "rhoA", "WingArea", "I_roll", "Cdbody", 
-        "drag_mult", "STALLANGLE", "Constant_Altitude", "Autopilot", "Keyboard_Control"
-    ]
-     
-    for _name in _physics_vars:
-        globals()[_name] = locals()[_name]
-    
-    print("Dihedral:", dihedral)
-    print("Wing Area:", WingArea)
-    print("Cruise Speed:", cruise)
-    print("Altitude:", altitude)
-    print("AoA cruise:", a_default)
+STALLANGLE = 15  # degrees
 
 
 # Helper functions
 def rad(theta):
     """
     Converts degrees to radians
-    
+
     theta: angle in degrees
     """
 
     return theta * math.pi / 180
 
 
-
-
 """
 Forces and Torques
 
@@ -106,230 +47,641 @@ All torques are scalars
 """
 
 
-# Drag Forces
-
-def sidedrag_F(vss):
+@dataclass(frozen=True)
+class AircraftModel:
     """
-    Returns the side drag force as a tuple (Fx, Fy)
-    
-    vss: sideslip velocity (m/s), positive to the right from our POV
+    One aircraft configuration. Immutable, derived constants are computed once on creation.
+    Use the replace method to make a modified copy.
+
+    Parameters are the same as globalize_physics_vars. Any parameter may also be a NumPy array,
+    in which case the *_batch methods broadcast it against the state arrays (one configuration per element).
     """
 
-    if vss < 0:
-        # slipping left, so drag to the right (+)
-        return (0.5 * rhoA * vss**2 * Cdbody * drag_mult, 0)
-    else:
-        # slipping right, so drag to the left (-)
-        return (-0.5 * rhoA * vss**2 * Cdbody * drag_mult, 0)
+    # Variables
+    dihedral: float = 0  # positive for dihedral, negative for anhedral
+    Mass: float = 1000  # mass in kg
+    WingLength: float = 4  # half the wingspan
+    WingWidth: float = 1  # chord length
+    BodyArea: float = 5  # for Cfside, assume the body is roughly cylindrical so this acts for vertical drag and sideslip drag
+    cLift_a0: float = 0.25  # lift coefficient NACA 2414
+    cL_slope: float = 0.2  # rise per deg
+    altitude: float = 1000  # altitude in feet up to FL400
+    cruise: float = 52  # cruise speed in m/s (1.94 knots = 1 m/s)
+    I_roll: float = 1000  # moment of inertial about roll axis
+    drag_mult: float = 3  # multiplier for drag forces
+    Constant_Altitude: bool = False  # whether to adjust AoA to maintain constant altitude
 
-def vertdrag_F(vy):
-    """
-    Returns the vertical drag force as a tuple (Fx, Fy)
-    
-    vy: vertical velocity (m/s), positive up from our POV
-    """
+    # Calculated Constants
+    PA: float = field(init=False, repr=False)  # ambient pressure at altitude
+    TA: float = field(init=False, repr=False)  # ambient temperature at altitude
+    rhoA: float = field(init=False, repr=False)  # ambient density at altitude
+    WingArea: float = field(init=False, repr=False)
+    Cdbody: float = field(init=False, repr=False)  # sideslip drag coefficient
+    a_default: float = field(init=False, repr=False)  # AoA in deg where lift cancels weight at cruise
+    q_half: float = field(init=False, repr=False)  # dynamic pressure at cruise times half the wing area
+    drag_coeff: float = field(init=False, repr=False)  # 0.5 * rhoA * Cdbody * drag_mult, drag = drag_coeff * v**2
+    sin_dih: float = field(init=False, repr=False)
+    cos_dih: float = field(init=False, repr=False)
+
+    def __post_init__(self):
+        #LATEX
+        PA = P0 * (1+g*np.asarray(self.altitude)/(cp*T0))**(-cp*M/R0)  # https://en.wikipedia.org/wiki/Atmospheric_pressure
+        TA = T0 + (L*np.asarray(self.altitude)/1000)
+        rhoA = 1/((R0/M*TA)/PA)  # ideal gas law
+
+        WingArea = np.asarray(self.WingLength) * self.WingWidth * 2
+        Cdbody = np.asarray(self.BodyArea) * cd_body # note that the whole wing does not move at the same speed
+        q_half = 0.5 * rhoA * np.asarray(self.cruise)**2 * (WingArea/2)
+
+        # calculate a_default for given mass such that lift cancels weight at cruise
+        cos_dih = np.cos(np.radians(self.dihedral))
+        a_default = (self.Mass*g / (2 * q_half * cos_dih) - self.cLift_a0) / self.cL_slope
+
+        derived = {
+            "PA": PA, "TA": TA, "rhoA": rhoA, "WingArea": WingArea, "Cdbody": Cdbody,
+            "a_default": a_default, "q_half": q_half,
+            "drag_coeff": 0.5 * rhoA * Cdbody * self.drag_mult,
+            "sin_dih": np.sin(np.radians(self.dihedral)), "cos_dih": cos_dih,
+        }
+        for name, value in derived.items():
+            # plain floats keep the scalar methods fast
+            object.__setattr__(self, name, float(value) if np.ndim(value) == 0 else value)
+
+    def replace(self, **changes):
+        """
+        Returns a copy of this model with some parameters changed, derived constants are recomputed
+        """
+        return dataclasses.replace(self, **changes)
+
+    def parameters(self):
+        """
+        Returns the constructor arguments as a dict (no calculated constants), AircraftModel(**model.parameters()) is a copy
+        """
+        return {f.name: getattr(self, f.name) for f in dataclasses.fields(self) if f.init}
 
-    if vy < 0:
-        # falling down, so drag up (+)
-        return (0, 0.5 * rhoA * vy**2 * Cdbody * drag_mult)
-    else:
-        # going up, so drag down (-)
-        return (0, -0.5 * rhoA * vy**2 * Cdbody * drag_mult)
+    # Drag Forces
+
+    def sidedrag_F(self, vss):
+        """
+        Returns the side drag force as a tuple (Fx, Fy)
+
+        vss: sideslip velocity (m/s), positive to the right from our POV
+        """
+
+        if vss < 0:
+            # slipping left, so drag to the right (+)
+            return (self.drag_coeff * vss**2, 0)
+        else:
+            # slipping right, so drag to the left (-)
+            return (-self.drag_coeff * vss**2, 0)
+
+    def vertdrag_F(self, vy):
+        """
+        Returns the vertical drag force as a tuple (Fx, Fy)
+
+        vy: vertical velocity (m/s), positive up from our POV
+        """
+
+        if vy < 0:
+            # falling down, so drag up (+)
+            return (0, self.drag_coeff * vy**2)
+        else:
+            # going up, so drag down (-)
+            return (0, -self.drag_coeff * vy**2)
+
+    def rotv_speed_r_l(self, w):
+        """
+        Returns the average linear vertical velocity at the right and left wing tips due to roll rate w as a tuple (vr, vl)
+
+        w: roll rate in deg/s, positive is rolling left from our POV
+        """
+
+        average_lin_v = (rad(w) * self.WingLength / 2)*3
+        return (-average_lin_v, average_lin_v)  # right wing speed, left wing speed
+
+    # Lift Forces
+
+    def leftlift_F(self, bank, AoA):
+        """
+        Returns the left wing lift force as a tuple (Fx, Fy)
+
+        bank: bank angle in degrees, positive is right wing down from our POV
+        AoA: angle of attack in degrees for left wing (right from our POV)
+        """
+
+        cLift = self.cLift_a0 + self.cL_slope * AoA
+        TotalLiftLeft = self.q_half * cLift
+
+        LiftY = TotalLiftLeft * math.cos(rad(bank)+rad(self.dihedral))
+        # negative since with positive dihedral or positive bank, the lift points left (-)
+        LiftX = -TotalLiftLeft * math.sin(rad(bank)+rad(self.dihedral))
+
+        return (LiftX, LiftY)
 
+    def rightlift_F(self, bank, AoA):
+        """
+        Returns the right wing lift force as a tuple (Fx, Fy)
 
-def rotv_speed_r_l(w):
-    """
-    Returns the average linear vertical velocity at the right and left wing tips due to roll rate w as a tuple (vr, vl)
-    
-    w: roll rate in deg/s, positive is rolling left from our POV
-    """
+        bank: bank angle in degrees, positive is right wing down from our POV
+        AoA: angle of attack in degrees for right wing (right from our POV)
+        """
 
-    average_lin_v = (rad(w) * WingLength / 2)*3
-    return (-average_lin_v, average_lin_v)  # right wing speed, left wing speed
+        cLift = self.cLift_a0 + self.cL_slope * AoA
+        TotalLiftRight = self.q_half * cLift
 
+        LiftY = TotalLiftRight * math.cos(rad(bank)-rad(self.dihedral))
+        # negative since with high dihedral or positive bank, the lift points left (-)
+        LiftX = -TotalLiftRight * math.sin(rad(bank)-rad(self.dihedral))
 
-# Lift Forces
+        return (LiftX, LiftY)
 
-def leftlift_F(bank, AoA):
-    """
-    Returns the left wing lift force as a tuple (Fx, Fy)
-    
-    bank: bank angle in degrees, positive is right wing down from our POV
-    AoA: angle of attack in degrees for left wing (right from our POV)
-    """
+    # Lift Torques
 
-    v = cruise
-    cLift = cLift_a0 + cL_slope * AoA
-    TotalLiftLeft = 0.5 * rhoA * v**2 * cLift * (WingArea/2)
+    def leftlift_T(self, leftlift):
+        """
+        Returns the left wing lift torque assuming lift is in the center of the wing
 
-    LiftY = TotalLiftLeft * math.cos(rad(bank)+rad(dihedral))
-    # negative since with positive dihedral or positive bank, the lift points left (-)
-    LiftX = -TotalLiftLeft * math.sin(rad(bank)+rad(dihedral))
+        leftlift: left wing lift force as a tuple (Fx, Fy)
+        """
 
-    return (LiftX, LiftY)
+        # tends to roll to our left, so negative
+        return -leftlift[1] * self.WingLength/2
 
-def rightlift_F(bank, AoA):
-    """
-    Returns the right wing lift force as a tuple (Fx, Fy)
-    
-    bank: bank angle in degrees, positive is right wing down from our POV
-    AoA: angle of attack in degrees for right wing (right from our POV)
-    """
-    v = cruise
-    cLift = cLift_a0 + cL_slope * AoA
-    TotalLiftRight = 0.5 * rhoA * v**2 * cLift * (WingArea/2)
+    def rightlift_T(self, rightlift):
+        """
+        Returns the right wing lift torque assuming lift is in the center of the wing
 
-    LiftY = TotalLiftRight * math.cos(rad(bank)-rad(dihedral))
-    # negative since with high dihedral or positive bank, the lift points left (-)
-    LiftX = -TotalLiftRight * math.sin(rad(bank)-rad(dihedral))
+        rightlift: right wing lift force as a tuple (Fx, Fy)
+        """
 
-    return (LiftX, LiftY)
+        # tends to roll to our right, so positive
+        return rightlift[1] * self.WingLength/2
 
-# Lift Torques
+    # Weight Force
 
-def leftlift_T(leftlift):
-    """
-    Returns the left wing lift torque assuming lift is in the center of the wing
-    
-    leftlift: left wing lift force as a tuple (Fx, Fy)
-    """
+    def weight_F(self):
+        """
+        Returns the weight force as a tuple (Fx, Fy)
+        """
+        return (0, -self.Mass * g)
 
-    # tends to roll to our left, so negative
-    return -leftlift[1] * WingLength/2
+    # Angle Calculations
 
-def rightlift_T(rightlift):
-    """
-    Returns the right wing lift torque assuming lift is in the center of the wing
-    
-    rightlift: right wing lift force as a tuple (Fx, Fy)
-    """
+    def side_slip_angle(self, vy, vss):
+        """
+        Returns the sideslip angle in degrees
 
-    # tends to roll to our right, so positive
-    return rightlift[1] * WingLength/2
+        vy: vertical speed
+        vss: sideslip speed (horizontal)
+        """
+        return math.degrees(math.atan2(vy, vss))
 
-# Weight Force
+    def constant_alt_angle(self, Fnety, bank):
+        """
+        Returns the angle of attack required to maintain constant altitude in degrees
+        """
 
-def weight_F():
-    """
-    Returns the weight force as a tuple (Fx, Fy)
-    """
-    return (0, -Mass * g)
+        AoAinc = -Fnety / (self.q_half * self.cL_slope * (math.cos(rad(bank)-rad(self.dihedral))+math.cos(rad(bank)+rad(self.dihedral))))
+        return AoAinc
 
-# Angle Calculations
+    def AoAR(self, vss, vy, bank, w):
+        """
+        Returns the angle of attack for the right wing in degrees
 
-def side_slip_angle(vy, vss):
-    """
-    Returns the sideslip angle in degrees
-    
-    vy: vertical speed
-    vss: sideslip speed (horizontal)
-    """
-    return math.degrees(math.atan2(vy, vss))
+        vy: vertical speed
+        vss: sideslip speed (horizontal)
+        bank: bank angle in degrees
+        w: roll rate in deg/s
+        """
+
+        vsseff = -vss*math.sin(rad(bank-self.dihedral)) # take the component of airflow (-velocity) perpendicular to the right wing
+        vy_rot = self.rotv_speed_r_l(w)[0]  # right wing rotational velocity
+        vy = vy + vy_rot # find effective vertical speed at right wing
+        vyeff = vy*math.cos(rad(bank-self.dihedral))
+
+        # find total angle deviation from cruise deflecting in angle perpendicular to right wing
+        AoAadj = math.degrees(math.atan2(vyeff+vsseff, self.cruise))
+
+        # Stall condition exit case
+        if ((self.a_default - AoAadj) > STALLANGLE) | ((self.a_default - AoAadj) < -STALLANGLE):
+            raise ValueError("stall condition")
+
+        return self.a_default - AoAadj
+
+    def AoAL(self, vss, vy, bank, w):
+        """
+        Returns the angle of attack for the left wing (right in our POV) in degrees
+
+        vy: vertical speed
+        vss: sideslip speed (horizontal)
+        bank: bank angle in degrees
+        w: roll rate in deg/s
+        """
+
+
+        vsseff = -vss*math.sin(rad(bank+self.dihedral)) # take the component of airflow (-velocity) perpendicular to the left wing
+        vy_rot = self.rotv_speed_r_l(w)[1]  # left wing rotational velocity
+        vy = vy + vy_rot
+        vyeff = vy*math.cos(rad(bank+self.dihedral))
+        # find total angle deviation from cruise deflecting in angle perpendicular to left wing
+        AoAadj = math.degrees(math.atan2(vyeff+vsseff, self.cruise))
+
+        # Stall condition
+        if ((self.a_default - AoAadj) > 30) | ((self.a_default - AoAadj) < -30):
+            raise ValueError("stall condition")
+
+        return self.a_default - AoAadj
+
+    # Net Force and Torques
+
+    def Fnet(self, vss, vy, bank, w):
+        """
+        Returns net force as a tuple (Fx, Fy)
+
+        vss: horizontal airspeed (m/s), positive to the right from our POV
+        vy: vertical speed
+        bank: bank angle in degrees
+        w: roll rate in deg/s
+        """
+
+        weight = self.weight_F()[1]
+        vertdrag = self.vertdrag_F(vy)[1]
+        sidedrag = self.sidedrag_F(vss)[0]
+        AOAL = self.AoAL(vss, vy, bank, w)
+        AOAR = self.AoAR(vss, vy, bank, w)
+        leftlift = self.leftlift_F(bank, AOAL)
+        rightlift = self.rightlift_F(bank, AOAR)
+        Fnety = weight + leftlift[1] + rightlift[1] + vertdrag
+
+        if self.Constant_Altitude:
+            AoAinc = self.constant_alt_angle(Fnety, bank)
+            AOAL += AoAinc
+            AOAR += AoAinc
+            leftlift = self.leftlift_F(bank, AOAL)
+            rightlift = self.rightlift_F(bank, AOAR)
+            Fnety = weight + leftlift[1] + rightlift[1] + vertdrag
+
+        Fnetx = sidedrag + leftlift[0] + rightlift[0]
+        return (Fnetx, Fnety)
+
+    def Tnet(self, vss, vy, bank, w):
+        """
+        Returns net torque in Nm
+
+        vss: horizontal airspeed (m/s), positive to the right from our POV
+        vy: vertical speed
+        bank: bank angle in degrees
+        w: roll rate in deg/s
+        """
+
+        left_T = self.leftlift_T(self.leftlift_F(bank, self.AoAL(vss, vy, bank, w)))
+        right_T = self.rightlift_T(self.rightlift_F(bank, self.AoAR(vss, vy, bank, w)))
+        return left_T + right_T
+
+    def derivatives(self, state, check_stall=True):
+        """
+        Returns the accelerations as a tuple (ax, ay, alpha_roll) in a single pass
+        Same result as (Fnet[0]/Mass, Fnet[1]/Mass, -Tnet/I_roll) but each wing's angle of attack and lift is only computed once
+
+        state: tuple (vss, vy, bank, w)
+            vss: horizontal airspeed (m/s), positive to the right from our POV
+            vy: vertical speed
+            bank: bank angle in degrees
+            w: roll rate in deg/s
+        check_stall: raise ValueError past the stall angle, set to False when the caller detects stall itself (see secondOrderDE.stall_event)
+        """
+
+        vss, vy, bank, w = state
+
+        # wing angles with respect to the horizontal (angle sum with the precomputed dihedral)
+        sinb = math.sin(rad(bank))
+        cosb = math.cos(rad(bank))
+        sinR = sinb*self.cos_dih - cosb*self.sin_dih
+        cosR = cosb*self.cos_dih + sinb*self.sin_dih
+        sinL = sinb*self.cos_dih + cosb*self.sin_dih
+        cosL = cosb*self.cos_dih - sinb*self.sin_dih
+
+        # angles of attack, see AoAR and AoAL
+        vy_rot = rad(w) * self.WingLength * 1.5
+        AOAR = self.a_default - math.degrees(math.atan2((vy - vy_rot)*cosR - vss*sinR, self.cruise))
+        AOAL = self.a_default - math.degrees(math.atan2((vy + vy_rot)*cosL - vss*sinL, self.cruise))
+
+        # Stall condition, same limits as AoAR and AoAL
+        if check_stall and ((abs(AOAR) > STALLANGLE) | (abs(AOAL) > 30)):
+            raise ValueError("stall condition")
+
+        # lift magnitudes, see leftlift_F and rightlift_F
+        q = self.q_half
+        liftL = q * (self.cLift_a0 + self.cL_slope * AOAL)
+        liftR = q * (self.cLift_a0 + self.cL_slope * AOAR)
+
+        # torque uses the lift before the constant altitude adjustment, see Tnet
+        T = (liftR*cosR - liftL*cosL) * self.WingLength/2
+
+        Fy = -self.Mass * g + liftL*cosL + liftR*cosR - self.drag_coeff * abs(vy) * vy
+
+        if self.Constant_Altitude:
+            AoAinc = -Fy / (q * self.cL_slope * (cosR + cosL))
+            liftL += q * self.cL_slope * AoAinc
+            liftR += q * self.cL_slope * AoAinc
+            Fy = -self.Mass * g + liftL*cosL + liftR*cosR - self.drag_coeff * abs(vy) * vy
+
+        Fx = -self.drag_coeff * abs(vss) * vss - liftL*sinL - liftR*sinR
+
+        return (Fx / self.Mass, Fy / self.Mass, -T / self.I_roll)
 
-def constant_alt_angle(Fnety, bank):
     """
-    Returns the angle of attack required to maintain constant altitude in degrees
+    Batched Forces and Torques
+
+    NumPy versions of the force and torque methods above for evaluating many aircraft states in one call.
+    Every argument may be a scalar or an array, arrays are broadcast against each other and against array model parameters.
+    Same sign conventions as above. Forces are tuples of arrays (Fx, Fy), torques are arrays.
+
+    The stall check does not raise, AoAL_batch and AoAR_batch return the angle of attack together with a boolean stall mask.
+    Fnet_batch, Tnet_batch, net_batch and derivatives_batch return NaN for states where either wing is stalled.
     """
 
-    AoAinc = -Fnety / (0.5 * rhoA * cruise**2 * (WingArea/2) * cL_slope * (math.cos(rad(bank)-rad(dihedral))+math.cos(rad(bank)+rad(dihedral))))
-    return AoAinc
+    def sidedrag_F_batch(self, vss):
+        """
+        Returns the side drag force as a tuple of arrays (Fx, Fy)
 
-def AoAR(vss, vy, bank, w):
+        vss: sideslip velocity (m/s), positive to the right from our POV
+        """
+
+        vss = np.asarray(vss, dtype=float)
+        # drag always opposes the slip direction
+        Fx = -self.drag_coeff * np.abs(vss) * vss
+        return (Fx, np.zeros_like(Fx))
+
+    def vertdrag_F_batch(self, vy):
+        """
+        Returns the vertical drag force as a tuple of arrays (Fx, Fy)
+
+        vy: vertical velocity (m/s), positive up from our POV
+        """
+
+        vy = np.asarray(vy, dtype=float)
+        # drag always opposes the vertical velocity
+        Fy = -self.drag_coeff * np.abs(vy) * vy
+        return (np.zeros_like(Fy), Fy)
+
+    def leftlift_F_batch(self, bank, AoA):
+        """
+        Returns the left wing lift force as a tuple of arrays (Fx, Fy)
+
+        bank: bank angle in degrees, positive is right wing down from our POV
+        AoA: angle of attack in degrees for left wing (right from our POV)
+        """
+
+        TotalLiftLeft = self.q_half * (self.cLift_a0 + self.cL_slope * np.asarray(AoA, dtype=float))
+        angle = np.radians(bank) + np.radians(self.dihedral)
+
+        return (-TotalLiftLeft * np.sin(angle), TotalLiftLeft * np.cos(angle))
+
+    def rightlift_F_batch(self, bank, AoA):
+        """
+        Returns the right wing lift force as a tuple of arrays (Fx, Fy)
+
+        bank: bank angle in degrees, positive is right wing down from our POV
+        AoA: angle of attack in degrees for right wing (right from our POV)
+        """
+
+        TotalLiftRight = self.q_half * (self.cLift_a0 + self.cL_slope * np.asarray(AoA, dtype=float))
+        angle = np.radians(bank) - np.radians(self.dihedral)
+
+        return (-TotalLiftRight * np.sin(angle), TotalLiftRight * np.cos(angle))
+
+    def AoAR_batch(self, vss, vy, bank, w):
+        """
+        Returns the right wing angle of attack in degrees and its stall mask as a tuple of arrays (AoA, stalled)
+
+        vy: vertical speed
+        vss: sideslip speed (horizontal)
+        bank: bank angle in degrees
+        w: roll rate in deg/s
+        """
+
+        angle = np.radians(bank) - np.radians(self.dihedral)
+        vsseff = -vss * np.sin(angle)
+        vyeff = (vy - np.radians(w) * self.WingLength * 1.5) * np.cos(angle)
+        AoA = self.a_default - np.degrees(np.arctan2(vyeff + vsseff, self.cruise))
+
+        return (AoA, np.abs(AoA) > STALLANGLE)
+
+    def AoAL_batch(self, vss, vy, bank, w):
+        """
+        Returns the left wing (right in our POV) angle of attack in degrees and its stall mask as a tuple of arrays (AoA, stalled)
+
+        vy: vertical speed
+        vss: sideslip speed (horizontal)
+        bank: bank angle in degrees
+        w: roll rate in deg/s
+        """
+
+        angle = np.radians(bank) + np.radians(self.dihedral)
+        vsseff = -vss * np.sin(angle)
+        vyeff = (vy + np.radians(w) * self.WingLength * 1.5) * np.cos(angle)
+        AoA = self.a_default - np.degrees(np.arctan2(vyeff + vsseff, self.cruise))
+
+        # same limit as AoAL
+        return (AoA, np.abs(AoA) > 30)
+
+    def net_batch(self, vss, vy, bank, w):
+        """
+        Returns net force and torque as a tuple of arrays (Fx, Fy, T), NaN where a wing is stalled
+
+        vss: horizontal airspeed (m/s), positive to the right from our POV
+        vy: vertical speed
+        bank: bank angle in degrees
+        w: roll rate in deg/s
+        """
+
+        vss, vy, bank, w = (np.asarray(v, dtype=float) for v in (vss, vy, bank, w))
+
+        AOAL, stallL = self.AoAL_batch(vss, vy, bank, w)
+        AOAR, stallR = self.AoAR_batch(vss, vy, bank, w)
+        leftlift = self.leftlift_F_batch(bank, AOAL)
+        rightlift = self.rightlift_F_batch(bank, AOAR)
+        vertdrag = self.vertdrag_F_batch(vy)[1]
+        Fnety = -self.Mass * g + leftlift[1] + rightlift[1] + vertdrag
+
+        # Tnet uses the lift before the constant altitude adjustment
+        Tnet = (rightlift[1] - leftlift[1]) * self.WingLength/2
+
+        if np.any(self.Constant_Altitude):
+            AoAinc = -Fnety / (self.q_half * self.cL_slope
+                               * (np.cos(np.radians(bank) - np.radians(self.dihedral)) + np.cos(np.radians(bank) + np.radians(self.dihedral))))
+            # Constant_Altitude may be an array of flags
+            AoAinc = np.where(self.Constant_Altitude, AoAinc, 0.0)
+            leftlift = self.leftlift_F_batch(bank, AOAL + AoAinc)
+            rightlift = self.rightlift_F_batch(bank, AOAR + AoAinc)
+            Fnety = -self.Mass * g + leftlift[1] + rightlift[1] + vertdrag
+
+        Fnetx = self.sidedrag_F_batch(vss)[0] + leftlift[0] + rightlift[0]
+
+        stalled = stallL | stallR
+        return (np.where(stalled, np.nan, Fnetx), np.where(stalled, np.nan, Fnety), np.where(stalled, np.nan, Tnet))
+
+    def Fnet_batch(self, vss, vy, bank, w):
+        """
+        Returns net force as a tuple of arrays (Fx, Fy), NaN where a wing is stalled
+
+        vss: horizontal airspeed (m/s), positive to the right from our POV
+        vy: vertical speed
+        bank: bank angle in degrees
+        w: roll rate in deg/s
+        """
+
+        return self.net_batch(vss, vy, bank, w)[:2]
+
+    def Tnet_batch(self, vss, vy, bank, w):
+        """
+        Returns net torque in Nm as an array, NaN where a wing is stalled
+
+        vss: horizontal airspeed (m/s), positive to the right from our POV
+        vy: vertical speed
+        bank: bank angle in degrees
+        w: roll rate in deg/s
+        """
+
+        return self.net_batch(vss, vy, bank, w)[2]
+
+    def derivatives_batch(self, state):
+        """
+        Returns the accelerations as a tuple of arrays (ax, ay, alpha_roll), NaN where a wing is stalled
+        Batched version of derivatives
+
+        state: tuple of arrays (vss, vy, bank, w)
+        """
+
+        Fx, Fy, T = self.net_batch(*state)
+        return (Fx / self.Mass, Fy / self.Mass, -T / self.I_roll)
+
+
+# Default aircraft used by the module level functions below, replaced by globalize_physics_vars
+default_model = AircraftModel()
+
+# Controls, not part of the aircraft model
+Autopilot = False
+Keyboard_Control = False
+
+
+def globalize_physics_vars(dihedral=0, Mass=1000, WingLength=4, WingWidth=1, BodyArea=5,
+                                cLift_a0=0.25, cL_slope=0.2, altitude=1000, cruise=52,
+                                I_roll=1000, drag_mult = 3, Constant_Altitude = False,
+                                Autopilot = False, Keyboard_Control = False):
     """
-    Returns the angle of attack for the right wing in degrees
-    
-    vy: vertical speed
-    vss: sideslip speed (horizontal)
-    bank: bank angle in degrees
-    w: roll rate in deg/s
+    Builds the default AircraftModel used by the module level functions and sets the control flags.
+    The model's parameters and calculated constants are also copied to module variables (physics.Mass, physics.rhoA, ...) for reading.
+    Returns the new model.
     """
-    
-    vsseff = -vss*math.sin(rad(bank-dihedral)) # take the component of airflow (-velocity) perpendicular to the right wing
-    vy_rot = rotv_speed_r_l(w)[0]  # right wing rotational velocity
-    vy = vy + vy_rot # find effective vertical speed at right wing
-    vyeff = vy*math.cos(rad(bank-dihedral))
-    
-    # find total angle deviation from cruise deflecting in angle perpendicular to right wing
-    AoAadj = math.degrees(math.atan2(vyeff+vsseff, cruise))
+    global default_model
+
+    default_model = AircraftModel(dihedral=dihedral, Mass=Mass, WingLength=WingLength, WingWidth=WingWidth,
+                                  BodyArea=BodyArea, cLift_a0=cLift_a0, cL_slope=cL_slope, altitude=altitude,
+                                  cruise=cruise, I_roll=I_roll, drag_mult=drag_mult, Constant_Altitude=Constant_Altitude)
+
+    _physics_vars = [
+        "dihedral", "WingLength", "WingWidth", "BodyArea",
+        "a_default", "cLift_a0", "cL_slope", "Mass",
+        "altitude", "cruise", "Cdbody",
+        "PA", "TA", "rhoA", "WingArea", "I_roll",
+        "drag_mult", "Constant_Altitude"
+    ]
+
+    for _name in _physics_vars:
+        globals()[_name] = getattr(default_model, _name)
+    globals()["Autopilot"] = Autopilot
+    globals()["Keyboard_Control"] = Keyboard_Control
 
-    # Stall condition exit case
-    if ((a_default - AoAadj) > STALLANGLE) | ((a_default - AoAadj) < -STALLANGLE):
-        raise ValueError("stall condition")
+    print("Dihedral:", dihedral)
+    print("Wing Area:", default_model.WingArea)
+    print("Cruise Speed:", cruise)
+    print("Altitude:", altitude)
+    print("AoA cruise:", default_model.a_default)
 
-    return a_default - AoAadj
+    return default_model
+
+
+"""
+Module level functions
+Thin wrappers around the default model, see the AircraftModel methods for documentation
+"""
+
+def sidedrag_F(vss):
+    return default_model.sidedrag_F(vss)
+
+def vertdrag_F(vy):
+    return default_model.vertdrag_F(vy)
+
+def rotv_speed_r_l(w):
+    return default_model.rotv_speed_r_l(w)
+
+def leftlift_F(bank, AoA):
+    return default_model.leftlift_F(bank, AoA)
+
+def rightlift_F(bank, AoA):
+    return default_model.rightlift_F(bank, AoA)
+
+def leftlift_T(leftlift):
+    return default_model.leftlift_T(leftlift)
+
+def rightlift_T(rightlift):
+    return default_model.rightlift_T(rightlift)
+
+def weight_F():
+    return default_model.weight_F()
+
+def side_slip_angle(vy, vss):
+    return default_model.side_slip_angle(vy, vss)
+
+def constant_alt_angle(Fnety, bank):
+    return default_model.constant_alt_angle(Fnety, bank)
+
+def AoAR(vss, vy, bank, w):
+    return default_model.AoAR(vss, vy, bank, w)
 
 def AoAL(vss, vy, bank, w):
-    """
-    Returns the angle of attack for the left wing (right in our POV) in degrees
-    
-    vy: vertical speed
-    vss: sideslip speed (horizontal)
-    bank: bank angle in degrees
-    w: roll rate in deg/s
-    """
+    return default_model.AoAL(vss, vy, bank, w)
 
-    
-    vsseff = -vss*math.sin(rad(bank+dihedral)) # take the component of airflow (-velocity) perpendicular to the left wing
-    vy_rot = rotv_speed_r_l(w)[1]  # left wing rotational velocity
-    vy = vy + vy_rot
-    vyeff = vy*math.cos(rad(bank+dihedral))
-    # find total angle deviation from cruise deflecting in angle perpendicular to left wing
-    AoAadj = math.degrees(math.atan2(vyeff+vsseff, cruise))
+def Fnet(vss, vy, bank, w):
+    return default_model.Fnet(vss, vy, bank, w)
 
-    # Stall condition
-    if ((a_default - AoAadj) > 30) | ((a_default - AoAadj) < -30):
-        raise ValueError("stall condition")
+def Tnet(vss, vy, bank, w):
+    return default_model.Tnet(vss, vy, bank, w)
 
-    return a_default - AoAadj
+def derivatives(state, check_stall=True):
+    return default_model.derivatives(state, check_stall)
 
+def sidedrag_F_batch(vss):
+    return default_model.sidedrag_F_batch(vss)
 
-# Net Force and Torques
+def vertdrag_F_batch(vy):
+    return default_model.vertdrag_F_batch(vy)
 
-def Fnet (vss, vy, bank, w):
-    """
-    Returns net force as a tuple (Fx, Fy)
-    
-    vss: horizontal airspeed (m/s), positive to the right from our POV
-    vy: vertical speed
-    bank: bank angle in degrees
-    w: roll rate in deg/s
-    """
+def leftlift_F_batch(bank, AoA):
+    return default_model.leftlift_F_batch(bank, AoA)
 
-    weight = weight_F()[1]
-    vertdrag = vertdrag_F(vy)[1]
-    sidedrag = sidedrag_F(vss)[0]
-    AOAL = AoAL(vss, vy, bank, w)
-    AOAR = AoAR(vss, vy, bank, w)
-    leftlift = leftlift_F(bank, AOAL)
-    rightlift = rightlift_F(bank, AOAR)
-    Fnety = weight + leftlift[1] + rightlift[1] + vertdrag
-
-    if Constant_Altitude:
-        AoAinc = constant_alt_angle(Fnety, bank)
-        # print("AoAinc for constant altitude:", AoAinc)
-        AOAL += AoAinc
-        AOAR += AoAinc
-        leftlift = leftlift_F(bank, AOAL)
-        rightlift = rightlift_F(bank, AOAR)
-        Fnety = weight + leftlift[1] + rightlift[1] + vertdrag
+def rightlift_F_batch(bank, AoA):
+    return default_model.rightlift_F_batch(bank, AoA)
 
-    Fnetx = sidedrag + leftlift[0] + rightlift[0]
-    return (Fnetx, Fnety)
+def AoAR_batch(vss, vy, bank, w):
+    return default_model.AoAR_batch(vss, vy, bank, w)
 
+def AoAL_batch(vss, vy, bank, w):
+    return default_model.AoAL_batch(vss, vy, bank, w)
 
-def Tnet (vss, vy, bank, w):
-    """
-    Returns net torque in Nm
+def net_batch(vss, vy, bank, w):
+    return default_model.net_batch(vss, vy, bank, w)
 
-    vss: horizontal airspeed (m/s), positive to the right from our POV
-    vy: vertical speed
-    bank: bank angle in degrees
-    w: roll rate in deg/s
-    """
+def Fnet_batch(vss, vy, bank, w):
+    return default_model.Fnet_batch(vss, vy, bank, w)
 
-    left_T = leftlift_T(leftlift_F(bank, AoAL(vss, vy, bank, w)))
-    right_T = rightlift_T(rightlift_F(bank, AoAR(vss, vy, bank, w)))
-    return left_T + right_T
+def Tnet_batch(vss, vy, bank, w):
+    return default_model.Tnet_batch(vss, vy, bank, w)
+
+def derivatives_batch(state):
+    return default_model.derivatives_batch(state)
 
 
 if __name__ == "__main__":
@@ -342,13 +694,13 @@ if __name__ == "__main__":
     # simple test
     bank = 15  # degrees counter clockwise    _o/
     vy = 0  # m/s down
-    vss = 0 # m/s slipping 
+    vss = 0 # m/s slipping
     w = 5  # deg/s
     print("a_default" + ": ", a_default)
-    
+
     #    _o/    slipping <- and falling v
     print("AoAR:", AoAR(vss,vy,bank, w))
     print("AoAL:", AoAL(vss,vy,bank, w))
     print("Fnetx:", Fnet(vss, vy, bank, w)[0])
     print("Fnety:", Fnet(vss, vy, bank, w)[1])
-    print("Tnet:", Tnet(vss, vy, bank, w))
\ No newline at end of file
+    print("Tnet:", Tnet(vss, vy, bank, w))
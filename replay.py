@@ -0,0 +1,115 @@
+"""
+Playback of recorded flight data (text or .run) through the visualizer, without re-simulating.
+
+    python Simulator_Main.py --replay                  most recent file in ./data/
+    python Simulator_Main.py --replay data/FILE.run    a given file
+    python Simulator_Main.py --replay FILE --speed 10  start at 10x
+
+Keys: SPACE pause, LEFT/RIGHT seek 5 s (with SHIFT 30 s), UP/DOWN double/halve the speed, HOME/END jump to start/end.
+"""
+from pathlib import Path
+import numpy as np
+import runformat
+from runformat import latest_run
+from simulation import WORLDSCALE, WINDOW_HEIGHT, PIC_WIDTH, PIC_HEIGHT
+
+MIN_SPEED = 0.1
+MAX_SPEED = 50.0
+
+
+class RunReplay:
+    """
+    Plays back a recorded run with the same attributes the visualizer reads from FlightSimulation
+    (x, y, bank, dbank, runtime, world_position). .run files are memory mapped, so only the samples around the
+    playback time are read from disk. The time column is the seek index: the state at any time is found with a
+    binary search and interpolated linearly between the two recorded samples around it.
+    """
+
+    def __init__(self, path, speed=1.0, worldscale=None):
+        """
+        Args:
+            path (Path): flight data file, text or .run
+            speed (float, optional): playback speed, simulated seconds per real second. Defaults to 1.0.
+            worldscale (float, optional): zoom level. Defaults to the recorded one for .run files, otherwise WORLDSCALE.
+        """
+        self.path = Path(path)
+        self.header, self.data = runformat.load_fastest(self.path)
+        if len(self.data) == 0:
+            raise ValueError(f"{self.path} has no samples")
+        self.header = self.header or {}
+        self.t = self.data["t"]
+
+        # starting position the run was recorded from, the world position is relative to it
+        initial = self.header.get("initial_state", {})
+        self.initx = initial.get("x", PIC_WIDTH/2)
+        self.inity = initial.get("y", PIC_HEIGHT - WINDOW_HEIGHT/2)
+        self.worldscale = worldscale or self.header.get("worldscale", WORLDSCALE)
+        self.dt = self.header.get("log_dt", 1/60)
+        self.start = float(self.t[0])
+        self.end = float(self.t[-1])
+
+        self.speed = 1.0
+        self.set_speed(speed)
+        self.paused = False
+        self.seek(self.start)
+
+    def set_speed(self, speed):
+        """
+        Set the playback speed, clamped to MIN_SPEED..MAX_SPEED
+        Args:
+            speed (float): simulated seconds per real second
+        """
+        self.speed = min(max(speed, MIN_SPEED), MAX_SPEED)
+
+    def seek(self, t):
+        """
+        Jump to a time in the run, clamped to the recorded range
+        Args:
+            t (float): time in seconds
+        """
+        self.runtime = min(max(t, self.start), self.end)
+        i = int(np.searchsorted(self.t, self.runtime, side="right"))
+        i = min(max(i, 1), len(self.t) - 1)
+        if len(self.t) == 1:
+            sample = self.data[0]
+            self.x, self.y, self.bank, self.dbank = float(sample["x"]), float(sample["y"]), float(sample["bank"]), 0.0
+            return
+
+        a, b = self.data[i - 1], self.data[i]
+        span = float(b["t"] - a["t"])
+        alpha = (self.runtime - float(a["t"])) / span if span > 0 else 1.0
+        self.x = float(a["x"] + alpha * (b["x"] - a["x"]))
+        self.y = float(a["y"] + alpha * (b["y"] - a["y"]))
+        self.bank = float(a["bank"] + alpha * (b["bank"] - a["bank"]))
+        self.dbank = float(b["bank"] - a["bank"]) / span if span > 0 else 0.0
+
+    def advance(self, dt):
+        """
+        Move the playback time forward by dt real seconds at the current speed, playback pauses at the end of the run
+        Args:
+            dt (float): real time since the last frame
+        """
+        if self.paused:
+            return
+        self.seek(self.runtime + dt * self.speed)
+        if self.runtime >= self.end:
+            self.paused = True
+
+    def world_position(self, x=None, y=None):
+        """
+        Aircraft position in world (background image) coordinates, see FlightSimulation.world_position
+        Args:
+            x (float, optional): horizontal position to convert. Defaults to the current position.
+            y (float, optional): vertical position to convert. Defaults to the current position.
+        Returns:
+            tuple: (x, y)
+        """
+        x = self.x if x is None else x
+        y = self.y if y is None else y
+        return (self.initx + (x - self.initx) * self.worldscale,
+                self.inity + (y - self.inity) * self.worldscale)
+
+    def close(self):
+        """
+        Nothing to write, for interface compatibility with FlightSimulation
+        """
@@ -0,0 +1,152 @@
+"""
+Binary flight data format (.run) with the configuration that produced the run.
+
+Layout:
+    8 bytes      magic b"ODERUN1\\n"
+    4 bytes      header length in bytes (little endian uint32)
+    header       UTF-8 JSON, padded with spaces so the data starts on a 64 byte boundary
+    data         little endian float64 records (x, y, bank, t), appended as the run goes
+
+The header stores the globalize_physics_vars arguments, the initial state, the integrator and its time step.
+The row count comes from the file size, so a run that was cut short is still readable and the data can be memory mapped.
+
+Convert the existing text runs:
+    python runformat.py data/*.txt
+"""
+import json
+import struct
+import sys
+from pathlib import Path
+import numpy as np
+
+MAGIC = b"ODERUN1\n"
+RUN_SUFFIX = ".run"
+ALIGNMENT = 64
+
+# one sample, same columns as the text format
+RUN_DTYPE = np.dtype([("x", "<f8"), ("y", "<f8"), ("bank", "<f8"), ("t", "<f8")])
+
+
+def encode_header(header):
+    """
+    Magic, length and JSON header padded to ALIGNMENT
+    Args:
+        header (dict): run metadata, must be JSON serializable
+    Returns:
+        bytes: everything that goes before the data
+    """
+    header = dict(header, columns=list(RUN_DTYPE.names))
+    text = json.dumps(header, sort_keys=True).encode("utf-8")
+    prefix = len(MAGIC) + 4
+    padded = -(-(prefix + len(text)) // ALIGNMENT) * ALIGNMENT - prefix
+    text = text.ljust(padded, b" ")
+    return MAGIC + struct.pack("<I", len(text)) + text
+
+
+def read_header(path):
+    """
+    Read the header of a .run file
+    Args:
+        path (Path): run file
+    Returns:
+        tuple: (header dict, byte offset of the data)
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a {RUN_SUFFIX} file")
+        (length,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length).decode("utf-8"))
+    return header, len(MAGIC) + 4 + length
+
+
+def load_run(path, mmap=True):
+    """
+    Load a flight data file, binary (.run) or text
+    Args:
+        path (Path): run file
+        mmap (bool, optional): memory map .run data instead of reading it. Defaults to True.
+    Returns:
+        tuple: (header dict or None for text files, structured array with fields x, y, bank, t)
+    """
+    path = Path(path)
+    if path.suffix != RUN_SUFFIX:
+        data = np.loadtxt(path, dtype=float, ndmin=2, usecols=(0, 1, 2, 3))
+        return None, np.ascontiguousarray(data).view(RUN_DTYPE)[:, 0]
+
+    header, offset = read_header(path)
+    rows = (path.stat().st_size - offset) // RUN_DTYPE.itemsize  # ignore a partly written last record
+    if rows == 0:
+        return header, np.empty(0, dtype=RUN_DTYPE)
+    if mmap:
+        return header, np.memmap(path, dtype=RUN_DTYPE, mode="r", offset=offset, shape=(rows,))
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return header, np.fromfile(f, dtype=RUN_DTYPE, count=rows)
+
+
+def latest_run(directory="./data/"):
+    """
+    Most recently modified flight data file
+    Args:
+        directory (Path, optional): data directory. Defaults to "./data/".
+    Returns:
+        Path: newest .txt or .run file
+    """
+    files = [f for f in Path(directory).iterdir() if f.is_file() and f.suffix in (".txt", RUN_SUFFIX)]
+    if not files:
+        raise FileNotFoundError(f"No flight data in {directory}")
+    return max(files, key=lambda f: f.stat().st_mtime)
+
+
+def load_fastest(path, mmap=True):
+    """
+    Like load_run, but reads the binary copy of a text run (same name, .run suffix, e.g. from convert_text_run) if it is up to date
+    Args:
+        path (Path): run file
+        mmap (bool, optional): memory map .run data instead of reading it. Defaults to True.
+    Returns:
+        tuple: (header dict or None, structured array with fields x, y, bank, t)
+    """
+    path = Path(path)
+    binary = path.with_suffix(RUN_SUFFIX)
+    if path.suffix != RUN_SUFFIX and binary.is_file() and binary.stat().st_mtime >= path.stat().st_mtime:
+        path = binary
+    return load_run(path, mmap)
+
+
+def write_run(path, data, header):
+    """
+    Write a whole run to a .run file
+    Args:
+        path (Path): output file
+        data (numpy.ndarray): structured array with fields x, y, bank, t
+        header (dict): run metadata
+    """
+    with open(path, "wb") as f:
+        f.write(encode_header(header))
+        rows = np.empty(len(data), dtype=RUN_DTYPE)
+        for name in RUN_DTYPE.names:
+            rows[name] = data[name]
+        rows.tofile(f)
+
+
+def convert_text_run(txt_path, out_path=None, header=None):
+    """
+    Convert a text run to the binary format
+    Args:
+        txt_path (Path): text run, columns x y bank t
+        out_path (Path, optional): output file. Defaults to txt_path with the .run suffix.
+        header (dict, optional): metadata to store, the source file name is always added. Defaults to none.
+    Returns:
+        Path: the written file
+    """
+    txt_path = Path(txt_path)
+    out_path = Path(out_path) if out_path is not None else txt_path.with_suffix(RUN_SUFFIX)
+    _, data = load_run(txt_path)
+    write_run(out_path, data, dict(header or {}, source=txt_path.name))
+    return out_path
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:]:
+        print(name, "->", convert_text_run(name))
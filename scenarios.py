@@ -0,0 +1,224 @@
+"""
+Scenario files and a headless batch runner.
+
+A scenario describes one run: physics parameters (the globalize_physics_vars arguments, including Autopilot),
+initial bank angle, timeout, zoom and output file. Parameters left out come from PHYSICS_PARAMS and the other
+user inputs at the top of simulation.py. TOML (.toml), JSON (.json) and, if PyYAML is installed, YAML (.yaml/.yml)
+files are read, e.g. scenarios/reference/small dih 5.toml:
+
+    bank = 5.0
+    timeout = 150
+
+    [physics]
+    dihedral = 7
+    WingLength = 5
+    Constant_Altitude = false
+    Autopilot = false
+
+Run a directory (or list) of scenarios headlessly over a process pool, one run file per scenario plus summary.txt:
+    python scenarios.py scenarios/reference -o data/reference
+
+Open one scenario in the visualizer:
+    python Simulator_Main.py --scenario "scenarios/reference/small dih 5.toml"
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import physics
+import keyboardctrl as kb
+from simulation import FlightSimulation, PHYSICS_PARAMS, INITIAL_BANK, WORLDSCALE, TIMEOUT, LOG_FORMAT, run_headless
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+SCENARIO_SUFFIXES = (".toml", ".json", ".yaml", ".yml")
+SCENARIO_KEYS = {"name", "physics", "bank", "timeout", "worldscale", "output", "format"}
+
+
+def load_scenario(path):
+    """
+    Read a scenario file and fill in the defaults
+    Args:
+        path (Path): .toml, .json or .yaml file
+    Returns:
+        dict: name, physics (all globalize_physics_vars arguments), bank, timeout, worldscale, output (None for the default) and format
+    """
+    path = Path(path)
+    if path.suffix == ".toml":
+        if tomllib is None:
+            raise ImportError("Reading TOML scenarios needs Python 3.11+ or the tomli package")
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    elif path.suffix == ".json":
+        with open(path) as f:
+            data = json.load(f)
+    elif path.suffix in (".yaml", ".yml"):
+        if yaml is None:
+            raise ImportError("Reading YAML scenarios needs the PyYAML package")
+        with open(path) as f:
+            data = yaml.safe_load(f)
+    else:
+        raise ValueError(f"{path} is not a scenario file ({', '.join(SCENARIO_SUFFIXES)})")
+
+    unknown = set(data) - SCENARIO_KEYS
+    if unknown:
+        raise ValueError(f"{path}: unknown scenario keys {sorted(unknown)}")
+    params = dict(PHYSICS_PARAMS)
+    unknown = set(data.get("physics", {})) - set(params)
+    if unknown:
+        raise ValueError(f"{path}: unknown physics parameters {sorted(unknown)}")
+    params.update(data.get("physics", {}))
+
+    return {
+        "name": data.get("name", path.stem),
+        "physics": params,
+        "bank": float(data.get("bank", INITIAL_BANK)),
+        "timeout": data.get("timeout", TIMEOUT),
+        "worldscale": data.get("worldscale", WORLDSCALE),
+        "output": data.get("output"),
+        "format": data.get("format", LOG_FORMAT),
+    }
+
+
+def find_scenarios(paths):
+    """
+    Scenario files given directly or found in directories
+    Args:
+        paths (list): files and/or directories
+    Returns:
+        list: scenario file paths, sorted within each directory
+    """
+    found = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            found += sorted(p for p in path.iterdir() if p.suffix in SCENARIO_SUFFIXES)
+        else:
+            found.append(path)
+    return found
+
+
+def scenario_simulation(scenario, data_path=None):
+    """
+    Set up the physics globals and a FlightSimulation for a scenario
+    Args:
+        scenario (dict): from load_scenario
+        data_path (Path, optional): flight data file. Defaults to the scenario output, or the FlightSimulation default.
+    Returns:
+        FlightSimulation: ready to step
+    """
+    params = dict(scenario["physics"])
+    physics.Autopilot = params.pop("Autopilot", False)
+    physics.Keyboard_Control = params.pop("Keyboard_Control", False)
+    model = physics.AircraftModel(**params)
+
+    # the autopilot state lives in keyboardctrl, start every run from neutral controls
+    kb.ap_on = 0
+    kb.aileron_input = 0
+
+    if data_path is None and scenario["output"] is not None:
+        data_path = Path(scenario["output"])
+    if data_path is not None:
+        data_path.parent.mkdir(parents=True, exist_ok=True)
+    return FlightSimulation(model=model, bank=scenario["bank"], worldscale=scenario["worldscale"],
+                            timeout=scenario["timeout"], data_path=data_path)
+
+
+def run_scenario(path, out_dir):
+    """
+    Run one scenario headlessly, for the process pool
+    Args:
+        path (Path): scenario file
+        out_dir (Path): directory for the run file if the scenario has no output
+    Returns:
+        dict: summary row (see SUMMARY_COLUMNS)
+    """
+    scenario = load_scenario(path)
+    if scenario["output"] is not None:
+        data_path = Path(scenario["output"])
+    else:
+        data_path = Path(out_dir) / f"{scenario['name']}.{scenario['format']}"
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+    data_path.unlink(missing_ok=True)  # the logger appends
+
+    start = time.perf_counter()
+    sim = scenario_simulation(scenario, data_path)
+    message = run_headless(sim)
+    wall = time.perf_counter() - start
+
+    return {
+        "name": scenario["name"],
+        "end (s)": round(sim.runtime, 3),
+        "final bank": round(float(sim.bank), 3),
+        "result": message.split(".")[0],
+        "wall (s)": round(wall, 3),
+        "output": str(sim.data_path_name),
+    }
+
+
+SUMMARY_COLUMNS = ("name", "end (s)", "final bank", "result", "wall (s)", "output")
+
+
+def format_summary(rows):
+    """
+    Summary rows as an aligned text table
+    Args:
+        rows (list): dicts from run_scenario
+    Returns:
+        str: table
+    """
+    widths = [max([len(column)] + [len(str(row[column])) for row in rows]) for column in SUMMARY_COLUMNS]
+    lines = ["  ".join(column.ljust(width) for column, width in zip(SUMMARY_COLUMNS, widths))]
+    lines.append("  ".join("-" * width for width in widths))
+    for row in rows:
+        lines.append("  ".join(str(row[column]).ljust(width) for column, width in zip(SUMMARY_COLUMNS, widths)))
+    return "\n".join(line.rstrip() for line in lines)
+
+
+def run_batch(paths, out_dir="./data/batch/", workers=None):
+    """
+    Run scenarios headlessly across a process pool and write summary.txt to out_dir
+    Args:
+        paths (list): scenario files and/or directories of them
+        out_dir (Path, optional): directory for run files and the summary. Defaults to "./data/batch/".
+        workers (int, optional): number of processes. Defaults to the number of CPUs.
+    Returns:
+        list: summary rows, in scenario order
+    """
+    files = find_scenarios(paths)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    workers = min(workers or os.cpu_count() or 1, max(len(files), 1))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rows = list(pool.map(run_scenario, files, [out_dir] * len(files)))
+
+    table = format_summary(rows)
+    with open(out_dir / "summary.txt", "w") as f:
+        f.write(table + "\n")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run scenario files headlessly")
+    parser.add_argument("paths", nargs="+", help="scenario files or directories")
+    parser.add_argument("-o", "--out-dir", default="./data/batch/", help="directory for run files and summary.txt (default ./data/batch/)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of processes (default: number of CPUs)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows = run_batch(args.paths, args.out_dir, args.workers)
+    print(format_summary(rows))
+    print(f"\n{len(rows)} scenarios in {time.perf_counter() - start:.1f} s, summary saved to {Path(args.out_dir) / 'summary.txt'}")
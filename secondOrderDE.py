@@ -2,11 +2,76 @@
 Second order differential equation solver
 """
 import numpy as np
+from collections import namedtuple
 import physics
 import keyboardctrl as kb
 
+# number of aircraft state derivative evaluations so far, for the performance overlay (a batched call counts one per aircraft)
+evaluations = 0
 
-def euler(x, y, bank, dx, dy, dbank, dt):
+
+def ap(ap_on, bank, dbank):
+    """Use ap_on and aileron_input variables as defined in keyboardctrl.py
+    If autopilot active, update global aileron_input with output from autopilot.
+    If bank angle is greater than 0.01 degrees in either direction, then increment autopilot input by an amount proportional to bank angle and bank rate. Otherwise, reset ailerons.
+    Note: 1/5 and 1/3 are arbitrary constants and can be adjusted.
+
+    Args:
+        ap_on (int): Autopilot status
+        bank (float): bank angle
+        dbank (float): (bank) angular velocity
+    Returns:
+        None
+    """
+    if ap_on:
+        if (bank < -0.01 and kb.aileron_input < 30) or (bank > 0.01 and kb.aileron_input > -30):
+            kb.aileron_input -= bank/5 + dbank/3
+        else:
+            kb.aileron_input = 0
+
+
+def aileron_control(bank, dbank):
+    """Use ap_on and aileron_input variables as defined in keyboardctrl.py
+    Autopilot queried for updated global aileron_input, assume resultant torque is linear
+    Note: -300 is an arbitrary coefficient to match approximate magnitudes of forced torque and natural torque, but can be substituted with any negative number
+
+    Args:
+        bank (float): bank angle
+        dbank (float): (bank) angular velocity
+    Returns:
+        float: forced (aileron) torque, to be added to the natural torque from physics.Tnet
+    """
+    ap(kb.ap_on, bank, dbank)
+    return kb.aileron_input * -300
+
+
+def accelerations(dx, dy, bank, dbank, model=None, check_stall=True, control_torque=None):
+    """
+    Accelerations of the aircraft from AircraftModel.derivatives, plus aileron torque when the autopilot is enabled
+    Args:
+        dx (float): horizontal velocity
+        dy (float): vertical velocity
+        bank (float): bank angle
+        dbank (float): (bank) angular velocity
+        model (physics.AircraftModel, optional): aircraft configuration. Defaults to physics.default_model.
+        check_stall (bool, optional): raise ValueError past the stall angle. Defaults to True.
+        control_torque (float, optional): aileron torque to apply with the autopilot. Defaults to querying (and updating) the autopilot.
+    Returns:
+        tuple: (ddx, ddy, ddbank)
+    """
+    global evaluations
+    evaluations += 1
+    if model is None:
+        model = physics.default_model
+    ddx, ddy, ddbank = model.derivatives((dx, dy, bank, dbank), check_stall)
+    if physics.Autopilot:
+        if control_torque is None:
+            control_torque = aileron_control(bank, dbank)
+        ddbank -= (1/model.I_roll) * control_torque
+    return (ddx, ddy, ddbank)
+
+
+def euler(x, y, bank, dx, dy, dbank, dt, model=None):
     """
     Euler's Method 
     Args:
@@ -17,16 +82,12 @@ def euler(x, y, bank, dx, dy, dbank, dt):
         dy (float): vertical velocity
         dbank (float): (bank) angular velocity 
         dt (float): time step
+        model (physics.AircraftModel, optional): aircraft configuration. Defaults to physics.default_model.
     Returns:
         tuple: Updated values of (x, y, bank, dx, dy, dbank) after one Euler's method step
     """
 
-    Fnetx, Fnety = physics.Fnet(dx, dy, bank)
-    ya =(1/physics.Mass) * Fnety
-    
-    xa = (1/physics.Mass) * Fnetx # inputs to Fnetx are vss, vy, bank
-
-    ba = -(1/physics.I_roll) * physics.Tnet(dx, dy, bank, dbank) # inputs to Tnet are vss, vy, bank, w
+    xa, ya, ba = accelerations(dx, dy, bank, dbank, model)
 
     x1 = x + (dx)*dt
     dx1 = dx + xa*dt
@@ -38,9 +99,10 @@ def euler(x, y, bank, dx, dy, dbank, dt):
     return(x1, y1, bank1, dx1, dy1, dbank1)
 
     
-def second_order_DE_rk4(x, y, bank, dx, dy, dbank, dt):
+def second_order_DE_rk4(x, y, bank, dx, dy, dbank, dt, model=None, check_stall=True):
     """
     Second Order Nonlinear Differential Equation Solver using 4th order Runge Kutta
+    Each stage evaluates all three accelerations with one call to AircraftModel.derivatives (4 calls per step)
     Args:
         x (float): horizontal position
         y (float): vertical position
@@ -49,134 +111,467 @@ def second_order_DE_rk4(x, y, bank, dx, dy, dbank, dt):
         dy (float): vertical velocity
         dbank (float): (bank) angular velocity 
         dt (float): time step
+        model (physics.AircraftModel, optional): aircraft configuration. Defaults to physics.default_model.
+        check_stall (bool, optional): raise ValueError past the stall angle. Defaults to True.
     Returns:
         tuple: Updated values of (x, y, bank, dx, dy, dbank) after one RK4 step
     """
 
-    # Derivative functions to handle different inputs easy
+    # stage 1
+    k1_ddx, k1_ddy, k1_ddbank = accelerations(dx, dy, bank, dbank, model, check_stall)
 
-    def f_dy(dy):
-        return dy
-    def f_ddy(dy, bank):
-        Fnety = physics.Fnet(dx, dy, bank, dbank)[1]
-        return (1/physics.Mass) * Fnety
-    
-    def f_dx(dx):
-        return dx 
-    
-    def f_ddx(dx, dy, bank):
-        Fnetx = physics.Fnet(dx, dy, bank, dbank)[0]
-        return (1/physics.Mass) * Fnetx # inputs to Fnetx are vss, vy, bank
-    
-    def f_dbank(dbank):
-        return dbank
-    
-    def f_ddbank(dx, dy, bank, dbank):
-        if physics.Autopilot:
-            return -(1/physics.I_roll) * inject_aileron_control(dx, dy, bank, dbank) # inputs to Tnet are vss, vy, bank, w
-        else:
-            return -(1/physics.I_roll) * physics.Tnet(dx, dy, bank, dbank) # inputs to Tnet are vss, vy, bank, w
+    # stage 2, velocities at the midpoint using stage 1 slopes
+    k2_dx = dx + 0.5*dt*k1_ddx
+    k2_dy = dy + 0.5*dt*k1_ddy
+    k2_dbank = dbank + 0.5*dt*k1_ddbank
+    k2_ddx, k2_ddy, k2_ddbank = accelerations(k2_dx, k2_dy, bank + 0.5*dt*dbank, k2_dbank, model, check_stall)
 
-    # Keyboard aileron control
+    # stage 3, velocities at the midpoint using stage 2 slopes
+    k3_dx = dx + 0.5*dt*k2_ddx
+    k3_dy = dy + 0.5*dt*k2_ddy
+    k3_dbank = dbank + 0.5*dt*k2_ddbank
+    k3_ddx, k3_ddy, k3_ddbank = accelerations(k3_dx, k3_dy, bank + 0.5*dt*k2_dbank, k3_dbank, model, check_stall)
 
-    
-    def inject_aileron_control(dx, dy, bank, dbank):
-        """Use ap_on and aileron_input variables as defined in keyboardctrl.py
-        Float parameters dx, dy, bank, dbank used to define attitude and calculate natural torque with physics.Tnet
-        Autopilot queried for updated global aileron_input, assume resultant torque is linear
-        Note: -300 is an arbitrary coefficient to match approximate magnitudes of forced torque and natural torque, but can be substituted with any negative number
-        Total torque is returned as sum of natural and input (forced) torques
-
-        Args:
-            dx (float): horizontal velocity
-            dy (float): vertical velocity
-            bank (float): bank angle
-            dbank (float): (bank) angular velocity
-        Returns:
-            float: sum of torques
-        """
-        T_natural = physics.Tnet(dx, dy, bank, dbank)
-        ap(kb.ap_on, bank, dbank)
-        T_input = kb.aileron_input * -300
-        return T_natural + T_input
+    # stage 4, velocities at the end of the step using stage 3 slopes
+    k4_dx = dx + dt*k3_ddx
+    k4_dy = dy + dt*k3_ddy
+    k4_dbank = dbank + dt*k3_ddbank
+    k4_ddx, k4_ddy, k4_ddbank = accelerations(k4_dx, k4_dy, bank + dt*k3_dbank, k4_dbank, model, check_stall)
 
-    
-    def ap(ap_on, bank, dbank):
-        """Use ap_on and aileron_input variables as defined in keyboardctrl.py
-        If autopilot active, update global aileron_input with output from autopilot.
-        If bank angle is greater than 0.01 degrees in either direction, then increment autopilot input by an amount proportional to bank angle and bank rate. Otherwise, reset ailerons.
-        Note: 1/5 and 1/3 are arbitrary constants and can be adjusted.
-
-        Args:
-            ap_on (int): Autopilot status
-            bank (float): bank angle
-            dbank (float): (bank) angular velocity
-        Returns:
-            None
-        """
-        if ap_on:
-            if (bank < -0.01 and kb.aileron_input < 30) or (bank > 0.01 and kb.aileron_input > -30):
-                kb.aileron_input -= bank/5 + dbank/3
-            else:
-                kb.aileron_input = 0
-    
+    # Update all variables
+    x1 = x + dt * (dx + 2*k2_dx + 2*k3_dx + k4_dx) / 6
+    y1 = y + dt * (dy + 2*k2_dy + 2*k3_dy + k4_dy) / 6
+    bank1 = bank + dt * (dbank + 2*k2_dbank + 2*k3_dbank + k4_dbank) / 6
 
-    #RK4 steps
+    dx1 = dx + dt * (k1_ddx + 2*k2_ddx + 2*k3_ddx + k4_ddx) / 6
+    dy1 = dy + dt * (k1_ddy + 2*k2_ddy + 2*k3_ddy + k4_ddy) / 6
+    dbank1 = dbank + dt * (k1_ddbank + 2*k2_ddbank + 2*k3_ddbank + k4_ddbank) / 6
 
-    # y substeps
-    k1_y = dt * f_dy(dy)
-    k1_dy = dt * f_ddy(dy, bank)
-    
-    k2_y = dt * f_dy(dy + 0.5*k1_dy)
-    k2_dy = dt * f_ddy(dy + 0.5*k1_dy, bank + 0.5*dt*dbank)
-    
-    k3_y = dt * f_dy(dy + 0.5*k2_dy)
-    k3_dy = dt * f_ddy(dy + 0.5*k2_dy, bank + 0.5*dt*dbank)
-    
-    k4_y = dt * f_dy(dy + k3_dy)
-    k4_dy = dt * f_ddy(dy + k3_dy, bank + dt*dbank)
-    
-    # x substeps
-    k1_x = dt * f_dx(dx)
-    k1_dx = dt * f_ddx(dx, dy, bank)
-    
-    k2_x = dt * f_dx(dx + 0.5*k1_dx)
-    k2_dx = dt * f_ddx(dx + 0.5*k1_dx, dy + 0.5*k1_dy, bank + 0.5*dt*dbank)
-    
-    k3_x = dt * f_dx(dx + 0.5*k2_dx)
-    k3_dx = dt * f_ddx(dx + 0.5*k2_dx, dy + 0.5*k2_dy, bank + 0.5*dt*dbank)
-    
-    k4_x = dt * f_dx(dx + k3_dx)
-    k4_dx = dt * f_ddx(dx + k3_dx, dy + k3_dy, bank + dt*dbank)
-    
-    # bank substeps
-    k1_bank = dt * f_dbank(dbank)
-    k1_dbank = dt * f_ddbank(dx, dy, bank, dbank)
-    
-    k2_bank = dt * f_dbank(dbank + 0.5*k1_dbank)
-    k2_dbank = dt * f_ddbank(dx + 0.5*k1_dx, dy + 0.5*k1_dy, 
-                            bank + 0.5*k1_bank, dbank + 0.5*k1_dbank)
-    
-    k3_bank = dt * f_dbank(dbank + 0.5*k2_dbank)
-    k3_dbank = dt * f_ddbank(dx + 0.5*k2_dx, dy + 0.5*k2_dy, 
-                            bank + 0.5*k2_bank, dbank + 0.5*k2_dbank)
-    
-    k4_bank = dt * f_dbank(dbank + k3_dbank)
-    k4_dbank = dt * f_ddbank(dx + k3_dx, dy + k3_dy, 
-                            bank + k3_bank, dbank + k3_dbank)
-    
-    # Update all variables
-    y1 = y + (k1_y + 2*k2_y + 2*k3_y + k4_y) / 6
-    dy1 = dy + (k1_dy + 2*k2_dy + 2*k3_dy + k4_dy) / 6
-    
-    x1 = x + (k1_x + 2*k2_x + 2*k3_x + k4_x) / 6
-    dx1 = dx + (k1_dx + 2*k2_dx + 2*k3_dx + k4_dx) / 6
-    
-    bank1 = bank + (k1_bank + 2*k2_bank + 2*k3_bank + k4_bank) / 6
-    dbank1 = dbank + (k1_dbank + 2*k2_dbank + 2*k3_dbank + k4_dbank) / 6
+    return (x1, y1, bank1, dx1, dy1, dbank1)
+
+
+def second_order_DE_rk4_batch(x, y, bank, dx, dy, dbank, dt, model=None):
+    """
+    Vectorized second_order_DE_rk4, advances many aircraft by one RK4 step with 4 calls to AircraftModel.derivatives_batch
+    The state arrays broadcast against each other and against array valued model parameters (one configuration per aircraft).
+    No autopilot or keyboard input, and a stalled aircraft comes out as NaN instead of raising ValueError.
+    Args:
+        x (numpy.ndarray): horizontal positions
+        y (numpy.ndarray): vertical positions
+        bank (numpy.ndarray): bank angles
+        dx (numpy.ndarray): horizontal velocities
+        dy (numpy.ndarray): vertical velocities
+        dbank (numpy.ndarray): (bank) angular velocities
+        dt (float): time step
+        model (physics.AircraftModel, optional): aircraft configuration(s). Defaults to physics.default_model.
+    Returns:
+        tuple: Updated arrays (x, y, bank, dx, dy, dbank) after one RK4 step
+    """
+    global evaluations
+    if model is None:
+        model = physics.default_model
+    x, y, bank, dx, dy, dbank = (np.asarray(v, dtype=float) for v in (x, y, bank, dx, dy, dbank))
+    evaluations += 4 * np.broadcast(x, y, bank, dx, dy, dbank).size
+
+    k1_ddx, k1_ddy, k1_ddbank = model.derivatives_batch((dx, dy, bank, dbank))
+
+    k2_dx = dx + 0.5*dt*k1_ddx
+    k2_dy = dy + 0.5*dt*k1_ddy
+    k2_dbank = dbank + 0.5*dt*k1_ddbank
+    k2_ddx, k2_ddy, k2_ddbank = model.derivatives_batch((k2_dx, k2_dy, bank + 0.5*dt*dbank, k2_dbank))
+
+    k3_dx = dx + 0.5*dt*k2_ddx
+    k3_dy = dy + 0.5*dt*k2_ddy
+    k3_dbank = dbank + 0.5*dt*k2_ddbank
+    k3_ddx, k3_ddy, k3_ddbank = model.derivatives_batch((k3_dx, k3_dy, bank + 0.5*dt*k2_dbank, k3_dbank))
+
+    k4_dx = dx + dt*k3_ddx
+    k4_dy = dy + dt*k3_ddy
+    k4_dbank = dbank + dt*k3_ddbank
+    k4_ddx, k4_ddy, k4_ddbank = model.derivatives_batch((k4_dx, k4_dy, bank + dt*k3_dbank, k4_dbank))
+
+    x1 = x + dt * (dx + 2*k2_dx + 2*k3_dx + k4_dx) / 6
+    y1 = y + dt * (dy + 2*k2_dy + 2*k3_dy + k4_dy) / 6
+    bank1 = bank + dt * (dbank + 2*k2_dbank + 2*k3_dbank + k4_dbank) / 6
+
+    dx1 = dx + dt * (k1_ddx + 2*k2_ddx + 2*k3_ddx + k4_ddx) / 6
+    dy1 = dy + dt * (k1_ddy + 2*k2_ddy + 2*k3_ddy + k4_ddy) / 6
+    dbank1 = dbank + dt * (k1_ddbank + 2*k2_ddbank + 2*k3_ddbank + k4_ddbank) / 6
 
     return (x1, y1, bank1, dx1, dy1, dbank1)
 
+
+# Row layout of the trajectories returned by simulate
+TRAJECTORY_DTYPE = np.dtype([("t", float), ("x", float), ("y", float), ("bank", float),
+                             ("dx", float), ("dy", float), ("dbank", float)])
+
+
+"""
+Events
+An event function g(t, state) -> float marks a crossing wherever it changes sign, state is (x, y, bank, dx, dy, dbank).
+Attributes read by the integrators:
+    name (str): name stored in the Event record
+    terminal (bool): stop the integration at the crossing
+    direction (int): -1 only counts crossings from positive to negative, +1 the opposite, 0 both
+    stall (bool): this event watches the stall angle, so the integrator evaluates past it instead of raising ValueError
+Crossings are located by bisection on the interpolated solution inside the step.
+"""
+
+# One detected crossing, state is (x, y, bank, dx, dy, dbank) at time t
+Event = namedtuple("Event", ["name", "t", "state"])
+
+
+def make_event(func, name, terminal=True, direction=0):
+    """
+    Attach the event attributes to an event function g(t, state)
+    Args:
+        func (callable): event function
+        name (str): event name
+        terminal (bool, optional): stop the integration at the crossing. Defaults to True.
+        direction (int, optional): crossing direction to detect. Defaults to 0 (both).
+    Returns:
+        callable: func
+    """
+    func.name = name
+    func.terminal = terminal
+    func.direction = direction
+    return func
+
+
+def bank_limit_event(limit=90):
+    """
+    Bank angle leaves [-limit, limit] degrees, the "exceeded safe bank angle" failure of the simulator
+    """
+    return make_event(lambda t, state: limit - abs(state[2]), "bank limit", direction=-1)
+
+
+def altitude_floor_event(y_floor):
+    """
+    Vertical position drops below y_floor
+    """
+    return make_event(lambda t, state: state[1] - y_floor, "altitude floor", direction=-1)
+
+
+def stall_event(model):
+    """
+    Either wing passes its stall angle (the limits of AircraftModel.AoAR and AoAL)
+    """
+    def g(t, state):
+        AOAR = model.AoAR_batch(state[3], state[4], state[2], state[5])[0]
+        AOAL = model.AoAL_batch(state[3], state[4], state[2], state[5])[0]
+        return float(min(physics.STALLANGLE - abs(AOAR), 30 - abs(AOAL)))
+    event = make_event(g, "stall", direction=-1)
+    event.stall = True
+    return event
+
+
+def settled_event(bank_tol=0.1, rate_tol=0.1):
+    """
+    Bank within bank_tol degrees of level and roll rate within rate_tol deg/s at the same time.
+    Lets a run stop at convergence instead of the timeout.
+    """
+    return make_event(lambda t, state: max(abs(state[2]) / bank_tol, abs(state[5]) / rate_tol) - 1,
+                      "settled", direction=-1)
+
+
+def _crossed(g0, g1, direction):
+    """
+    Whether an event changed sign from g0 to g1 in the given direction
+    """
+    if direction <= 0 and g0 > 0 and g1 <= 0:
+        return True
+    if direction >= 0 and g0 < 0 and g1 >= 0:
+        return True
+    return False
+
+
+def _find_events(events, g0, t0, t1, state1, interpolate):
+    """
+    Check every event over the step from t0 to t1 and locate the crossings
+    Args:
+        events (list): event functions
+        g0 (list): event values at t0
+        t0 (float): step start time
+        t1 (float): step end time
+        state1 (tuple): state at t1
+        interpolate (callable): state at any time inside the step
+    Returns:
+        tuple: (crossings sorted by time as (t, event, state), event values at t1)
+    """
+    g1 = [event(t1, state1) for event in events]
+    found = []
+    for event, a, b in zip(events, g0, g1):
+        if not _crossed(a, b, getattr(event, "direction", 0)):
+            continue
+        # bisection, keep the sign change inside [lo, hi]
+        lo, hi, g_lo = t0, t1, a
+        for _ in range(60):
+            if hi - lo <= 1e-12 * max(1.0, abs(t1)):
+                break
+            mid = 0.5 * (lo + hi)
+            g_mid = event(mid, interpolate(mid))
+            if _crossed(g_lo, g_mid, getattr(event, "direction", 0)):
+                hi = mid
+            else:
+                lo, g_lo = mid, g_mid
+        found.append((float(hi), event, tuple(float(v) for v in interpolate(hi))))
+    found.sort(key=lambda hit: hit[0])
+    return found, g1
+
+
+def _record_events(found, records):
+    """
+    Append crossings to records up to and including the first terminal one
+    Returns:
+        tuple or None: (t, state) of the terminal crossing
+    """
+    for t, event, state in found:
+        records.append(Event(getattr(event, "name", getattr(event, "__name__", "event")), t, state))
+        if getattr(event, "terminal", True):
+            return (t, state)
+    return None
+
+
+def simulate(model, state0, t_end, dt, events=None):
+    """
+    Solves the whole trajectory with fixed step RK4 (second_order_DE_rk4), without the visualizer
+    Args:
+        model (physics.AircraftModel): aircraft configuration
+        state0 (tuple): initial (x, y, bank, dx, dy, dbank)
+        t_end (float): simulate up to t = t_end
+        dt (float): time step
+        events (list, optional): event functions, see make_event. A stall mid-step then also ends the run with a "stall" Event instead of a ValueError.
+    Returns:
+        numpy.ndarray: structured array with fields t, x, y, bank, dx, dy, dbank (see TRAJECTORY_DTYPE), one row per step including t = 0
+        If events is given, returns (trajectory, list of Event) instead, the trajectory ends at the terminal event.
+    """
+    steps = int(round(t_end / dt))
+
+    # plain float columns are faster to fill than rows of a structured array, one spare row for the terminal event
+    columns = np.empty((7, steps + 2))
+    columns[0] = np.arange(steps + 2) * dt
+    columns[1:, 0] = state0
+
+    state = tuple(float(v) for v in state0)
+    step = second_order_DE_rk4
+    rows = steps + 1
+
+    if events is None:
+        for n in range(1, steps + 1):
+            state = step(*state, dt, model)
+            columns[1:, n] = state
+    else:
+        records = []
+        check_stall = not any(getattr(event, "stall", False) for event in events)
+        g = [event(0.0, state) for event in events]
+        for n in range(1, steps + 1):
+            t0 = (n - 1) * dt
+            try:
+                state1 = step(*state, dt, model, check_stall)
+            except ValueError:
+                records.append(Event("stall", float(t0), state))
+                rows = n
+                break
+
+            # positions and bank are cubic Hermite (their derivatives are known), velocities are linear
+            def interpolate(t, s0=np.array(state), s1=np.array(state1), t0=t0):
+                theta = (t - t0) / dt
+                h00 = 2*theta**3 - 3*theta**2 + 1
+                h10 = theta**3 - 2*theta**2 + theta
+                h01 = -2*theta**3 + 3*theta**2
+                h11 = theta**3 - theta**2
+                positions = h00*s0[:3] + h10*dt*s0[3:] + h01*s1[:3] + h11*dt*s1[3:]
+                return np.concatenate((positions, s0[3:] + theta*(s1[3:] - s0[3:])))
+
+            found, g = _find_events(events, g, t0, t0 + dt, state1, interpolate)
+            stop = _record_events(found, records)
+            if stop is not None:
+                columns[0, n] = stop[0]
+                columns[1:, n] = stop[1]
+                rows = n + 1
+                break
+            columns[1:, n] = state1
+            state = state1
+
+    out = np.empty(rows, dtype=TRAJECTORY_DTYPE)
+    for i, name in enumerate(TRAJECTORY_DTYPE.names):
+        out[name] = columns[i, :rows]
+    if events is None:
+        return out
+    return out, records
+
+
+"""
+Adaptive step Dormand-Prince RK45
+Embedded 5th/4th order pair with error control (Dormand & Prince 1980, as in Hairer, Norsett & Wanner).
+The step grows while the aircraft is near trim and shrinks during fast roll transients.
+The dense output interpolant lets callers sample the solution at any rate (60 Hz for logging/rendering) independent of the steps taken.
+"""
+
+# Butcher tableau
+DP_C = np.array([0, 1/5, 3/10, 4/5, 8/9, 1])
+DP_A = [
+    np.array([]),
+    np.array([1/5]),
+    np.array([3/40, 9/40]),
+    np.array([44/45, -56/15, 32/9]),
+    np.array([19372/6561, -25360/2187, 64448/6561, -212/729]),
+    np.array([9017/3168, -355/33, 46732/5247, 49/176, -5103/18656]),
+]
+DP_B = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84])
+# difference between the 5th and 4th order weights, the last entry multiplies the FSAL stage
+DP_E = np.array([71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40])
+# dense output polynomial coefficients (4th order continuous extension)
+DP_P = np.array([
+    [1, -8048581381/2820520608, 8663915743/2820520608, -12715105075/11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200/32700410799, -68118460800/10900136933, 87487479700/32700410799],
+    [0, -1754552775/470086768, 14199869525/1410260304, -10690763975/1880347072],
+    [0, 127303824393/49829197408, -318862633887/49829197408, 701980252875/199316789632],
+    [0, -282668133/205662961, 2019193451/616988883, -1453857185/822651844],
+    [0, 40617522/29380423, -110615467/29380423, 69997945/29380423],
+])
+
+# Default absolute tolerances for (x, y, bank, dx, dy, dbank)
+DEFAULT_ATOL = np.array([1e-3, 1e-3, 1e-4, 1e-4, 1e-4, 1e-4])
+
+# Result of simulate_adaptive
+AdaptiveResult = namedtuple("AdaptiveResult", ["trajectory", "nfev", "naccept", "nreject", "events"], defaults=[()])
+
+
+def simulate_adaptive(model, state0, t_end, sample_dt=1/60, rtol=1e-6, atol=DEFAULT_ATOL, max_step=np.inf, h0=None, events=None):
+    """
+    Solves the whole trajectory with the adaptive Dormand-Prince RK45 method, sampled with dense output
+    Args:
+        model (physics.AircraftModel): aircraft configuration
+        state0 (tuple): initial (x, y, bank, dx, dy, dbank)
+        t_end (float): simulate up to t = t_end
+        sample_dt (float, optional): output sample interval, independent of the step size. Defaults to 1/60.
+        rtol (float, optional): relative tolerance. Defaults to 1e-6.
+        atol (float or array, optional): absolute tolerance, scalar or one per variable (x, y, bank, dx, dy, dbank). Defaults to DEFAULT_ATOL.
+        max_step (float, optional): largest step allowed. Defaults to no limit.
+        h0 (float, optional): first step size. Defaults to an automatic estimate.
+        events (list, optional): event functions, see make_event. A stall mid-step then also ends the run with a "stall" Event instead of a ValueError.
+    Returns:
+        AdaptiveResult: (trajectory, nfev, naccept, nreject, events), trajectory is a structured array like simulate returns.
+        With a terminal event the trajectory ends with one extra row at the event time.
+
+    With physics.Autopilot the autopilot is updated once per accepted step, from the state at the step start, and its torque
+    is held through the stages, so rejected trial steps do not change the controller state.
+    """
+    atol = np.broadcast_to(np.asarray(atol, dtype=float), (6,))
+    nfev = 0
+    records = []
+    check_stall = not any(getattr(event, "stall", False) for event in events or ())
+    torque = None
+
+    def f(state):
+        ddx, ddy, ddbank = accelerations(state[3], state[4], state[2], state[5], model, check_stall, torque)
+        return np.array([state[3], state[4], state[5], ddx, ddy, ddbank])
+
+    t = 0.0
+    y = np.array(state0, dtype=float)
+    if physics.Autopilot:
+        torque = aileron_control(y[2], y[5])
+    k = np.empty((7, 6))
+    k[0] = f(y)
+    nfev += 1
+    if events is not None:
+        g = [event(0.0, tuple(y)) for event in events]
+
+    if h0 is None:
+        # Hairer's starting step: size the first step from the scale of y and its derivative
+        scale = atol + rtol * np.abs(y)
+        d0 = np.sqrt(np.mean((y / scale)**2))
+        d1 = np.sqrt(np.mean((k[0] / scale)**2))
+        h0 = 1e-6 if (d0 < 1e-5 or d1 < 1e-5) else 0.01 * d0 / d1
+    h = min(h0, max_step, t_end)
+
+    # output samples, one spare column for the terminal event
+    samples = int(np.floor(t_end / sample_dt + 1e-9)) + 1
+    columns = np.empty((7, samples + 1))
+    columns[0] = np.arange(samples + 1) * sample_dt
+    columns[1:, 0] = y
+    next_sample = 1
+
+    naccept = 0
+    nreject = 0
+    stop = None
+    # runs to t_end even after the last sample, so events between the last sample and t_end are found
+    while t < t_end:
+        h = min(h, t_end - t)
+
+        # stages
+        try:
+            for i in range(1, 6):
+                k[i] = f(y + h * (DP_A[i] @ k[:i]))
+            y_new = y + h * (DP_B @ k[:6])
+            k[6] = f(y_new)
+        except ValueError:
+            if events is None:
+                raise
+            stop = (float(t), tuple(float(v) for v in y))
+            records.append(Event("stall", *stop))
+            break
+        nfev += 6
+
+        # error estimate, scaled per variable
+        scale = atol + rtol * np.maximum(np.abs(y), np.abs(y_new))
+        err = np.sqrt(np.mean((h * (DP_E @ k) / scale)**2))
+
+        if err <= 1:
+            t_new = t + h
+            Q = k.T @ DP_P
+
+            def dense(t_out, y=y, t=t, h=h, Q=Q):
+                theta = (np.asarray(t_out) - t) / h
+                powers = np.cumprod(np.tile(theta, (4, 1)), axis=0)
+                return y[:, None] + h * (Q @ powers)
+
+            if events is not None:
+                found, g = _find_events(events, g, t, t_new, tuple(y_new), lambda t_out: dense([t_out])[:, 0])
+                stop = _record_events(found, records)
+                if stop is not None:
+                    t_new = stop[0]
+
+            # dense output for samples inside this step
+            last = next_sample
+            while last < samples and columns[0, last] <= t_new + 1e-12:
+                last += 1
+            if last > next_sample:
+                columns[1:, next_sample:last] = dense(columns[0, next_sample:last])
+                next_sample = last
+            if stop is not None:
+                break
+
+            t = t_new
+            y = y_new
+            naccept += 1
+            if physics.Autopilot:
+                # new aileron torque for the next step, the last stage used the old one
+                torque = aileron_control(y[2], y[5])
+                k[0] = f(y)
+                nfev += 1
+            else:
+                k[0] = k[6]  # first same as last
+            factor = 10 if err == 0 else min(10, 0.9 * err**-0.2)
+        else:
+            nreject += 1
+            factor = max(0.2, 0.9 * err**-0.2)
+        h = min(h * factor, max_step)
+
+    rows = samples
+    if stop is not None:
+        # samples up to the event, then the event itself in the next (possibly spare) column
+        columns[0, next_sample] = stop[0]
+        columns[1:, next_sample] = stop[1]
+        rows = next_sample + 1
+
+    out = np.empty(rows, dtype=TRAJECTORY_DTYPE)
+    for i, name in enumerate(TRAJECTORY_DTYPE.names):
+        out[name] = columns[i, :rows]
+    return AdaptiveResult(out, nfev, naccept, nreject, records)
+
     
 """
 DEPRECIATED CODE BELOW
@@ -185,7 +580,7 @@ DEPRECIATED CODE BELOW
 
 def second_order_DE_nonlinear_rk4(y0, yprime0, x0, xprime0, bank0, bankprime0, steps, endval):
     """
-    DEPRECIATED CODE
+    DEPRECIATED CODE, use simulate
     Euler's method to solve second order DE for lateral aircraft motion
     Args:
         y0 (float): initial condition for y
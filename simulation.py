@@ -0,0 +1,406 @@
+"""
+Simulation core shared by the visualizer (Simulator_Main.py) and headless runs.
+Holds the user inputs, the aircraft state, the failure conditions and the flight data log.
+Does not import pyglet or pynput, so it runs without a display.
+
+Headless run (no window, as fast as possible):
+    python simulation.py
+"""
+from pathlib import Path
+from datetime import datetime
+import numpy as np
+import physics
+import keyboardctrl as kb
+from secondOrderDE import second_order_DE_rk4, second_order_DE_rk4_batch
+from flightlog import FlightLogger
+
+
+# --- USER INPUTS GO HERE ---
+
+'''
+ Initializes all needed variables for the simulation and physics engine.
+
+
+ Physics parameters
+ dihedral: positive is dihedral angle, negative is anhedral angle, 0 is flat wing
+     try dihedral = -3 for a small anhedral angle typical of some military aircraft
+     try dihedral = 5 for a moderate dihedral angle typical of many general aviation aircraft
+     try dihedral = 0 for flat wing like many fighter jets
+ Mass: kg of aircraft (900 is default)
+ WingLength: length of wing from body to tip in meters (5.5 is default)
+ WingWidth: width of wing from front to back in meters (1.5 is default)
+ BodyArea: cross-sectional area of the body in m^2 (5 is default)
+ cLift_a0: lift coefficient at 0 angle of attack (0.25 is default)
+ cL_slope: lift coefficient slope per degree angle of attack (0.2 is default)
+ altitude: altitude in feet (1000 is default)
+ cruise: cruise speed in m/s (52 is default, ~100 knots)
+ I_roll: moment of inertia about roll axis (1000 is default)
+ drag_mult: multiplier for drag forces (1 is default), for debugging and parameter isolation, leave as 1 for realistic simulation
+ constant_Altitude: if True, aircraft will maintain constant altitude by adjusting vertical speed as needed (False is default)
+
+ NOTE: All default parameters correspond to a C172 Skyhawk (or PA-28), small propellor aircraft. Aircraft sprite will change based on dihedral angle
+ NOTE: Aircraft sprite does not affect parameters, just for visual effect. Sprites are NOT to scale.
+
+ INITIAL_BANK: initial bank angle in degrees (5.0 is a good perturbation amount to view stability)
+ WORLDSCALE: zoom level for visualizer (10 is default, can decrease if simulation ends by world exit too quickly)
+ TIMEOUT: seconds until automatic timeout, set to None to disable automatic timeout, used for graphing consistency
+ LOG_FORMAT: "txt" (default) or "run", file format of the flight data in ./data/
+ TIME_WARP: simulated seconds per real second in the visualizer (1 is default), change it while running with the +/- keys
+ PERF_HUD: show the performance overlay (physics, draw and log write times, FPS) at start, F3 toggles it while running.
+     If it was shown, a summary is written to ./perf/ at exit (False is default)
+ ENSEMBLE: None (default) for a single aircraft, or a dict of lists to fly several aircraft side by side in the visualizer,
+     one per list entry. Keys are "bank" (initial bank angle) and/or physics parameters, other parameters come from PHYSICS_PARAMS.
+     try ENSEMBLE = {"dihedral": [-3, 0, 7]} to compare anhedral, flat and dihedral wings
+     try ENSEMBLE = {"bank": [5, 15, 30]} for a fan of initial bank angles
+     Ensemble runs have no keyboard control or autopilot and are not logged to ./data/
+
+    Example aircraft parameters for reference:
+ PA-28 : wing length 5m, wing chord average 1.6m, mass 900 kg, body area ~8m^2, cruise speed 52m/s (100 kts), dihedral 7°, I_roll ~ 1000
+ C172 (scale 10) (default): wing length 5.5m, wing chord average 1.5m, mass 900kg, body area ~8m^2, cruise speed 52m/s (100 kts), dihedral 0°, I_roll ~ 1000
+ B747 (scale 5): wing length 32m, wing chord average 8m, mass 350 000kg, body area ~500m^2, cruise speed 260m/s (520 kts), dihedral 3°, I_roll ~ 1000000
+
+ NOTE: sprites are only visual indicators of dihedral type and do not represent actual aircraft types or scales.
+'''
+
+# vvvv USER INPUTS vvvv
+PHYSICS_PARAMS = dict(dihedral=7, # 7, 0, -3
+                      Mass=900,
+                      WingLength=5, #5 (small), 7.5 (large), 5.25 (no const alt), 5.75 (const alt 15)
+                      WingWidth=1.6, #1.6
+                      BodyArea=8,
+                      cLift_a0=0.25,
+                      cL_slope=0.2,
+                      altitude=1000,
+                      cruise=52,
+                      I_roll=1000,
+                      drag_mult=1,
+                      Constant_Altitude=True,
+                      Autopilot=False,
+                      Keyboard_Control=True
+                      )
+
+INITIAL_BANK = 30.0  # starting perturbed angle in degrees, 0 is level flight, 5 will show growth, 30 will show decay, 15 for critical
+WORLDSCALE = 10  # zoom level, 10 is default
+TIMEOUT = 150 # seconds until automatic timeout, set to None to disable automatic timeout, used for graphing consistency
+LOG_FORMAT = "txt" # "txt" for the text data file, "run" for the binary format that also stores these inputs (see runformat.py)
+TIME_WARP = 1 # 1 is real time, up to 100, e.g. 20 to watch a slow anhedral divergence or dihedral decay
+PERF_HUD = False # True to start with the performance overlay
+ENSEMBLE = None # e.g. {"dihedral": [-3, 0, 7]} or {"bank": [5, 15, 30]} to fly several aircraft at once
+
+# -- USER INPUTS END HERE --
+
+
+# --- Constants ---
+WINDOW_WIDTH = 1000
+WINDOW_HEIGHT = 700
+NUM_OF_FRAMES = 60  # render rate
+PHYSICS_RATE = 240  # physics steps per simulated second, independent of the render rate
+LOG_RATE = 60  # flight data samples per simulated second
+MAX_SUBSTEPS = 16  # most physics steps per rendered frame, the visualizer drops time beyond this instead of falling further behind
+TIME_WARPS = (1, 2, 5, 10, 20, 50, 100)  # warp factors selectable with the +/- keys
+PHYSICS_BUDGET = 0.8  # fraction of each frame the visualizer may spend on physics, under time warp the achieved warp drops instead of the frame rate
+ENSEMBLE_SPACING = 250  # horizontal distance between the starting positions of ensemble aircraft, world pixels
+
+# Background image
+# https://unsplash.com/photos/sky-cloud-blue-background-paronama-web-cloudy-summer-winter-season-day-light-beauty-horizon-spring-brigth-gradient-calm-abstract-backdrop-air-nature-view-wallpaper-landscape-cyan-color-environment-wkVWKgeyEEs
+# 3000x1097, also the world boundaries
+PIC_WIDTH = 3000
+PIC_HEIGHT = 1097
+
+
+class FlightSimulation:
+    """
+    Aircraft state, failure conditions and flight data recording, without any rendering.
+    The visualizer draws from this state, run_headless steps it as fast as possible.
+    """
+
+    def __init__(self, model=None, bank=INITIAL_BANK, worldscale=WORLDSCALE, timeout=TIMEOUT, data_path=None,
+                 physics_rate=PHYSICS_RATE, log_rate=LOG_RATE):
+        """
+        Args:
+            model (physics.AircraftModel, optional): aircraft configuration. Defaults to physics.default_model (set by globalize_physics_vars).
+            bank (float, optional): initial bank angle in degrees. Defaults to INITIAL_BANK.
+            worldscale (float, optional): zoom level, positions are scaled by it when checking the world boundaries. Defaults to WORLDSCALE.
+            timeout (float, optional): seconds until automatic timeout, None to disable. Defaults to TIMEOUT.
+            data_path (Path, optional): flight data file, a .run suffix selects the binary format. Defaults to data/data-<timestamp>.<LOG_FORMAT>.
+            physics_rate (int, optional): physics steps per simulated second. Defaults to PHYSICS_RATE.
+            log_rate (int, optional): flight data samples per simulated second, at most physics_rate. Defaults to LOG_RATE.
+        """
+        self.model = model if model is not None else physics.default_model
+        self.worldscale = worldscale
+        self.timeout = timeout
+        self.dt = 1/physics_rate
+        self.record_every = max(1, round(physics_rate / log_rate))
+        self.steps = 0
+
+        # Aircraft init state
+        # NOTE: COORDNIATES LOAD FROM BOTTOM LEFT
+        # (0,0) is bottom-left of background image
+        self.x = PIC_WIDTH/2
+        self.y = PIC_HEIGHT - WINDOW_HEIGHT/2
+        self.bank = bank
+        self.initx = self.x
+        self.inity = self.y
+
+        self.dx = 0.0
+        self.dy = 0.0
+        self.dbank = 0.0
+
+        self.runtime = 0.0
+
+        # Store flight data
+        if data_path is None:
+            timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")  # remove problematic characters
+            data_path = Path("data") / f"data-{timestamp}.{LOG_FORMAT}"
+        self.data_path_name = Path(data_path)
+        self.logger = FlightLogger(self.data_path_name, header=self.run_header())
+
+        # initialize autopilot
+        if physics.Autopilot:
+            kb.ap_on = 1
+
+    def run_header(self):
+        """
+        Configuration of this run, stored in the header of .run files
+        Returns:
+            dict: physics parameters (globalize_physics_vars arguments), initial state, integrator and time steps
+        """
+        params = {name: (value.item() if hasattr(value, "item") else value)
+                  for name, value in self.model.parameters().items()}
+        params.update(Autopilot=physics.Autopilot, Keyboard_Control=physics.Keyboard_Control)
+        return {
+            "physics": params,
+            "initial_state": {"x": self.x, "y": self.y, "bank": self.bank,
+                              "dx": self.dx, "dy": self.dy, "dbank": self.dbank},
+            "integrator": "rk4",
+            "dt": self.dt,
+            "log_dt": self.dt * self.record_every,
+            "worldscale": self.worldscale,
+            "timeout": self.timeout,
+            "created": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def world_position(self, x=None, y=None):
+        """
+        Aircraft position in world (background image) coordinates, positions relative to the start are scaled by worldscale
+        Args:
+            x (float, optional): horizontal position to convert. Defaults to the current position.
+            y (float, optional): vertical position to convert. Defaults to the current position.
+        Returns:
+            tuple: (x, y)
+        """
+        x = self.x if x is None else x
+        y = self.y if y is None else y
+        return (self.initx + (x - self.initx) * self.worldscale,
+                self.inity + (y - self.inity) * self.worldscale)
+
+    def failure(self):
+        """
+        Check failure conditions
+        Returns:
+            str or None: message describing why the simulation ends, None if it continues
+        """
+        world_x, world_y = self.world_position()
+
+        if (world_y < 0) or (world_y > PIC_HEIGHT) or (world_x < 0) or (world_x > PIC_WIDTH):
+            return "Aircraft has left the world boundaries. Simulation ending."
+
+        elif (self.bank < -90) or (self.bank > 90):
+            return "Aircraft has exceeded safe bank angle. Simulation ending."
+
+        elif (self.timeout is not None) and (self.runtime >= self.timeout):
+            return "Simulation has reached timeout limit. Simulation ending."
+
+        return None
+
+    def step(self):
+        """
+        Advance the aircraft by one fixed RK4 step of 1/physics_rate and record it every record_every steps
+        Returns:
+            str or None: failure message if the simulation should end, see failure
+        """
+        try:
+            state = second_order_DE_rk4(self.x, self.y, self.bank, self.dx, self.dy, self.dbank, self.dt, self.model)
+        except ValueError:
+            return "Aircraft has stalled. Simulation ending."
+
+        self.x, self.y, self.bank, self.dx, self.dy, self.dbank = state
+        self.steps += 1
+        # count steps rather than summing dt so the logged time does not drift
+        self.runtime = self.steps * self.dt
+
+        message = self.failure()
+        # always keep the final state of the run
+        if message is not None or self.steps % self.record_every == 0:
+            self.record()
+        return message
+
+    def record(self):
+        """
+        Save position vs time data to txt file (buffered, written in the background by FlightLogger)
+        """
+        self.logger.log(self.x, self.y, self.bank, self.runtime)
+
+    def close(self):
+        """
+        Write out any buffered flight data, call when the simulation ends
+        """
+        self.logger.close()
+
+
+class EnsembleSimulation:
+    """
+    Several aircraft flown side by side, all advanced together by one vectorized RK4 step (second_order_DE_rk4_batch).
+    Each aircraft has its own initial bank and/or physics parameters. The state attributes (x, y, bank, ...) are arrays
+    with one entry per aircraft. An aircraft that fails (stall, bank limit or world exit) is frozen where it failed,
+    the run ends when every aircraft has failed or at the timeout. Nothing is logged.
+    """
+
+    def __init__(self, variations, model=None, bank=INITIAL_BANK, worldscale=WORLDSCALE, timeout=TIMEOUT,
+                 physics_rate=PHYSICS_RATE, spacing=ENSEMBLE_SPACING):
+        """
+        Args:
+            variations (dict): lists of values, one per aircraft, for "bank" and/or AircraftModel parameters (see ENSEMBLE)
+            model (physics.AircraftModel, optional): configuration for the parameters not varied. Defaults to physics.default_model.
+            bank (float, optional): initial bank angle in degrees if "bank" is not varied. Defaults to INITIAL_BANK.
+            worldscale (float, optional): zoom level, positions are scaled by it when checking the world boundaries. Defaults to WORLDSCALE.
+            timeout (float, optional): seconds until automatic timeout, None to disable. Defaults to TIMEOUT.
+            physics_rate (int, optional): physics steps per simulated second. Defaults to PHYSICS_RATE.
+            spacing (float, optional): horizontal distance between starting positions, world pixels. Defaults to ENSEMBLE_SPACING.
+        """
+        model = model if model is not None else physics.default_model
+        variations = dict(variations)
+        banks = variations.pop("bank", bank)
+        unknown = set(variations) - set(model.parameters())
+        if unknown:
+            raise ValueError(f"Unknown ensemble parameters: {sorted(unknown)}")
+
+        # every list has one value per aircraft (or a single value shared by all)
+        names = list(variations)
+        values = np.broadcast_arrays(np.asarray(banks, dtype=float),
+                                     *(np.asarray(variations[name], dtype=float) for name in names))
+        values = [np.atleast_1d(v).copy() for v in values]
+        self.size = len(values[0])
+        self.model = model.replace(**dict(zip(names, values[1:])))
+        self.dihedral = np.broadcast_to(self.model.dihedral, self.size)
+
+        # what sets each aircraft apart, for the visualizer
+        self.labels = []
+        for i in range(self.size):
+            parts = [f"bank {values[0][i]:g}"] if np.ndim(banks) > 0 else []
+            parts += [f"{name} {values[k + 1][i]:g}" for k, name in enumerate(names)]
+            self.labels.append(", ".join(parts) or f"#{i + 1}")
+
+        self.worldscale = worldscale
+        self.timeout = timeout
+        self.dt = 1/physics_rate
+        self.steps = 0
+        self.runtime = 0.0
+
+        # Aircraft init states, in a row centred where FlightSimulation starts
+        self.x = PIC_WIDTH/2 + (np.arange(self.size) - (self.size - 1)/2) * spacing / worldscale
+        self.y = np.full(self.size, PIC_HEIGHT - WINDOW_HEIGHT/2)
+        self.bank = values[0]
+        self.initx = PIC_WIDTH/2
+        self.inity = self.y[0]
+
+        self.dx = np.zeros(self.size)
+        self.dy = np.zeros(self.size)
+        self.dbank = np.zeros(self.size)
+
+        self.alive = np.ones(self.size, dtype=bool)
+        self.messages = [None] * self.size  # why each aircraft failed
+
+    def world_position(self, x=None, y=None):
+        """
+        Aircraft positions in world (background image) coordinates, see FlightSimulation.world_position
+        Args:
+            x (numpy.ndarray, optional): horizontal positions to convert. Defaults to the current positions.
+            y (numpy.ndarray, optional): vertical positions to convert. Defaults to the current positions.
+        Returns:
+            tuple: (x, y) arrays
+        """
+        x = self.x if x is None else x
+        y = self.y if y is None else y
+        return (self.initx + (x - self.initx) * self.worldscale,
+                self.inity + (y - self.inity) * self.worldscale)
+
+    def failure(self, stalled):
+        """
+        Per aircraft failure conditions
+        Args:
+            stalled (numpy.ndarray): aircraft whose last step stalled
+        Returns:
+            list: message for each aircraft failing now, None for the others
+        """
+        world_x, world_y = self.world_position()
+        conditions = [
+            (stalled, "Aircraft has stalled."),
+            ((world_y < 0) | (world_y > PIC_HEIGHT) | (world_x < 0) | (world_x > PIC_WIDTH), "Aircraft has left the world boundaries."),
+            ((self.bank < -90) | (self.bank > 90), "Aircraft has exceeded safe bank angle."),
+        ]
+        messages = [None] * self.size
+        for mask, message in conditions:
+            for i in np.flatnonzero(mask & self.alive):
+                messages[i] = messages[i] or message
+        return messages
+
+    def step(self):
+        """
+        Advance every flying aircraft by one fixed RK4 step of 1/physics_rate, failed aircraft keep their last state
+        Returns:
+            str or None: message if the whole run should end, None if it continues
+        """
+        current = np.array((self.x, self.y, self.bank, self.dx, self.dy, self.dbank))
+        state = np.array(second_order_DE_rk4_batch(*current, self.dt, self.model))
+        stalled = np.isnan(state).any(axis=0)
+        frozen = stalled | ~self.alive
+        state[:, frozen] = current[:, frozen]
+        self.x, self.y, self.bank, self.dx, self.dy, self.dbank = state
+
+        self.steps += 1
+        self.runtime = self.steps * self.dt
+
+        for i, message in enumerate(self.failure(stalled)):
+            if message is not None:
+                self.alive[i] = False
+                self.messages[i] = message
+                print(f"{self.labels[i]}: {message} ({self.runtime:.1f} s)")
+
+        if not self.alive.any():
+            return "All aircraft have failed. Simulation ending."
+        if (self.timeout is not None) and (self.runtime >= self.timeout):
+            return "Simulation has reached timeout limit. Simulation ending."
+        return None
+
+    def close(self):
+        """
+        Nothing is buffered, for interface compatibility with FlightSimulation
+        """
+
+
+def run_headless(sim):
+    """
+    Step the simulation until a failure condition (or the timeout) without a window, as fast as possible
+    Args:
+        sim (FlightSimulation): simulation to run, should have a timeout or it only ends on failure
+    Returns:
+        str: failure message that ended the run
+    """
+    message = None
+    while message is None:
+        message = sim.step()
+    sim.close()
+    print(message)
+    return message
+
+
+if __name__ == "__main__":
+    """
+    Headless entry point, same inputs, autopilot and failure logic as Simulator_Main.py but no window.
+    """
+    physics.globalize_physics_vars(**PHYSICS_PARAMS)
+    sim = FlightSimulation()
+    print("\nRunning headless  .  .  . \n")
+    run_headless(sim)
+    print("Flight data saved to", sim.data_path_name)
@@ -0,0 +1,208 @@
+"""
+Stability metrics of recorded runs, computed from the bank angle series of each run (vectorized)
+and across runs in parallel processes, collected in one table.
+
+For an oscillating run the turning points of the bank angle are found, and each half cycle's amplitude
+(half the swing between successive turning points) is fitted as A(t) = A0 exp(sigma t):
+    period          2 x mean time between turning points
+    growth rate     sigma (1/s), negative decays, positive diverges
+    log decrement   -sigma x period (the usual ln(A_n / A_n+1) between successive peaks)
+    damping ratio   log decrement / sqrt(4 pi^2 + log decrement^2), negative when diverging
+    time to half    ln 2 / -sigma (decaying runs), time to double ln 2 / sigma (diverging runs)
+A run without enough turning points (e.g. a monotonic anhedral roll-off) gets sigma from |bank| itself.
+The class also uses how the run ended (catalog.outcome): runs that exceeded the bank limit are divergent whatever
+their fitted rate, and runs that stopped before the timeout (a stall, or the window closed) are "stopped" rather
+than stable or critical, since their series ends before the rate can be judged. Leaving the world only means the
+position drifted past the picture edge, so those runs keep the class of their bank series.
+
+    python stability.py "data/*.txt" --sort growth_rate
+    python stability.py data/reference -o stability.csv
+"""
+import argparse
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import runformat
+from catalog import config_from_name, outcome as run_outcome
+from grapher import cached_run, expand_runs
+
+NEUTRAL_RATE = 0.005  # |growth rate| (1/s) below which a run is critical: amplitude changes by under half in ~140 s
+MIN_AMPLITUDE = 1e-3  # degrees, smaller swings are numerical noise
+MIN_RATE = 1e-9  # 1/s, smaller growth rates are round-off (e.g. a flat wing holding its bank), no time to half/double
+
+COLUMNS = ("run", "class", "outcome", "samples", "duration", "turning_points", "period", "growth_rate", "log_decrement",
+           "damping_ratio", "time_to_half", "time_to_double", "max_abs_bank", "final_bank", "bank_offset",
+           "x_drift", "y_drift")
+
+
+def turning_points(bank):
+    """
+    Indices of the local extrema of a series, plateaus count once (at their end)
+    Args:
+        bank (numpy.ndarray): bank angle series
+    Returns:
+        numpy.ndarray: sample indices
+    """
+    slope = np.sign(np.diff(bank))
+    moving = np.flatnonzero(slope)
+    slope = slope[moving]
+    turns = np.flatnonzero(slope[1:] != slope[:-1])
+    return moving[turns + 1]
+
+
+def fit_rate(t, values):
+    """
+    Exponential rate of positive values, least squares fit of ln(values) against t
+    Args:
+        t (numpy.ndarray): times
+        values (numpy.ndarray): positive amplitudes
+    Returns:
+        float: sigma (1/s), NaN with fewer than 2 points
+    """
+    if len(values) < 2 or np.ptp(t) == 0:
+        return math.nan
+    return float(np.polyfit(t, np.log(values), 1)[0])
+
+
+def run_metrics(t, x, y, bank, outcome=None):
+    """
+    Stability metrics of one run
+    Args:
+        t (numpy.ndarray): times
+        x (numpy.ndarray): horizontal positions
+        y (numpy.ndarray): vertical positions
+        bank (numpy.ndarray): bank angles
+        outcome (str, optional): how the run ended, see catalog.outcome. Defaults to unknown (class from the bank series only).
+    Returns:
+        dict: COLUMNS except run
+    """
+    t, x, y, bank = (np.asarray(v, dtype=float) for v in (t, x, y, bank))
+    metrics = dict.fromkeys(COLUMNS, math.nan)
+    metrics.update(samples=len(t), turning_points=0)
+    if outcome is not None:
+        metrics["outcome"] = outcome
+    if len(t) < 2:
+        metrics["class"] = "too short"
+        return metrics
+
+    turns = turning_points(bank)
+    amplitude = np.abs(np.diff(bank[turns])) / 2
+    swing_t = (t[turns][1:] + t[turns][:-1]) / 2
+    keep = amplitude > MIN_AMPLITUDE
+    amplitude, swing_t = amplitude[keep], swing_t[keep]
+
+    if len(amplitude) >= 2:
+        period = 2 * float(np.mean(np.diff(t[turns])))
+        rate = fit_rate(swing_t, amplitude)
+        decrement = -rate * period
+        metrics.update(period=period, log_decrement=decrement,
+                       damping_ratio=decrement / math.sqrt(4 * math.pi**2 + decrement**2))
+        # offset the oscillation settles around, from the last full cycle
+        metrics["bank_offset"] = float(np.mean(bank[turns[-2]:])) if len(turns) >= 2 else math.nan
+    else:
+        moving = np.abs(bank) > MIN_AMPLITUDE
+        rate = fit_rate(t[moving], np.abs(bank[moving]))
+        metrics["bank_offset"] = float(bank[-1])
+
+    if rate < -MIN_RATE:
+        metrics["time_to_half"] = math.log(2) / -rate
+    elif rate > MIN_RATE:
+        metrics["time_to_double"] = math.log(2) / rate
+
+    max_abs_bank = float(np.max(np.abs(bank)))
+    if max_abs_bank > 90 or rate > NEUTRAL_RATE or outcome == "bank exceeded":
+        category = "divergent"
+    elif outcome == "stopped":
+        category = "stopped"
+    elif rate < -NEUTRAL_RATE:
+        category = "stable"
+    else:
+        category = "critical"
+
+    metrics.update({"class": category, "duration": float(t[-1] - t[0]), "turning_points": len(turns),
+                    "growth_rate": rate, "max_abs_bank": max_abs_bank, "final_bank": float(bank[-1]),
+                    "x_drift": float(x[-1] - x[0]), "y_drift": float(y[-1] - y[0])})
+    return metrics
+
+
+def file_metrics(filename):
+    """
+    Stability metrics of one run file, for the process pool
+    Args:
+        filename (string): data file path
+    Returns:
+        dict: COLUMNS, None if the file is not flight data (e.g. a batch summary table)
+    """
+    try:
+        data = cached_run(filename)
+    except ValueError:
+        return None
+    path = Path(filename)
+    # the run's configuration for its timeout and world bounds, from the .run header or the reference file name
+    header = runformat.read_header(path)[0] if path.suffix == runformat.RUN_SUFFIX else config_from_name(path.stem)
+    ending = run_outcome(data, header) if len(data) else None
+    metrics = run_metrics(data["t"], data["x"], data["y"], data["bank"], ending)
+    metrics["run"] = str(filename)
+    return metrics
+
+
+def analyze(filenames, workers=None, sort=None):
+    """
+    Stability metrics of many runs, one process per CPU
+    Args:
+        filenames (list): data file paths
+        workers (int, optional): number of processes. Defaults to the number of CPUs.
+        sort (str, optional): column to sort by, NaN last. Defaults to the order of filenames.
+    Returns:
+        list: one dict of COLUMNS per run
+    """
+    workers = min(workers or os.cpu_count() or 1, max(len(filenames), 1))
+    if workers <= 1:
+        rows = [file_metrics(f) for f in filenames]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(file_metrics, filenames, chunksize=max(1, len(filenames) // (4 * workers))))
+    rows = [row for row in rows if row is not None]
+    if sort is not None:
+        rows.sort(key=lambda row: (isinstance(row[sort], float) and math.isnan(row[sort]), row[sort]))
+    return rows
+
+
+def format_table(rows, sep="  "):
+    """
+    Metrics as a text table, aligned or (with sep=",") CSV
+    Args:
+        rows (list): dicts from analyze
+        sep (str, optional): column separator. Defaults to aligned columns.
+    Returns:
+        str: table
+    """
+    def cell(value):
+        if isinstance(value, float):
+            return "" if math.isnan(value) else f"{value:.4g}"
+        return str(value)
+
+    cells = [[cell(row[c]) for c in COLUMNS] for row in rows]
+    if sep != "  ":
+        return "\n".join(sep.join(r) for r in [list(COLUMNS)] + cells)
+    widths = [max([len(c)] + [len(r[i]) for r in cells]) for i, c in enumerate(COLUMNS)]
+    lines = [sep.join(v.ljust(w) for v, w in zip(r, widths)).rstrip() for r in [list(COLUMNS)] + cells]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stability metrics of recorded runs")
+    parser.add_argument("runs", nargs="+", help="data files, glob patterns or directories")
+    parser.add_argument("--sort", choices=COLUMNS, default=None, help="column to sort by")
+    parser.add_argument("-o", "--output", default=None, help="also write the table as CSV")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of processes (default: number of CPUs)")
+    args = parser.parse_args()
+
+    patterns = [str(Path(p) / "*") if Path(p).is_dir() else p for p in args.runs]
+    rows = analyze(expand_runs(patterns), args.workers, args.sort)
+    print(format_table(rows))
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(format_table(rows, sep=",") + "\n")
@@ -0,0 +1,153 @@
+"""
+Stability map: lateral stability of the linearized simulator over a grid of dihedral, WingLength, Mass, cruise
+and Constant_Altitude, instead of searching for critical configurations run by run ("crit dih 15 const", ...).
+
+Every grid point is linearized about level trim (linearize.linearize, one batched derivatives_batch call per chunk
+of configurations), and the eigenvalues of the lateral block (vss, bank, w) come from numpy.linalg.eigvals on the
+stacked 3x3 matrices. At level trim the vertical speed is decoupled from the lateral motion, so its mode is left out.
+The growth rate is the largest real part: negative is stable, positive diverges, and the zero contour is the
+neutral-stability boundary. Points within stability.NEUTRAL_RATE of zero are counted as critical, as in stability.py.
+Configurations that stall at trim come out as NaN.
+
+    python stabilitymap.py                                         dihedral x WingLength x Mass grid, 100 x 100 x 20
+    python stabilitymap.py --cruise 40 52 --constant-altitude both -o map.png --save map.npz
+"""
+import argparse
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.colors import SymLogNorm
+from linearize import linearize, model_from_params
+from simulation import PHYSICS_PARAMS
+from stability import NEUTRAL_RATE
+
+GRID_AXES = ("dihedral", "WingLength", "Mass", "cruise", "Constant_Altitude")
+LATERAL = [0, 2, 3]  # vss, bank, w in the linearize state
+CHUNK = 100_000  # configurations per batched linearization, bounds the memory of the perturbed states
+
+
+def lateral_eigenvalues(A):
+    """
+    Eigenvalues of the lateral block of linearized state matrices
+    Args:
+        A (numpy.ndarray): state matrices from linearize, shape (..., 4, 4)
+    Returns:
+        numpy.ndarray: complex eigenvalues, shape (..., 3), NaN where A is not finite
+    """
+    block = A[..., LATERAL, :][..., LATERAL]
+    finite = np.all(np.isfinite(block), axis=(-2, -1))
+    eigenvalues = np.linalg.eigvals(np.where(finite[..., None, None], block, 0.0))
+    return np.where(finite[..., None], eigenvalues, np.nan)
+
+
+def stability_map(dihedral, WingLength, Mass, cruise=(PHYSICS_PARAMS["cruise"],),
+                  Constant_Altitude=(PHYSICS_PARAMS["Constant_Altitude"],), base=PHYSICS_PARAMS):
+    """
+    Growth rate and frequency of the least stable lateral mode over a parameter grid
+    Args:
+        dihedral, WingLength, Mass, cruise, Constant_Altitude (list or numpy.ndarray): grid values of each axis
+        base (dict, optional): the other physics parameters. Defaults to PHYSICS_PARAMS.
+    Returns:
+        dict: the axis values, "growth_rate" (1/s) and "frequency" (Hz, 0 for a non-oscillating mode),
+              each of shape (len(dihedral), len(WingLength), len(Mass), len(cruise), len(Constant_Altitude))
+    """
+    axes = {name: np.asarray(values, dtype=bool if name == "Constant_Altitude" else float)
+            for name, values in zip(GRID_AXES, (dihedral, WingLength, Mass, cruise, Constant_Altitude))}
+    grid = [g.ravel() for g in np.meshgrid(*axes.values(), indexing="ij")]
+    shape = tuple(len(v) for v in axes.values())
+
+    growth_rate = np.empty(grid[0].size)
+    frequency = np.empty(grid[0].size)
+    for start in range(0, grid[0].size, CHUNK):
+        chunk = slice(start, start + CHUNK)
+        model = model_from_params(dict(base, **{name: g[chunk] for name, g in zip(GRID_AXES, grid)}))
+        with np.errstate(invalid="ignore"):
+            eigenvalues = lateral_eigenvalues(linearize(model)[0])
+        least_stable = np.argmax(np.nan_to_num(eigenvalues.real, nan=-np.inf), axis=-1)
+        dominant = np.take_along_axis(eigenvalues, least_stable[:, None], axis=-1)[:, 0]
+        growth_rate[chunk] = dominant.real
+        frequency[chunk] = np.abs(dominant.imag) / (2*np.pi)
+
+    return dict(axes, growth_rate=growth_rate.reshape(shape), frequency=frequency.reshape(shape))
+
+
+def classify(growth_rate):
+    """
+    Counts of stable, critical and divergent grid points (see stability.NEUTRAL_RATE)
+    Args:
+        growth_rate (numpy.ndarray): from stability_map
+    Returns:
+        dict: number of points per class, "stalled" for NaN
+    """
+    return {
+        "stable": int(np.sum(growth_rate < -NEUTRAL_RATE)),
+        "critical": int(np.sum(np.abs(growth_rate) <= NEUTRAL_RATE)),
+        "divergent": int(np.sum(growth_rate > NEUTRAL_RATE)),
+        "stalled": int(np.sum(np.isnan(growth_rate))),
+    }
+
+
+def plot_map(result, mass=None):
+    """
+    Heat map of the growth rate (symmetric log scale) over dihedral x WingLength at one mass, one panel per cruise and Constant_Altitude value,
+    with the neutral-stability contour at that mass (solid) and at the lightest and heaviest masses (dashed, dotted),
+    leaving out the exactly neutral flat wing (dihedral 0)
+    Args:
+        result (dict): from stability_map
+        mass (float, optional): mass of the heat map, the nearest grid value is used. Defaults to PHYSICS_PARAMS["Mass"].
+    """
+    masses = result["Mass"]
+    k = int(np.argmin(np.abs(masses - (PHYSICS_PARAMS["Mass"] if mass is None else mass))))
+    panels = [(i, j) for i in range(len(result["cruise"])) for j in range(len(result["Constant_Altitude"]))]
+
+    fig, axes = plt.subplots(1, len(panels), figsize=(7 * len(panels), 6), squeeze=False)
+    growth = result["growth_rate"]
+    limit = np.nanmax(np.abs(growth[:, :, k])) or 1.0
+    # logarithmic away from zero, linear inside the critical band, so slow growth and decay stay visible
+    norm = SymLogNorm(linthresh=NEUTRAL_RATE, vmin=-limit, vmax=limit)
+    for ax, (i, j) in zip(axes[0], panels):
+        image = ax.pcolormesh(result["dihedral"], result["WingLength"], growth[:, :, k, i, j].T, cmap="RdBu_r", norm=norm, shading="auto")
+        for m, style in ((k, "solid"), (0, "dashed"), (len(masses) - 1, "dotted")):
+            if m != k or style == "solid":
+                # a flat wing has exactly zero growth at every wing length, masked so it is not drawn as a boundary
+                neutral = np.ma.masked_equal(growth[:, :, m, i, j].T, 0.0)
+                contour = ax.contour(result["dihedral"], result["WingLength"], neutral, levels=[0.0],
+                                     colors="black", linestyles=style, linewidths=2 if m == k else 1)
+                ax.clabel(contour, fmt={0.0: f"{masses[m]:.0f} kg"}, fontsize="small")
+        ax.set_title(f"cruise {result['cruise'][i]:g} m/s, constant altitude {'on' if result['Constant_Altitude'][j] else 'off'}")
+        ax.set_xlabel("dihedral (°)")
+        ax.set_ylabel("wing length (m)")
+        fig.colorbar(image, ax=ax, label="growth rate (1/s)")
+    fig.suptitle(f"Lateral stability, Mass {masses[k]:.0f} kg (neutral contours: {masses[0]:.0f}, {masses[k]:.0f}, {masses[-1]:.0f} kg)")
+    fig.tight_layout()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lateral stability map of the linearized simulator")
+    parser.add_argument("--dihedral", nargs=3, type=float, default=(-10, 20, 100), metavar=("MIN", "MAX", "N"), help="dihedral range in degrees (default -10 20 100)")
+    parser.add_argument("--wing-length", nargs=3, type=float, default=(3, 12, 100), metavar=("MIN", "MAX", "N"), help="wing length range in m (default 3 12 100)")
+    parser.add_argument("--mass", nargs=3, type=float, default=(600, 1500, 20), metavar=("MIN", "MAX", "N"), help="mass range in kg (default 600 1500 20)")
+    parser.add_argument("--cruise", nargs="+", type=float, default=[PHYSICS_PARAMS["cruise"]], help="cruise speeds in m/s (default from PHYSICS_PARAMS)")
+    parser.add_argument("--constant-altitude", choices=("on", "off", "both"), default="on" if PHYSICS_PARAMS["Constant_Altitude"] else "off",
+                        help="Constant_Altitude values (default from PHYSICS_PARAMS)")
+    parser.add_argument("--plot-mass", type=float, default=None, help="mass of the heat map (default from PHYSICS_PARAMS)")
+    parser.add_argument("-o", "--output", default=None, help="save the figure instead of showing it")
+    parser.add_argument("--save", default=None, help="also save the grid and growth rates as .npz")
+    args = parser.parse_args()
+
+    ranges = [np.linspace(lo, hi, int(n)) for lo, hi, n in (args.dihedral, args.wing_length, args.mass)]
+    constant_altitude = {"on": [True], "off": [False], "both": [False, True]}[args.constant_altitude]
+
+    start = time.perf_counter()
+    result = stability_map(*ranges, cruise=args.cruise, Constant_Altitude=constant_altitude)
+    elapsed = time.perf_counter() - start
+    counts = classify(result["growth_rate"])
+    print(f"{result['growth_rate'].size} configurations in {elapsed:.2f} s: " + ", ".join(f"{v} {k}" for k, v in counts.items()))
+
+    if args.save:
+        np.savez(args.save, **result)
+    plot_map(result, args.plot_mass)
+    if args.output:
+        plt.savefig(args.output)
+    else:
+        plt.show()
@@ -0,0 +1,166 @@
+"""
+Linear state-space form of the lateral model solved in analytical_solutionV5, evaluated numerically.
+
+The x and bank equations of analytical_solutionV5 are linear in the state s = (vss, bank, w)
+(sideslip velocity x', bank angle, roll rate), so ds/dt = A s with
+    A = [[-4 C_2 b0 dihedral / Mass,  2 C_1 / Mass,  0                                   ],
+         [ 0,                         0,             1                                   ],
+         [ 0.5 WingLength C_2 dihedral / I_roll,  0, -0.5 rhoA WingArea WingLength^2 / I_roll]]
+and s(t) = V exp(Lambda t) V^-1 s(0) from the eigendecomposition A = V Lambda V^-1. The horizontal position is
+integrated alongside as a fourth state. Matrices without a full set of eigenvectors (e.g. a flat wing, where
+the zero eigenvalues repeat) are solved with the matrix exponential instead.
+
+Every function is batched: parameters broadcast against each other and stack into (..., n, n) matrices,
+so thousands of configurations are solved in one numpy.linalg call.
+
+    python statespace.py    plots bank vs time for dihedral and anhedral, times a batched solve
+"""
+import time
+import numpy as np
+import archive.physics_backup as physics
+
+STATES = ("x", "vss", "bank", "w")
+MAX_CONDITION = 1e8  # eigenvector matrices worse conditioned than this are solved with expm
+TAYLOR_ORDER = 16  # terms of the scaled Taylor series in expm
+
+
+def lateral_coefficients(dihedral=5, Mass=physics.Mass, WingLength=physics.WingLength, cruise=physics.cruise):
+    """
+    Lift coefficients C_1 and C_2 of the analytical model, see analytical_solutionV5.equations
+    Args:
+        dihedral, Mass, WingLength, cruise (float or numpy.ndarray, optional): aircraft parameters
+    Returns:
+        tuple: (C_1, C_2), broadcast arrays
+    """
+    dihedral, Mass, WingLength, cruise = (np.asarray(p, dtype=float) for p in (dihedral, Mass, WingLength, cruise))
+    WingArea = WingLength * physics.WingWidth * 2
+    a_default = (Mass*physics.g / (2* 0.5 * physics.rhoA * cruise**2 * (WingArea/2) * np.cos(np.radians(dihedral))) - physics.cLift_a0) / physics.cL_slope
+
+    c_1 = physics.cLift_a0 + physics.cL_slope * (a_default - 1)
+    c_2 = physics.cL_slope / cruise
+    multiplier = 0.25 * physics.rhoA * cruise**2 * WingLength
+    return c_1 * multiplier, c_2 * multiplier
+
+
+def lateral_matrix(dihedral=5, Mass=physics.Mass, WingLength=physics.WingLength, cruise=physics.cruise, I_roll=physics.I_roll, b0=0.2):
+    """
+    State matrix of the analytical model for the state (x, vss, bank, w)
+    Args:
+        dihedral, Mass, WingLength, cruise, I_roll (float or numpy.ndarray, optional): aircraft parameters
+        b0 (float or numpy.ndarray, optional): bank angle the x equation is linearized about. Defaults to 0.2.
+    Returns:
+        numpy.ndarray: A, shape of the broadcast parameters + (4, 4)
+    """
+    params = np.broadcast_arrays(*(np.asarray(p, dtype=float) for p in (dihedral, Mass, WingLength, cruise, I_roll, b0)))
+    dihedral, Mass, WingLength, cruise, I_roll, b0 = params
+    C_1, C_2 = lateral_coefficients(dihedral, Mass, WingLength, cruise)
+    WingArea = WingLength * physics.WingWidth * 2
+
+    A = np.zeros(dihedral.shape + (4, 4))
+    A[..., 0, 1] = 1
+    A[..., 1, 1] = -4*C_2*b0*dihedral / Mass
+    A[..., 1, 2] = 2*C_1 / Mass
+    A[..., 2, 3] = 1
+    A[..., 3, 1] = WingLength*0.5*C_2*dihedral / I_roll
+    A[..., 3, 3] = -0.5*physics.rhoA*WingArea*WingLength**2 / I_roll
+    return A
+
+
+def expm(A):
+    """
+    Matrix exponential of stacked matrices (scaling and squaring of a Taylor series)
+    Args:
+        A (numpy.ndarray): matrices, shape (..., n, n)
+    Returns:
+        numpy.ndarray: exp(A), same shape
+    """
+    A = np.asarray(A)
+    norm = np.max(np.sum(np.abs(A), axis=-2), axis=-1)  # 1-norm of each matrix
+    squarings = np.maximum(0, np.ceil(np.log2(np.maximum(norm, 1e-300)))).astype(int) + 1
+    scaled = A / (2.0**squarings)[..., None, None]
+
+    result = np.broadcast_to(np.eye(A.shape[-1], dtype=A.dtype), A.shape).copy()
+    term = result.copy()
+    for k in range(1, TAYLOR_ORDER + 1):
+        term = term @ scaled / k
+        result = result + term
+
+    # each matrix squares back its own number of times
+    for k in range(int(squarings.max(initial=0))):
+        result = np.where((k < squarings)[..., None, None], result @ result, result)
+    return result
+
+
+def solve(A, state0, t):
+    """
+    Solution of ds/dt = A s for stacked systems and an array of times
+    Args:
+        A (numpy.ndarray): state matrices, shape (..., n, n)
+        state0 (numpy.ndarray): initial states, shape (..., n), broadcast against A
+        t (numpy.ndarray): times
+    Returns:
+        numpy.ndarray: states, shape (..., len(t), n)
+    """
+    A = np.asarray(A, dtype=float)
+    state0 = np.asarray(state0, dtype=float)
+    t = np.atleast_1d(np.asarray(t, dtype=float))
+    shape = np.broadcast_shapes(A.shape[:-2], state0.shape[:-1])
+    A = np.broadcast_to(A, shape + A.shape[-2:])
+    state0 = np.broadcast_to(state0, shape + state0.shape[-1:])
+
+    eigenvalues, vectors = np.linalg.eig(A)
+    # 1-norm condition number of V, repeated eigenvalues give (nearly) parallel eigenvectors
+    vectors_1norm = np.max(np.sum(np.abs(vectors), axis=-2), axis=-1)
+    singular = np.abs(np.linalg.det(vectors)) < 1e-300
+    safe_vectors = np.where(singular[..., None, None], np.eye(A.shape[-1]), vectors)
+    inverse = np.linalg.inv(safe_vectors)
+    condition = vectors_1norm * np.max(np.sum(np.abs(inverse), axis=-2), axis=-1)
+    modal = ~singular & np.isfinite(condition) & (condition < MAX_CONDITION)
+
+    # modal amplitudes c = V^-1 s(0), then s(t) = V (exp(lambda t) * c)
+    amplitudes = np.einsum("...ij,...j->...i", inverse, state0)
+    growth = np.exp(eigenvalues[..., None, :] * t[:, None]) * amplitudes[..., None, :]
+    states = np.real(np.einsum("...ij,...tj->...ti", safe_vectors, growth))
+
+    if not modal.all():
+        defective = ~modal
+        transitions = expm(A[defective][:, None] * t[:, None, None])
+        states[defective] = np.einsum("ktij,kj->kti", transitions, state0[defective])
+    return states
+
+
+def lateral_response(t, dihedral=5, Mass=physics.Mass, WingLength=physics.WingLength, cruise=physics.cruise, I_roll=physics.I_roll,
+                     b0=0.2, bank0=0.2, dbank0=0.0, vss0=0.0, x0=0.0):
+    """
+    Response of the analytical model to initial conditions, batched over parameters
+    Args:
+        t (numpy.ndarray): times
+        dihedral, Mass, WingLength, cruise, I_roll (float or numpy.ndarray, optional): aircraft parameters
+        b0 (float or numpy.ndarray, optional): bank angle the x equation is linearized about. Defaults to 0.2.
+        bank0, dbank0, vss0, x0 (float or numpy.ndarray, optional): initial bank angle, roll rate, sideslip velocity and position.
+    Returns:
+        tuple: (x, vss, bank, w) arrays of shape params + t
+    """
+    A = lateral_matrix(dihedral, Mass, WingLength, cruise, I_roll, b0)
+    state0 = np.stack(np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (x0, vss0, bank0, dbank0))), axis=-1)
+    states = solve(A, state0, t)
+    return tuple(np.moveaxis(states, -1, 0))
+
+
+if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+    import grapher
+
+    plt.rcParams.update({'font.size': 14}) # make plot font size bigger
+
+    t_list = np.linspace(0, 13, 1000)
+    for dihedral, title in ((5, "Dihedral"), (-5, "Anhedral")):
+        print(f"eigenvalues {title.upper()}:", np.linalg.eigvals(lateral_matrix(dihedral)))
+        bank_list = lateral_response(t_list, dihedral=dihedral)[2]
+        grapher.plot_solution_more_params(bank_list, t_list, title=f"{title} State-Space Solution - Bank vs time", ylabel="bank angle (rad)")
+
+    grid = np.meshgrid(np.linspace(-20, 20, 100), np.linspace(2, 8, 100), indexing="ij")
+    start = time.perf_counter()
+    lateral_response(t_list[::10], dihedral=grid[0], WingLength=grid[1])
+    print(f"{grid[0].size} configurations x {len(t_list[::10])} times solved in {(time.perf_counter() - start) * 1000:.1f} ms")
+    plt.show()